@@ -1,17 +1,14 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from django.contrib.auth.models import Permission, User
-from django.contrib.contenttypes.models import ContentType
+from django.contrib.auth.models import User
 from django.http import HttpRequest
 
 from core.models import Perfil
+from core.permissoes import permissoes
 
 
 def get_permission(model, permission: str):
-    model_name = model.__name__.lower()
-    model_content_type = ContentType.objects.filter(model=model_name).first()
-    model_permissions = Permission.objects.filter(content_type=model_content_type)
-    return model_permissions.get(codename__startswith=permission)
+    return permissoes((model, permission))[0]
 
 
 class PerfilInline(admin.StackedInline):
@@ -85,8 +82,4 @@ class CustomUserAdmin(UserAdmin):
             obj.is_staff = True
         super().save_model(request, obj, form, change)
         if is_new_user:
-            new_user_permissions = [
-                get_permission(User, "view"),
-                get_permission(User, "change"),
-            ]
-            obj.user_permissions.set(new_user_permissions)
+            obj.user_permissions.add(*permissoes((User, "view"), (User, "change")))
@@ -0,0 +1,175 @@
+"""Busca de perfis pelo nome, sem diferenciar acentos nem maiúsculas.
+
+`Perfil.nome_busca` guarda o nome normalizado por `normalizar()` e é indexado
+conforme o banco:
+
+- PostgreSQL: índice GIN de trigramas (`pg_trgm`), usado por `LIKE '%...%'`,
+  declarado em `Perfil.Meta.indexes` com `IndiceDeTrigramas`;
+- SQLite: tabela FTS5 com o tokenizador `trigram`, mantida por gatilhos e
+  criada pela migração `core.0008_perfil_nome_busca`.
+
+Nos dois casos a busca por um trecho do nome não lê a tabela inteira.
+"""
+
+import unicodedata
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+
+TABELA_FTS = "core_perfil_busca"
+# O tokenizador `trigram` só encontra termos com pelo menos três caracteres.
+MINIMO_FTS = 3
+
+_GATILHOS_FTS = {
+    f"{TABELA_FTS}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON core_perfil BEGIN
+            INSERT INTO {TABELA_FTS}(rowid, nome_busca) VALUES (new.id, new.nome_busca);
+        END""",
+    f"{TABELA_FTS}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON core_perfil BEGIN
+            INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, nome_busca) VALUES ('delete', old.id, old.nome_busca);
+        END""",
+    f"{TABELA_FTS}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE OF nome_busca ON core_perfil BEGIN
+            INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, nome_busca) VALUES ('delete', old.id, old.nome_busca);
+            INSERT INTO {TABELA_FTS}(rowid, nome_busca) VALUES (new.id, new.nome_busca);
+        END""",
+}
+
+_com_fts = {}
+
+
+def normalizar(texto):
+    """Texto em minúsculas, sem acentos e com os espaços simplificados ("  João " -> "joao")."""
+    if not texto:
+        return ""
+    decomposto = unicodedata.normalize("NFKD", texto.casefold())
+    return " ".join(
+        "".join(c for c in decomposto if not unicodedata.combining(c)).split()
+    )
+
+
+def sqlite_tem_trigram(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        fts5 = cursor.fetchone()[0]
+    versao = tuple(
+        int(parte) for parte in connection.Database.sqlite_version.split(".")
+    )
+    return bool(fts5) and versao >= (3, 34, 0)
+
+
+class IndiceDeTrigramas(GinIndex):
+    """Índice GIN no PostgreSQL; nos outros bancos, um índice comum nas mesmas colunas.
+
+    Permite declarar o índice de trigramas em `Meta.indexes` sem quebrar as
+    migrações no SQLite, que não conhece `USING gin` nem as opclasses.
+    """
+
+    def create_sql(self, model, schema_editor, using="", **kwargs):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().create_sql(model, schema_editor, using=using, **kwargs)
+        expressoes = [
+            expressao.get_source_expressions()[0]
+            if isinstance(expressao, OpClass)
+            else expressao
+            for expressao in self.expressions
+        ]
+        indice = models.Index(*expressoes, fields=self.fields, name=self.name)
+        return indice.create_sql(model, schema_editor, **kwargs)
+
+
+def criar_indice_de_busca(connection):
+    """Cria a tabela FTS5 e os gatilhos do SQLite, se faltarem; pode ser chamada de novo.
+
+    Toda migração que fizer o SQLite recriar `core_perfil` apaga os gatilhos e
+    precisa chamá-la de novo (`RunPython`): a tabela FTS é então reconstruída
+    a partir de `core_perfil`. Até lá, `perfis_com_nome` não usa a tabela.
+    """
+    _com_fts.pop(connection.alias, None)
+    if connection.vendor != "sqlite" or not sqlite_tem_trigram(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5("
+            "nome_busca, content='core_perfil', content_rowid='id', tokenize='trigram')"
+        )
+        for sql in _GATILHOS_FTS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
+
+
+def remover_indice_de_busca(connection):
+    _com_fts.pop(connection.alias, None)
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for gatilho in _GATILHOS_FTS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {gatilho}")
+        cursor.execute(f"DROP TABLE IF EXISTS {TABELA_FTS}")
+
+
+def _tem_fts(connection):
+    """Se a tabela FTS existe e os gatilhos que a mantêm em dia também."""
+    if connection.alias not in _com_fts:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE (type = 'table' AND name = %s)"
+                " OR (type = 'trigger' AND tbl_name = 'core_perfil' AND name IN (%s, %s, %s))",
+                [TABELA_FTS, *_GATILHOS_FTS],
+            )
+            _com_fts[connection.alias] = cursor.fetchone()[0] == 1 + len(_GATILHOS_FTS)
+    return _com_fts[connection.alias]
+
+
+def perfis_com_nome(queryset, termo):
+    """Filtra `queryset` de `Perfil` pelos perfis cujo nome contém todas as palavras de `termo`."""
+    palavras = normalizar(termo).split()
+    if connections[queryset.db].vendor == "sqlite" and _tem_fts(
+        connections[queryset.db]
+    ):
+        frases = [palavra for palavra in palavras if len(palavra) >= MINIMO_FTS]
+        if frases:
+            # Uma única consulta FTS com todas as palavras (E implícito).
+            consulta = " ".join(
+                '"{}"'.format(frase.replace('"', '""')) for frase in frases
+            )
+            queryset = queryset.filter(
+                pk__in=RawSQL(
+                    f"SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s",
+                    [consulta],
+                )
+            )
+            palavras = [palavra for palavra in palavras if len(palavra) < MINIMO_FTS]
+    for palavra in palavras:
+        # `contains` é um `LIKE` sem `UPPER()`, que o índice de trigramas atende.
+        queryset = queryset.filter(nome_busca__contains=palavra)
+    return queryset
+
+
+def com_prefixo(queryset, termo, campo="nome_busca"):
+    """Filtra `queryset` pelas linhas em que `campo` (já normalizado) começa com `termo`.
+
+    No PostgreSQL é um `LIKE 'termo%'`, atendido pelo índice `varchar_pattern_ops`
+    do campo. No SQLite, cuja collation padrão impede o índice de atender o
+    `LIKE`, é o intervalo equivalente.
+    """
+    prefixo = normalizar(termo)
+    if not prefixo:
+        return queryset
+    if connections[queryset.db].vendor == "sqlite":
+        return queryset.filter(
+            **{f"{campo}__gte": prefixo, f"{campo}__lt": prefixo + "\U0010ffff"}
+        )
+    return queryset.filter(**{f"{campo}__startswith": prefixo})
+
+
+def buscar_por_nome(queryset, termo, perfil="perfil"):
+    """Filtra `queryset` pelo nome do perfil em `perfil` (caminho de lookup até um `Perfil`)."""
+    from core.models import Perfil
+
+    if not normalizar(termo):
+        return queryset
+    perfis = perfis_com_nome(Perfil.objects.using(queryset.db), termo)
+    return queryset.filter(**{f"{perfil}__in": perfis.values("pk")})
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models.functions import ExtractDay, ExtractMonth
+
+
+def preencher_aniversario(apps, schema_editor):
+    Perfil = apps.get_model("core", "Perfil")
+    Perfil.objects.filter(nascimento__isnull=False).update(
+        aniversario=ExtractMonth("nascimento") * 100 + ExtractDay("nascimento")
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = (("core", "0006_remove_perfil_dizimista"),)
+
+    operations = (
+        migrations.AddField(
+            model_name="perfil",
+            name="aniversario",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                null=True,
+                verbose_name="Aniversário",
+            ),
+        ),
+        migrations.RunPython(preencher_aniversario, migrations.RunPython.noop),
+    )
@@ -0,0 +1,59 @@
+import django.contrib.postgres.indexes
+import django.db.models.expressions
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+import core.busca
+from core.busca import criar_indice_de_busca, normalizar, remover_indice_de_busca
+
+
+def preencher_nome_busca(apps, schema_editor):
+    Perfil = apps.get_model("core", "Perfil")
+    lote = []
+    for perfil in Perfil.objects.only("pk", "nome").iterator(chunk_size=2000):
+        perfil.nome_busca = normalizar(perfil.nome)[:100]
+        lote.append(perfil)
+        if len(lote) == 2000:
+            Perfil.objects.bulk_update(lote, ["nome_busca"])
+            lote = []
+    Perfil.objects.bulk_update(lote, ["nome_busca"])
+
+
+def criar_tabela_fts(apps, schema_editor):
+    criar_indice_de_busca(schema_editor.connection)
+
+
+def remover_tabela_fts(apps, schema_editor):
+    remover_indice_de_busca(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    dependencies = (("core", "0007_perfil_aniversario"),)
+
+    operations = (
+        migrations.AddField(
+            model_name="perfil",
+            name="nome_busca",
+            field=models.CharField(
+                blank=True,
+                default="",
+                editable=False,
+                max_length=100,
+                verbose_name="Nome para busca",
+            ),
+        ),
+        migrations.RunPython(preencher_nome_busca, migrations.RunPython.noop),
+        # Só no PostgreSQL; nos outros bancos a operação não faz nada.
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="perfil",
+            index=core.busca.IndiceDeTrigramas(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.expressions.F("nome_busca"), name="gin_trgm_ops"
+                ),
+                name="core_perfil_nome_busca_trgm",
+            ),
+        ),
+        # Tabela FTS5 e gatilhos do SQLite (veja `core.busca`); nada nos outros bancos.
+        migrations.RunPython(criar_tabela_fts, remover_tabela_fts),
+    )
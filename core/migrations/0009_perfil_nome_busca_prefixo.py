@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = (("core", "0008_perfil_nome_busca"),)
+
+    operations = (
+        migrations.AddIndex(
+            model_name="perfil",
+            index=models.Index(
+                fields=["nome_busca"],
+                name="perfil_nome_busca_prefixo",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+    )
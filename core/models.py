@@ -1,7 +1,11 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models import F
 from django.urls import reverse
 
+from core.busca import IndiceDeTrigramas, normalizar
+
 FEMININO = ("F", "Feminino")
 MASCULINO = ("M", "Masculino")
 OUTRO = ("O", "Outro")
@@ -12,6 +16,13 @@ GENEROS = (FEMININO, MASCULINO, OUTRO)
 blank_opts = dict(blank=True, null=True)
 
 
+def chave_de_aniversario(nascimento):
+    """Mês e dia de `nascimento` como um inteiro MMDD (25/12 -> 1225)."""
+    if nascimento is None:
+        return None
+    return nascimento.month * 100 + nascimento.day
+
+
 class Perfil(models.Model):
     user = models.OneToOneField(User, verbose_name="Usuário", on_delete=models.CASCADE, **blank_opts)
     nome = models.CharField("Nome completo", max_length=50)
@@ -20,10 +31,44 @@ class Perfil(models.Model):
     genero = models.CharField("Gênero", max_length=1, choices=GENEROS, default=FEMININO[0])
     telefone = models.CharField("Telefone", max_length=20, **blank_opts)
     email = models.EmailField("Email", **blank_opts)
+    # Derivado de `nascimento` em `save()`; indexado para buscar aniversariantes
+    # por intervalo (mês, semana) e já na ordem dos dias.
+    aniversario = models.PositiveSmallIntegerField(
+        "Aniversário", editable=False, db_index=True, **blank_opts
+    )
+    # `nome` sem acentos e em minúsculas, derivado em `save()` (veja `core.busca`).
+    nome_busca = models.CharField(
+        "Nome para busca", max_length=100, editable=False, blank=True, default=""
+    )
 
     class Meta:
         verbose_name = "Perfil"
         verbose_name_plural = "Perfil"
+        indexes = (
+            # Busca por prefixo do autocomplete; `opclasses` só vale no PostgreSQL.
+            models.Index(
+                fields=["nome_busca"],
+                name="perfil_nome_busca_prefixo",
+                opclasses=["varchar_pattern_ops"],
+            ),
+            # Busca por trecho do nome (`LIKE '%...%'`) no PostgreSQL.
+            IndiceDeTrigramas(
+                OpClass(F("nome_busca"), name="gin_trgm_ops"),
+                name="core_perfil_nome_busca_trgm",
+            ),
+        )
+
+    def save(self, *args, **kwargs):
+        self.aniversario = chave_de_aniversario(self.nascimento)
+        self.nome_busca = normalizar(self.nome)[:100]
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            derivados = {"nascimento": "aniversario", "nome": "nome_busca"}
+            kwargs["update_fields"] = {
+                *update_fields,
+                *(derivados[f] for f in update_fields if f in derivados),
+            }
+        super().save(*args, **kwargs)
 
     def __str__(self):
         if self.user:
@@ -0,0 +1,85 @@
+"""Registro das permissões usadas pelo código, resolvidas uma vez por processo.
+
+As permissões são identificadas por `(model, ação)`, como `(User, "view")`, e
+buscadas pelo rótulo do app e pelo nome do model do content type, de modo que
+models de apps diferentes com o mesmo nome não se confundem. Os pares ainda
+desconhecidos são resolvidos juntos, em uma única consulta.
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.contrib.auth.models import Permission
+from django.db.models import Q
+
+_registro = {}
+
+
+def _chave(model, acao):
+    # Models proxy têm content type e permissões próprios.
+    meta = model._meta
+    return meta.app_label, meta.model_name, f"{acao}_{meta.model_name}"
+
+
+def permissoes(*pares):
+    """Permissões dos pares `(model, ação)`, na mesma ordem."""
+    chaves = [_chave(model, acao) for model, acao in pares]
+    faltando = {chave for chave in chaves if chave not in _registro}
+    if faltando:
+        filtro = reduce(
+            or_,
+            (
+                Q(
+                    content_type__app_label=app_label,
+                    content_type__model=model_name,
+                    codename=codename,
+                )
+                for app_label, model_name, codename in faltando
+            ),
+        )
+        for permissao in Permission.objects.filter(filtro).select_related(
+            "content_type"
+        ):
+            _registro[
+                (
+                    permissao.content_type.app_label,
+                    permissao.content_type.model,
+                    permissao.codename,
+                )
+            ] = permissao
+        desconhecidas = sorted(
+            ".".join(chave[::2]) for chave in faltando if chave not in _registro
+        )
+        if desconhecidas:
+            raise Permission.DoesNotExist(
+                f"Permissões inexistentes: {', '.join(desconhecidas)}."
+            )
+    return [_registro[chave] for chave in chaves]
+
+
+def limpar_registro():
+    """Esquece as permissões resolvidas (os ids mudam quando o banco é recriado)."""
+    _registro.clear()
+
+
+def sincronizar_permissoes(relacao, permissoes):
+    """Deixa em `relacao` (ex.: `grupo.permissions`) exatamente `permissoes`.
+
+    Lê os ids atuais e só remove ou insere a diferença; quando nada mudou,
+    custa uma consulta.
+    """
+    desejadas = {permissao.pk for permissao in permissoes}
+    through = relacao.through
+    origem = relacao.source_field_name
+    destino = relacao.target_field_name
+    linhas = through.objects.filter(**{f"{origem}_id": relacao.instance.pk})
+    atuais = set(linhas.values_list(f"{destino}_id", flat=True))
+    if atuais - desejadas:
+        linhas.filter(**{f"{destino}_id__in": atuais - desejadas}).delete()
+    if desejadas - atuais:
+        through.objects.bulk_create(
+            [
+                through(**{f"{origem}_id": relacao.instance.pk, f"{destino}_id": pk})
+                for pk in desejadas - atuais
+            ]
+        )
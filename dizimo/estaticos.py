@@ -0,0 +1,16 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class ArquivosEstaticos(CompressedManifestStaticFilesStorage):
+    """Arquivos estáticos com o hash do conteúdo no nome e versões gzip/brotli.
+
+    O `collectstatic` gera as cópias com hash, o manifesto e os arquivos
+    comprimidos; o WhiteNoise serve os nomes com hash com cache "imutável" de
+    um ano. Sem manifesto (testes, `runserver` antes do `collectstatic`), as
+    urls usam os nomes originais em vez de falhar.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
@@ -23,6 +23,19 @@ env = environ.Env(
     EMAIL_HOST_PASSWORD=(str, ""),
     EMAIL_USE_TLS=(bool, True),
     EMAIL_USE_SSL=(bool, False),
+    EMAIL_MAX_POR_MINUTO=(int, 30),
+    EXPORTACAO_VALIDADE_HORAS=(int, 24),
+    SQL_INSTRUMENTACAO=(bool, False),
+    SQL_N_MAIS_UM_LIMITE=(int, 5),
+    CONN_MAX_AGE=(int, 0),
+    CONN_HEALTH_CHECKS=(bool, True),
+    POSTGRES_POOL=(bool, False),
+    POSTGRES_POOL_MIN_SIZE=(int, 2),
+    POSTGRES_POOL_MAX_SIZE=(int, 4),
+    POSTGRES_POOL_TIMEOUT=(float, 10.0),
+    POSTGRES_POOL_MAX_IDLE=(float, 600.0),
+    POSTGRES_POOL_MAX_LIFETIME=(float, 3600.0),
+    POSTGRES_POOL_LOG_INTERVALO=(int, 60),
 )
 # reading .env file
 environ.Env.read_env()
@@ -52,7 +65,8 @@ ALLOWED_HOSTS = [
 
 INSTALLED_APPS = [
     "jazzmin",
-    "django.contrib.admin",
+    # O `django.contrib.admin`, com o site de `gestao.sites`.
+    "gestao.sites.GestaoAdminConfig",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -95,8 +109,15 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "gestao.middleware.InstrumentacaoSQLMiddleware",
+    "gestao.middleware.EstatisticasDoPoolMiddleware",
 ]
 
+# Consultas e tempo de SQL por requisição (cabeçalho Server-Timing e logger
+# "gestao.sql"); avisa quando a mesma consulta se repete SQL_N_MAIS_UM_LIMITE vezes.
+SQL_INSTRUMENTACAO = env("SQL_INSTRUMENTACAO")
+SQL_N_MAIS_UM_LIMITE = env("SQL_N_MAIS_UM_LIMITE")
+
 ROOT_URLCONF = "dizimo.urls"
 
 TEMPLATES = [
@@ -129,10 +150,34 @@ DATABASES = {
         "PASSWORD": env("POSTGRES_PASSWORD", default="postgres"),
         "HOST": env("POSTGRES_HOST", default="localhost"),
         "PORT": env("POSTGRES_PORT", default="5432"),
-        # "OPTIONS": {"sslmode": "require"},
+        # Segundos que uma conexão é reaproveitada entre requisições (0: uma por requisição).
+        "CONN_MAX_AGE": env("CONN_MAX_AGE"),
+        # Confere a conexão reaproveitada (ou a tirada do pool) antes de usá-la.
+        "CONN_HEALTH_CHECKS": env("CONN_HEALTH_CHECKS"),
+        "OPTIONS": {
+            # "sslmode": "require",
+        },
     }
 }
 
+# Pool de conexões do psycopg 3, um por processo: no pior caso, o banco recebe
+# (processos do gunicorn) x POSTGRES_POOL_MAX_SIZE conexões. Substitui o
+# CONN_MAX_AGE, que o Django não permite junto com o pool.
+POSTGRES_POOL = env("POSTGRES_POOL")
+# Segundos entre as linhas de estatísticas do pool no logger "gestao.banco".
+POSTGRES_POOL_LOG_INTERVALO = env("POSTGRES_POOL_LOG_INTERVALO")
+if POSTGRES_POOL:
+    # O Django confere cada conexão tirada do pool quando CONN_HEALTH_CHECKS é verdadeiro.
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": env("POSTGRES_POOL_MIN_SIZE"),
+        "max_size": env("POSTGRES_POOL_MAX_SIZE"),
+        # Segundos esperando uma conexão livre antes de falhar a requisição.
+        "timeout": env("POSTGRES_POOL_TIMEOUT"),
+        "max_idle": env("POSTGRES_POOL_MAX_IDLE"),
+        "max_lifetime": env("POSTGRES_POOL_MAX_LIFETIME"),
+    }
+
 # Optional: fallback to SQLite if POSTGRES_DB is not set
 if not env("POSTGRES_DB", default=None):
     DATABASES = {
@@ -142,6 +187,14 @@ if not env("POSTGRES_DB", default=None):
         }
     }
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+# O cache local (padrão) só serve para desenvolvimento e testes: as invalidações
+# de `gestao.versoes` precisam chegar a todos os processos. O `check --deploy`
+# avisa (gestao.W001) quando falta um CACHE_URL compartilhado (redis://, pymemcache://).
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -194,8 +247,20 @@ THOUSAND_SEPARATOR = "."
 
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    # Nomes com hash, manifesto e versões .gz/.br gerados no `collectstatic`;
+    # o WhiteNoise serve os nomes com hash com cache imutável de um ano.
+    "staticfiles": {"BACKEND": "dizimo.estaticos.ArquivosEstaticos"},
+}
 # STATICFILES_DIRS = [BASE_DIR / STATIC_URL]
 
+# Arquivos gerados (exportações). Não são servidos publicamente: o download
+# passa pela view `baixar_exportacao`, que confere o dono do arquivo.
+MEDIA_ROOT = env("MEDIA_ROOT", default=str(BASE_DIR / "media"))
+# Horas que um PDF exportado fica disponível antes de ser apagado
+EXPORTACAO_VALIDADE_HORAS = env("EXPORTACAO_VALIDADE_HORAS")
+
 
 # Email
 # https://docs.djangoproject.com/en/3.1/topics/email/#email-backends
@@ -205,6 +270,8 @@ EMAIL_HOST_USER = env("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD")
 EMAIL_USE_TLS = env("EMAIL_USE_TLS")
 EMAIL_USE_SSL = env("EMAIL_USE_SSL")
+# Limite de envios do worker `manage.py enviar_emails`
+EMAIL_MAX_POR_MINUTO = env("EMAIL_MAX_POR_MINUTO")
 
 # if os.getcwd() == "/app":
 #     import dj_database_url
@@ -247,5 +314,15 @@ LOGGING = {
             "level": "INFO",
             "propagate": False,
         },
+        "gestao.sql": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        "gestao.banco": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
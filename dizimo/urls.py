@@ -16,9 +16,17 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 
-from gestao.views import home
+from gestao.views import baixar_exportacao, exportacao, home
 
 urlpatterns = [
+    path(
+        "exportacoes/<uuid:pk>/", admin.site.admin_view(exportacao), name="exportacao"
+    ),
+    path(
+        "exportacoes/<uuid:pk>/download/",
+        admin.site.admin_view(baixar_exportacao),
+        name="baixar_exportacao",
+    ),
     path("", admin.site.urls),
     path("home/", home),
 ]
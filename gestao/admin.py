@@ -1,76 +1,87 @@
-import pdfkit
+from copy import copy
+from hashlib import md5
+
 from django.contrib import admin
-from django.contrib.auth.models import Group, User
-from django.core.mail import send_mail
-from django.db.models import Count, Q, Sum
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import (
+    PermissionDenied,
+    SuspiciousOperation,
+    ValidationError,
+)
+from django.db.models import (
+    Case,
+    Max,
+    Min,
+    Prefetch,
+    Q,
+    Sum,
+    Value,
+    When,
+    prefetch_related_objects,
+)
 from django.db.models.functions import TruncDay, TruncMonth, TruncWeek, TruncYear
-from django.http import FileResponse, HttpRequest
-from django.template.loader import render_to_string
-from django.utils.timezone import datetime, now, timedelta
+from django.http import (
+    HttpRequest,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.urls import path, reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.utils.timezone import (
+    datetime,
+    localdate,
+    localtime,
+    make_aware,
+    now,
+    timedelta,
+)
 from django.utils.translation import gettext_lazy as _
 
-from core.admin import get_permission
-from core.models import Perfil
-from dizimo.settings import EMAIL_HOST_USER
-
-from .models import Dizimista, Igreja, Pagamento, PerfilDizimista, ResumoPagamentos
+from core.busca import buscar_por_nome
+from core.models import Perfil, chave_de_aniversario
+
+from .emails import enfileirar_email_de_pagamento
+from .exportacoes import agendar_exportacao
+from .grupos import AGENTES, GESTORES, grupo
+from .models import (
+    Dizimista,
+    Email,
+    Igreja,
+    Pagamento,
+    PerfilDizimista,
+    ResumoPagamentos,
+)
+from .paginacao import ChangeListPorCursor, PaginadorEstimado, em_blocos
+from .planilhas import linhas_csv, linhas_xlsx
+from .versoes import (
+    PARTICIPACOES,
+    PERFIS,
+    TODAS_AS_IGREJAS,
+    assinatura,
+    cache_compartilhado,
+    de_igrejas,
+    modificado_em,
+)
 
 admin.site.site_header = "DezPorcento"
 admin.site.site_title = "DezPorcento"
 admin.site.index_title = "Registros"
 
+FILTROS_TIMEOUT = 60 * 10
+PARTICIPACOES_TIMEOUT = 60 * 60
+
 
 def GESTORES_GROUP():
-    gestores_group = Group.objects.get_or_create(name="Gestores da pastoral")[0]
-    gestores_group.permissions.set(
-        (
-            get_permission(User, "view"),
-            get_permission(User, "change"),
-            get_permission(Perfil, "view"),
-            get_permission(Perfil, "add"),
-            get_permission(Perfil, "change"),
-            get_permission(Dizimista, "view"),
-            get_permission(Dizimista, "add"),
-            get_permission(Dizimista, "change"),
-            get_permission(Dizimista, "delete"),
-            get_permission(PerfilDizimista, "view"),
-            get_permission(PerfilDizimista, "add"),
-            get_permission(PerfilDizimista, "change"),
-            get_permission(Igreja, "view"),
-            get_permission(Igreja, "change"),
-            get_permission(Pagamento, "view"),
-            get_permission(Pagamento, "add"),
-            get_permission(Pagamento, "change"),
-            get_permission(ResumoPagamentos, "view"),
-        )
-    )
-    gestores_group.save()
-    return gestores_group
+    return grupo(GESTORES)
 
 
 def AGENTES_GROUP():
-    agentes_group = Group.objects.get_or_create(name="Agentes da pastoral")[0]
-    agentes_group.permissions.set(
-        (
-            get_permission(User, "view"),
-            get_permission(User, "change"),
-            get_permission(Perfil, "view"),
-            get_permission(Perfil, "add"),
-            get_permission(Perfil, "change"),
-            get_permission(Dizimista, "view"),
-            get_permission(Dizimista, "add"),
-            get_permission(Dizimista, "change"),
-            get_permission(PerfilDizimista, "view"),
-            get_permission(PerfilDizimista, "add"),
-            get_permission(PerfilDizimista, "change"),
-            get_permission(Igreja, "view"),
-            get_permission(Pagamento, "view"),
-            get_permission(Pagamento, "add"),
-            get_permission(ResumoPagamentos, "view"),
-        )
-    )
-    agentes_group.save()
-    return agentes_group
+    return grupo(AGENTES)
 
 
 @admin.register(Perfil)
@@ -106,53 +117,191 @@ class PerfilAdmin(admin.ModelAdmin):
         return qs.filter(user=user)
 
 
+def ids_das_igrejas_do_usuário(user):
+    """Ids das igrejas em que o usuário é gestor ou agente.
+
+    Calculados uma vez por objeto `user`, isto é, por requisição. Com um cache
+    compartilhado, também ficam em cache entre requisições até mudarem as
+    participações (os sinais `m2m_changed` de `Igreja.gestores` e
+    `Igreja.agentes` trocam a versão). Com um cache local ao processo, a
+    versão trocada num worker não chegaria aos outros, que continuariam
+    liberando as igrejas de quem perdeu o acesso; por isso, nesse caso, o
+    escopo é lido do banco a cada requisição.
+    """
+    ids = getattr(user, "_ids_das_igrejas", None)
+    if ids is None:
+        chave = (
+            f"participacoes:{user.pk}:{assinatura(PARTICIPACOES)}"
+            if cache_compartilhado()
+            else None
+        )
+        ids = cache.get(chave) if chave else None
+        if ids is None:
+            gestor_em = Igreja.gestores.through.objects.filter(
+                user_id=user.pk
+            ).values_list("igreja_id", flat=True)
+            agente_em = Igreja.agentes.through.objects.filter(
+                user_id=user.pk
+            ).values_list("igreja_id", flat=True)
+            ids = sorted(gestor_em.union(agente_em))
+            if chave:
+                cache.set(chave, ids, PARTICIPACOES_TIMEOUT)
+        user._ids_das_igrejas = ids
+    return ids
+
+
 def igrejas_do_usuário(user):
-    gestor_em = Q(gestores__pk=user.pk)
-    agente_em = Q(agentes__pk=user.pk)
-    return Igreja.objects.filter(agente_em | gestor_em).distinct()
+    return Igreja.objects.filter(pk__in=ids_das_igrejas_do_usuário(user))
+
+
+def opcoes_de_igrejas(user):
+    """`(pk, nome)` das igrejas visíveis ao usuário, em cache até mudarem as participações."""
+    escopo = TODAS_AS_IGREJAS if user.is_superuser else user.pk
+    chave = f"filtros:igrejas:{escopo}:{assinatura(PARTICIPACOES)}"
+    opcoes = cache.get(chave)
+    if opcoes is None:
+        igrejas = (
+            Igreja.objects.all() if user.is_superuser else igrejas_do_usuário(user)
+        )
+        opcoes = list(igrejas.order_by("nome", "pk").values_list("pk", "nome"))
+        cache.set(chave, opcoes, FILTROS_TIMEOUT)
+    return opcoes
+
+
+def opcoes_de_registradores(user):
+    """`(pk, nome)` de quem registrou pagamentos nas igrejas visíveis ao usuário.
+
+    Os ids vêm de um `DISTINCT` sobre `Pagamento.registrado_por` e os nomes de
+    um join com o perfil, numa única consulta. O cache depende das versões das
+    igrejas do escopo (alteradas a cada pagamento) e dos perfis.
+    """
+    if user.is_superuser:
+        escopo = [TODAS_AS_IGREJAS]
+    else:
+        escopo = ids_das_igrejas_do_usuário(user)
+    chave = f"filtros:registradores:{assinatura(PERFIS, *de_igrejas(escopo))}"
+    if not user.is_superuser:
+        chave += ":" + md5(",".join(map(str, escopo)).encode()).hexdigest()
+    opcoes = cache.get(chave)
+    if opcoes is None:
+        pagamentos = Pagamento.objects.order_by()
+        if not user.is_superuser:
+            pagamentos = pagamentos.filter(dizimista__igreja__in=escopo)
+        registradores = (
+            User.objects.filter(pk__in=pagamentos.values("registrado_por").distinct())
+            .order_by("perfil__nome", "username")
+            .values_list("pk", "username", "perfil__nome")
+        )
+        opcoes = [
+            (pk, f"{nome} ({username})" if nome else username)
+            for pk, username, nome in registradores
+        ]
+        cache.set(chave, opcoes, FILTROS_TIMEOUT)
+    return opcoes
+
+
+def nome_do_usuário(user):
+    """Perfil do usuário, ou o próprio usuário quando ele não tem perfil."""
+    return str(getattr(user, "perfil", None) or user)
 
 
 def dizimistas_do_usuário(user):
     qs = Dizimista.objects.all()  # super().get_queryset(request)
     if user.is_superuser:
         return qs
-    igrejas = igrejas_do_usuário(user)
-    return qs.filter(igreja__in=igrejas)
+    return qs.filter(igreja__in=ids_das_igrejas_do_usuário(user))
+
+
+def paginador_estimado(
+    request: HttpRequest, queryset, per_page, orphans=0, allow_empty_first_page=True
+):
+    """Paginador com a contagem estimada ou em cache, invalidada pelas igrejas do usuário e pelos perfis."""
+    user = request.user
+    escopo = (
+        [TODAS_AS_IGREJAS] if user.is_superuser else ids_das_igrejas_do_usuário(user)
+    )
+    return PaginadorEstimado(
+        queryset,
+        per_page,
+        orphans,
+        allow_empty_first_page,
+        versoes=[PERFIS, *de_igrejas(escopo)],
+    )
 
 
 class ExportPdfMixin:
     def export_as_pdf(self, request: HttpRequest, queryset):
         meta = self.model._meta  # pyright: ignore[reportAttributeAccessIssue]
-        field_names = [field.name for field in meta.fields]
-        headers = [field.verbose_name for field in meta.fields]
         title = str(meta).split(".")[1] + "s"
-        filename = f"{title}_{now().strftime('%Y_%m_%d')}.pdf"
-        data = [{field: getattr(obj, field) for field in field_names} for obj in queryset]
-        html = render_to_string(
-            "admin/export_as_pdf.html",
-            dict(title=title.title(), headers=headers, data=data),
-        )
-        options = {
-            "page-size": "A4",
-            "margin-top": "2cm",
-            "margin-right": "1cm",
-            "margin-bottom": "1cm",
-            "margin-left": "2cm",
-            "encoding": "UTF-8",
-        }
-        pdfkit.from_string(html, filename, options=options)
-        return FileResponse(open(filename, "rb"), as_attachment=False)
+        exportacao = agendar_exportacao(request, queryset, title)
+        return HttpResponseRedirect(exportacao.get_absolute_url())
 
     export_as_pdf.short_description = "Exportar dados em PDF"
 
 
+class ExportPlanilhaMixin:
+    """Ações que exportam `export_fields` em CSV ou XLSX sem carregar os objetos.
+
+    `export_fields` é uma tupla de `(lookup, cabeçalho)`; os lookups podem
+    atravessar relações e são lidos com um único `values_list` em blocos.
+    """
+
+    export_fields: tuple[tuple[str, str], ...] = ()
+    export_chunk_size = 2000
+
+    def export_rows(self, queryset):
+        lookups = [lookup for lookup, _ in self.export_fields]
+        return queryset.values_list(*lookups).iterator(
+            chunk_size=self.export_chunk_size
+        )
+
+    def export_response(self, queryset, gerar_linhas, content_type, extensao):
+        meta = self.model._meta  # pyright: ignore[reportAttributeAccessIssue]
+        title = str(meta).split(".")[1] + "s"
+        cabecalho = [header for _, header in self.export_fields]
+        response = StreamingHttpResponse(
+            gerar_linhas(cabecalho, self.export_rows(queryset)),
+            content_type=content_type,
+        )
+        filename = f"{title}_{now().strftime('%Y_%m_%d')}.{extensao}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    def export_as_csv(self, request: HttpRequest, queryset):
+        return self.export_response(
+            queryset, linhas_csv, "text/csv; charset=utf-8", "csv"
+        )
+
+    export_as_csv.short_description = "Exportar planilha (CSV)"
+
+    def export_as_xlsx(self, request: HttpRequest, queryset):
+        return self.export_response(
+            queryset,
+            linhas_xlsx,
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            "xlsx",
+        )
+
+    export_as_xlsx.short_description = "Exportar planilha (XLSX)"
+
+
+def opcao_escolhida(filtro: admin.SimpleListFilter):
+    """Valor do filtro na url, conferido contra as opções de `lookups()`."""
+    valor = filtro.value()
+    if valor not in {str(opcao) for opcao, _ in filtro.lookup_choices}:
+        raise IncorrectLookupParameters(
+            f"Opção inválida para {filtro.title!r}: {valor!r}"
+        )
+    return valor
+
+
 class DataMonthListFilter(admin.SimpleListFilter):
     # Human-readable title which will be displayed in the
     # right admin sidebar just above the filter options.
     title = "Mês"
     # Parameter for the filter that will be used in the URL query.
     parameter_name = "mes"
-    field = "data__month"
+    field = "data"
 
     def lookups(self, request: HttpRequest, model_admin):  # noqa
         """Returns a list of tuples. The first element in each tuple is the coded value
@@ -166,15 +315,90 @@ class DataMonthListFilter(admin.SimpleListFilter):
         string and retrievable via `self.value()`.
         """
         if self.value():
-            filter_kwargs = {self.field: self.value()}
-            return queryset.filter(**filter_kwargs)
+            # Um intervalo por ano em vez de `__month`, que não usa o índice de `field`.
+            mes = int(opcao_escolhida(self))
+            # Só os anos do que já está filtrado (igrejas do usuário, outros filtros).
+            limites = queryset.order_by().aggregate(
+                primeiro=Min(self.field), ultimo=Max(self.field)
+            )
+            if limites["primeiro"] is None:
+                return queryset.none()
+            anos = range(self.ano(limites["primeiro"]), self.ano(limites["ultimo"]) + 1)
+            condicao = Q()
+            for ano in anos:
+                inicio, fim = self.intervalo(ano, mes)
+                condicao |= Q(
+                    **{f"{self.field}__gte": inicio, f"{self.field}__lt": fim}
+                )
+            return queryset.filter(condicao)
         return queryset
 
+    def ano(self, valor):
+        return localtime(valor).year
+
+    def intervalo(self, ano, mes):
+        inicio = datetime(ano, mes, 1)
+        fim = (inicio + timedelta(days=32)).replace(day=1)
+        return make_aware(inicio), make_aware(fim)
+
+
+class DiaMonthListFilter(DataMonthListFilter):
+    field = "dia"
+
+    def ano(self, valor):
+        return valor.year
+
+    def intervalo(self, ano, mes):
+        inicio, fim = super().intervalo(ano, mes)
+        return inicio.date(), fim.date()
+
+
+def aniversariantes(queryset, inicio, fim, field="perfil__aniversario"):
+    """Filtra quem faz aniversário entre as datas `inicio` e `fim`, na ordem dos dias.
+
+    Usa a chave MMDD de `Perfil.aniversario`, de modo que o filtro é um
+    intervalo no índice; intervalos que atravessam o ano viram dois.
+    """
+    de, ate = chave_de_aniversario(inicio), chave_de_aniversario(fim)
+    if de <= ate:
+        return queryset.filter(**{f"{field}__range": (de, ate)}).order_by(field)
+    virada = Q(**{f"{field}__gte": de}) | Q(**{f"{field}__lte": ate})
+    depois_da_virada = Case(
+        When(**{f"{field}__lt": de}, then=Value(1)), default=Value(0)
+    )
+    return queryset.filter(virada).order_by(depois_da_virada, field)
+
 
 class AniversarioMesListFilter(DataMonthListFilter):
-    title = "Anversariante do mês"
+    title = "Aniversariante do mês"
     parameter_name = "aniversario_mes"
-    field = "perfil__nascimento__month"
+
+    def queryset(self, request: HttpRequest, queryset):
+        if self.value():
+            mes = int(opcao_escolhida(self))
+            inicio = datetime(2000, mes, 1).date()
+            fim = (inicio + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+            return aniversariantes(queryset, inicio, fim)
+        return queryset
+
+
+class AniversarioSemanaListFilter(admin.SimpleListFilter):
+    title = "Aniversariantes da semana"
+    parameter_name = "aniversario_semana"
+
+    def lookups(self, request: HttpRequest, model_admin):
+        return [("0", "Esta semana"), ("1", "Próxima semana")]
+
+    def queryset(self, request: HttpRequest, queryset):
+        if self.value():
+            hoje = localdate()
+            inicio = (
+                hoje
+                - timedelta(days=hoje.weekday())
+                + timedelta(weeks=int(opcao_escolhida(self)))
+            )
+            return aniversariantes(queryset, inicio, inicio + timedelta(days=6))
+        return queryset
 
 
 def endereco(obj):
@@ -218,26 +442,6 @@ class PagamentoInline(admin.TabularInline):
     fields = ("data", "valor", "registrado_por")
     readonly_fields = ("data", "registrado_por")
 
-    def save_model(self, request: HttpRequest, obj, form, change):
-        obj.registrado_por = request.user
-        super().save_model(request, obj, form, change)  # type: ignore
-        try:
-            destinatários = []
-            if obj.dizimista.email:
-                destinatários.append(obj.dizimista.email)
-            send_mail(
-                subject="Registro de pagamento",
-                message="",
-                html_message=render_to_string("pagamento.html/", dict(obj=obj)),
-                from_email=EMAIL_HOST_USER,  # type: ignore
-                recipient_list=destinatários,
-                fail_silently=False,
-            )
-            self.message_user(request, "E-mails enviados com sucesso.", level="success")  # type: ignore[reportAttributeAccessIssue]
-        except Exception as e:
-            print(e)
-            self.message_user(request, "Erro ao enviar e-mail", level="error")  # type: ignore[reportAttributeAccessIssue]
-
 
 class IgrejaListFilter(admin.SimpleListFilter):
     title = "Igreja"
@@ -245,16 +449,16 @@ class IgrejaListFilter(admin.SimpleListFilter):
     field = "igreja__pk"
 
     def lookups(self, request: HttpRequest, model_admin):  # noqa
-        user = request.user
-        if user.is_superuser:
-            igrejas = Igreja.objects.all()
-        else:
-            igrejas = igrejas_do_usuário(user)
-        return [(i.pk, i) for i in igrejas]
+        return opcoes_de_igrejas(request.user)
 
     def queryset(self, request: HttpRequest, queryset):
         if self.value():
-            return queryset.filter(**{self.field: self.value()})
+            try:
+                return queryset.filter(**{self.field: self.value()})
+            except (ValidationError, ValueError) as exc:
+                raise IncorrectLookupParameters(
+                    f"Igreja inválida: {self.value()!r}"
+                ) from exc
         return queryset
 
 
@@ -266,27 +470,51 @@ class UltimoPagamentoListFilter(admin.SimpleListFilter):
         return [(i, _(f"{i} dias atrás")) for i in [30, 60, 90]]
 
     def queryset(self, request: HttpRequest, queryset):
-        if value := self.value():
-            dias_atras = now() - timedelta(days=int(value) + 1)
-            return queryset.exclude(pagamento__data__gt=dias_atras)
+        if self.value():
+            dias_atras = now() - timedelta(days=int(opcao_escolhida(self)) + 1)
+            return queryset.filter(
+                Q(ultimo_pagamento__lte=dias_atras) | Q(ultimo_pagamento__isnull=True)
+            )
         return queryset
 
 
 @admin.register(Dizimista)
-class DizimistaAdmin(admin.ModelAdmin, ExportPdfMixin):
+class DizimistaAdmin(admin.ModelAdmin, ExportPdfMixin, ExportPlanilhaMixin):
     actions_selection_counter = False
     list_per_page = 20
-    list_select_related = True
-    list_display = ["perfil", "nascimento", "igreja"]
+    # A contagem sem filtros seria um segundo `COUNT(*)` por página.
+    show_full_result_count = False
+    # `perfil` é a relação reversa de `PerfilDizimista`; `True` não a segue.
+    list_select_related = ("perfil__user", "igreja")
+    list_display = [
+        "perfil",
+        "nascimento",
+        "igreja",
+        "ultimo_pagamento",
+        "num_pagamentos",
+    ]
     sortable_by = list_display
     search_fields = ["perfil__nome"]
     list_filter = [
         IgrejaListFilter,
         "perfil__genero",
         AniversarioMesListFilter,
+        AniversarioSemanaListFilter,
         UltimoPagamentoListFilter,
     ]
-    actions = ["export_as_pdf"]
+    actions = ("export_as_pdf", "export_as_csv", "export_as_xlsx")
+    export_fields = (
+        ("perfil__nome", "Nome"),
+        ("perfil__nascimento", "Data de nascimento"),
+        ("perfil__genero", "Gênero"),
+        ("perfil__telefone", "Telefone"),
+        ("perfil__email", "Email"),
+        ("perfil__endereco", "Endereço"),
+        ("igreja__nome", "Igreja"),
+        ("dizimo", "Dízimo"),
+        ("ultimo_pagamento", "Último pagamento"),
+        ("num_pagamentos", "Pagamentos"),
+    )
     autocomplete_fields = ["igreja"]
     inlines = [
         PerfilDizimistaInline,
@@ -296,6 +524,50 @@ class DizimistaAdmin(admin.ModelAdmin, ExportPdfMixin):
     def get_queryset(self, request: HttpRequest):
         return dizimistas_do_usuário(user=request.user)
 
+    def get_search_results(self, request: HttpRequest, queryset, search_term):
+        return buscar_por_nome(queryset, search_term, "perfil"), False
+
+    def get_paginator(
+        self,
+        request: HttpRequest,
+        queryset,
+        per_page,
+        orphans=0,
+        allow_empty_first_page=True,
+    ):
+        return paginador_estimado(
+            request, queryset, per_page, orphans, allow_empty_first_page
+        )
+
+    @admin.display(description="Perfil", ordering="perfil__nome")
+    def perfil(self, obj: Dizimista):
+        return getattr(obj, "perfil", None)
+
+    @admin.display(description="Data de nascimento", ordering="perfil__nascimento")
+    def nascimento(self, obj: Dizimista):
+        perfil = getattr(obj, "perfil", None)
+        return perfil.nascimento if perfil else None
+
+    def save_formset(self, request: HttpRequest, form, formset, change):
+        if formset.model is not Pagamento:
+            return super().save_formset(request, form, formset, change)
+        pagamentos = formset.save(commit=False)
+        for obj in formset.deleted_objects:
+            obj.delete()
+        emails = 0
+        for obj in pagamentos:
+            obj.registrado_por = request.user
+            obj.save()
+            if enfileirar_email_de_pagamento(obj):
+                emails += 1
+        formset.save_m2m()
+        if emails:
+            self.message_user(
+                request,
+                f"{emails} comprovante(s) serão enviados por e-mail em instantes.",
+                level="success",
+            )
+
 
 class DizimistaInline(admin.TabularInline):
     model = Dizimista
@@ -303,18 +575,33 @@ class DizimistaInline(admin.TabularInline):
     fields = []
 
 
+class IgrejaChangeList(ChangeList):
+    """Busca os gestores e agentes (com perfil) das igrejas da página de uma só vez."""
+
+    def get_results(self, request):
+        super().get_results(request)
+        usuarios = User.objects.select_related("perfil").order_by("pk")
+        self.result_list = list(self.result_list)
+        prefetch_related_objects(
+            self.result_list,
+            Prefetch("gestores", queryset=usuarios),
+            Prefetch("agentes", queryset=usuarios),
+        )
+
+
 @admin.register(Igreja)
-class IgrejaAdmin(admin.ModelAdmin, ExportPdfMixin):
+class IgrejaAdmin(admin.ModelAdmin, ExportPdfMixin, ExportPlanilhaMixin):
     list_display = (
         "nome",
         "endereco",
         "agentes_da_pastoral",
         "gestores_da_patoral",
-        "número_de_dizimistas",
+        "num_dizimistas",
     )
     sortable_by = list_display
     search_fields = ["nome"]
-    actions = ["export_as_pdf"]
+    actions = ("export_as_pdf", "export_as_csv", "export_as_xlsx")
+    export_fields = (("nome", "Nome"), ("endereco", "Endereço"))
     filter_horizontal = ("gestores", "agentes")
     inlines = [DizimistaInline]
 
@@ -325,17 +612,30 @@ class IgrejaAdmin(admin.ModelAdmin, ExportPdfMixin):
             return qs
         return igrejas_do_usuário(user)
 
+    def get_changelist(self, request, **kwargs):
+        return IgrejaChangeList
+
+    @admin.display(description="Gestores da pastoral")
     def gestores_da_patoral(self, obj: Igreja):
-        display_text = []
-        for user in obj.gestores.all():
-            display_text.append(str(user.perfil or user))
-        return ", ".join(display_text)
+        return ", ".join(nome_do_usuário(user) for user in obj.gestores.all())
 
+    @admin.display(description="Agentes da pastoral")
     def agentes_da_pastoral(self, obj: Igreja):
-        display_text = []
-        for user in obj.agentes.all():
-            display_text.append(str(user.perfil or user))
-        return ", ".join(display_text)
+        return ", ".join(nome_do_usuário(user) for user in obj.agentes.all())
+
+
+@admin.register(Email)
+class EmailAdmin(admin.ModelAdmin):
+    list_display = (
+        "assunto",
+        "destinatarios",
+        "status",
+        "tentativas",
+        "criado_em",
+        "enviado_em",
+    )
+    list_filter = ("status",)
+    readonly_fields = ("tentativas", "erro", "criado_em", "enviado_em")
 
 
 class RegistradoPorListFilter(admin.SimpleListFilter):
@@ -343,8 +643,7 @@ class RegistradoPorListFilter(admin.SimpleListFilter):
     parameter_name = "registrado_por"
 
     def lookups(self, request: HttpRequest, model_admin: admin.ModelAdmin):  # noqa
-        registradores = set(p.registrado_por for p in model_admin.get_queryset(request).all())
-        return [(r.id, r.perfil) for r in registradores if r]
+        return opcoes_de_registradores(request.user)
 
     def queryset(self, request: HttpRequest, queryset):
         if self.value():
@@ -357,12 +656,13 @@ class PagamentoIgrejaFilter(IgrejaListFilter):
 
 
 @admin.register(Pagamento)
-class PagamentoAdmin(admin.ModelAdmin, ExportPdfMixin):
+class PagamentoAdmin(admin.ModelAdmin, ExportPdfMixin, ExportPlanilhaMixin):
     fields = ("dizimista", "valor", "data", "registrado_por", "id")
     list_per_page = 20
+    show_full_result_count = False
     list_display = ["data", "valor", "dizimista_link"]
     sortable_by = list_display
-    list_select_related = True
+    list_select_related = ("dizimista__perfil__user",)
     autocomplete_fields = ["dizimista"]
     search_fields = ["dizimista__perfil__nome"]
     list_filter = [
@@ -371,7 +671,16 @@ class PagamentoAdmin(admin.ModelAdmin, ExportPdfMixin):
         DataMonthListFilter,
         RegistradoPorListFilter,
     ]
-    actions = ["export_as_pdf"]
+    actions = ("export_as_pdf", "export_as_csv", "export_as_xlsx")
+    export_fields = (
+        ("data", "Data e hora"),
+        ("valor", "Valor"),
+        ("dizimista__perfil__nome", "Dizimista"),
+        ("dizimista__igreja__nome", "Igreja"),
+        ("registrado_por__perfil__nome", "Registrado por"),
+        ("registrado_por__username", "Usuário"),
+        ("id", "Código"),
+    )
 
     def get_readonly_fields(self, request: HttpRequest, obj=None):
         # if request.user.is_superuser:
@@ -381,134 +690,299 @@ class PagamentoAdmin(admin.ModelAdmin, ExportPdfMixin):
     def save_model(self, request: HttpRequest, obj, form, change):
         obj.registrado_por = request.user
         super().save_model(request, obj, form, change)
-        try:
-            destinatários = []
-            if obj.dizimista.email:
-                destinatários.append(obj.dizimista.email)
-            send_mail(
-                subject="Registro de pagamento",
-                message="",
-                html_message=render_to_string("pagamento.html/", dict(obj=obj)),
-                from_email=EMAIL_HOST_USER,  # pyright: ignore[reportArgumentType]
-                recipient_list=destinatários,
-                fail_silently=False,
+        if enfileirar_email_de_pagamento(obj):
+            self.message_user(
+                request,
+                "O comprovante será enviado por e-mail em instantes.",
+                level="success",
             )
-            self.message_user(request, "E-mails enviados com sucesso.", level="success")
-        except Exception as e:
-            print(e)
-            self.message_user(request, "Erro ao enviar e-mail", level="warning")
 
+    @admin.display(description="Dizimista", ordering="dizimista__perfil__nome")
     def dizimista_link(self, obj):
-        try:
-            return obj.dizimista.link()
-        except Exception as exc:
-            print(exc)
+        if obj.dizimista is None or getattr(obj.dizimista, "perfil", None) is None:
             return ""
+        return obj.dizimista.link()
+
+    def get_search_results(self, request: HttpRequest, queryset, search_term):
+        return buscar_por_nome(queryset, search_term, "dizimista__perfil"), False
+
+    def get_paginator(
+        self,
+        request: HttpRequest,
+        queryset,
+        per_page,
+        orphans=0,
+        allow_empty_first_page=True,
+    ):
+        return paginador_estimado(
+            request, queryset, per_page, orphans, allow_empty_first_page
+        )
+
+    def get_changelist(self, request, **kwargs):
+        return ChangeListPorCursor
 
-    dizimista_link.short_description = "Dizimista"
+    def export_rows(self, queryset):
+        # Sempre do pagamento mais recente ao mais antigo (`-data`, `-pk`), qualquer
+        # que seja a ordenação do changelist: cada bloco é lido a partir do último
+        # pagamento do bloco anterior, o que exige uma ordem fixa e indexada.
+        lookups = [lookup for lookup, _ in self.export_fields]
+        return em_blocos(queryset, lookups, self.export_chunk_size)
 
     def get_queryset(self, request: HttpRequest):
         qs = super().get_queryset(request)
         user = request.user
         if user.is_superuser:
             return qs
-        igrejas = igrejas_do_usuário(user)
-        return qs.filter(dizimista__igreja__in=igrejas)
+        return qs.filter(dizimista__igreja__in=ids_das_igrejas_do_usuário(user))
+
+
+# Agrupamentos do resumo de pagamentos: função que trunca o dia e formato do período.
+PERIODOS = {
+    "dia": {"field": "day", "func": TruncDay, "date_format": "%Y-%m-%d"},
+    "semana": {"field": "week", "func": TruncWeek, "date_format": "%Y-%m-%d"},
+    "mês": {"field": "month", "func": TruncMonth, "date_format": "%Y-%m"},
+    "ano": {"field": "year", "func": TruncYear, "date_format": "%Y"},
+}
 
 
 def group_date_by_periord(queryset, period):
-    groups_settings = {
-        "dia": dict(field="day", func=TruncDay, date_format="%Y-%m-%d"),
-        "semana": dict(field="week", func=TruncWeek, date_format="%Y-%m-%d"),
-        "mês": dict(field="month", func=TruncMonth, date_format="%Y-%m"),
-        "ano": dict(field="year", func=TruncYear, date_format="%Y"),
-    }
-    gs = groups_settings[period]
-    truncate_function = gs["func"]
+    """Agrupa um queryset de `ResumoDiario` por período e igreja.
+
+    Devolve uma lista (lida uma única vez do banco), do período mais recente
+    ao mais antigo, com o período já formatado.
+    """
+    truncate_function = PERIODOS[period]["func"]
+    date_format = PERIODOS[period]["date_format"]
     queryset = (
-        queryset.annotate(**{period: truncate_function("data")})
-        .order_by(f"-{period}")
-        .values(period, "dizimista__igreja__nome")
-    ).annotate(pagamentos=Count("id"), total_recebido=Sum("valor"))
-    date_format = groups_settings[period]["date_format"]
-    for row in queryset:
-        row[period] = row[period].strftime(date_format)
-    return queryset
+        # Anotado como `periodo`: "dia" já é um campo de `ResumoDiario`.
+        queryset.annotate(periodo=truncate_function("dia"))
+        .order_by("-periodo", "igreja__nome")
+        .values("periodo", "igreja__nome")
+    ).annotate(pagamentos=Sum("pagamentos"), total_recebido=Sum("total_recebido"))
+    return [
+        {
+            "igreja__nome": row["igreja__nome"],
+            period: row["periodo"].strftime(date_format),
+            "pagamentos": row["pagamentos"],
+            "total_recebido": row["total_recebido"],
+        }
+        for row in queryset
+    ]
+
+
+def periodos_entre(primeiro, ultimo, period):
+    """Todos os períodos formatados de `primeiro` a `ultimo` (também formatados), inclusive."""
+    date_format = PERIODOS[period]["date_format"]
+    data = datetime.strptime(primeiro, date_format).date()
+    fim = datetime.strptime(ultimo, date_format).date()
+    periodos = []
+    while data <= fim:
+        periodos.append(data.strftime(date_format))
+        if period == "dia":
+            data += timedelta(days=1)
+        elif period == "semana":
+            data += timedelta(days=7)
+        elif period == "mês":
+            data = (data + timedelta(days=32)).replace(day=1)
+        else:
+            data = data.replace(year=data.year + 1)
+    return periodos
 
 
 class GroupByDateListFilter(admin.SimpleListFilter):
     title = "Agrupar por"
     parameter_name = "group_date_by"
-    groups_settings = {
-        "dia": dict(field="day", func=TruncDay, date_format="%Y-%m-%d"),
-        "semana": dict(field="week", func=TruncWeek, date_format="%Y-%m-%d"),
-        "mês": dict(field="month", func=TruncMonth, date_format="%Y-%m"),
-        "ano": dict(field="year", func=TruncYear, date_format="%Y"),
-    }
-    selected_group = "mês"
+    padrao = "mês"
 
     def lookups(self, request: HttpRequest, model_admin):  # noqa
         return [(_.lower(), _) for _ in ["Dia", "Semana", "Mês", "Ano"]]
 
     def queryset(self, request: HttpRequest, queryset):
-        GroupByDateListFilter.selected_group = self.value() or "mês"
+        # Só escolhe o agrupamento do gráfico e da tabela (veja `periodo_selecionado`).
         return queryset
 
+    def periodo(self):
+        valor = self.value()
+        return valor if valor in PERIODOS else self.padrao
 
-def format_plot_data(queryset, period):
-    reversed_qs = sorted(queryset, key=lambda x: x[period])
-    igrejas = set(_["dizimista__igreja__nome"] for _ in queryset)
-    plot_data = [
-        dict(
-            x=[_[period] for _ in reversed_qs if _["dizimista__igreja__nome"] == i],
-            y=[float(_["total_recebido"]) for _ in reversed_qs if _["dizimista__igreja__nome"] == i],
-            type="bar",
-            name=i,
-        )
-        for i in igrejas
-    ]
-    return plot_data
+
+def periodo_selecionado(cl):
+    """Agrupamento escolhido na requisição do changelist `cl`.
+
+    Vem da instância do filtro criada para a requisição, e não de um estado
+    compartilhado, para que requisições simultâneas em threads diferentes não
+    vejam o agrupamento umas das outras.
+    """
+    for spec in cl.filter_specs:
+        if isinstance(spec, GroupByDateListFilter):
+            return spec.periodo()
+    return GroupByDateListFilter.padrao
+
+
+def format_plot_data(rows, period):
+    """Dados do gráfico em colunas, a partir de `group_date_by_periord`.
+
+    Devolve os períodos (`x`), as igrejas e, para cada igreja, uma coluna com
+    um valor por período, além do `total` de cada período. Uma única passada
+    pelas linhas preenche as colunas; os períodos sem pagamentos ficam com
+    zero, de modo que as barras das igrejas se alinham no mesmo eixo.
+    """
+    if not rows:
+        return {"periodo": period, "x": [], "igrejas": [], "y": [], "total": []}
+    periodos = periodos_entre(
+        min(row[period] for row in rows), max(row[period] for row in rows), period
+    )
+    posicao = {periodo: i for i, periodo in enumerate(periodos)}
+    colunas = {}
+    for row in rows:
+        coluna = colunas.get(row["igreja__nome"])
+        if coluna is None:
+            coluna = colunas[row["igreja__nome"]] = [0.0] * len(periodos)
+        coluna[posicao[row[period]]] += float(row["total_recebido"])
+    igrejas = sorted(colunas, key=_nome)
+    return {
+        "periodo": period,
+        "x": periodos,
+        "igrejas": igrejas,
+        "y": [colunas[igreja] for igreja in igrejas],
+        "total": [sum(valores) for valores in zip(*colunas.values())],
+    }
+
+
+def _nome(nome):
+    # Igrejas sem nome (pagamentos sem dizimista) por último.
+    return (nome is None, nome or "")
+
+
+def _data_do_parametro(request, nome):
+    valor = request.GET.get(nome)
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except ValueError:
+        raise SuspiciousOperation(f"Data inválida em {nome!r}: {valor!r}")
 
 
 @admin.register(ResumoPagamentos)
-class ResumoPagamentosAdmin(admin.ModelAdmin, GroupByDateListFilter):
+class ResumoPagamentosAdmin(admin.ModelAdmin):
     change_list_template = "admin/resumopagamentos/change_list.html"
-    list_filter = (PagamentoIgrejaFilter, GroupByDateListFilter, DataMonthListFilter)
+    list_filter = (IgrejaListFilter, GroupByDateListFilter, DiaMonthListFilter)
+    show_full_result_count = False
 
     def get_queryset(self, request: HttpRequest):
         qs = super().get_queryset(request)
         user = request.user
         if user.is_superuser:
             return qs
-        igrejas = igrejas_do_usuário(user)
-        return qs.filter(dizimista__igreja__in=igrejas)
+        return qs.filter(igreja__in=ids_das_igrejas_do_usuário(user))
+
+    def get_urls(self):
+        urls = [
+            path(
+                "serie/",
+                self.admin_site.admin_view(self.serie_view),
+                name="gestao_resumopagamentos_serie",
+            )
+        ]
+        return urls + super().get_urls()
+
+    def serie_view(self, request):
+        """Série do gráfico de pagamentos em JSON (veja `format_plot_data`).
+
+        Aceita os filtros do changelist, aplicados pelo próprio changelist, e
+        um intervalo de dias (`de`, inclusive, e `ate`, exclusive). Além das
+        colunas do gráfico, traz as `linhas` da tabela do changelist.
+
+        Com um cache compartilhado, os cabeçalhos `ETag` e `Last-Modified` vêm
+        da versão das igrejas do usuário, de modo que, enquanto nenhum
+        pagamento muda, o navegador revalida a série sem que ela seja
+        recalculada (`304 Not Modified`). Com um cache local, a versão não vê
+        os pagamentos registrados por outros processos: a série é sempre
+        recalculada.
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        response = etag = None
+        if cache_compartilhado():
+            user = request.user
+            escopo = (
+                [TODAS_AS_IGREJAS]
+                if user.is_superuser
+                else ids_das_igrejas_do_usuário(user)
+            )
+            versoes = [PARTICIPACOES, *de_igrejas(escopo)]
+            modificado = int(modificado_em(*versoes))
+            parametros = sorted(request.GET.lists())
+            etag = '"{}"'.format(
+                md5(
+                    f"{assinatura(*versoes)}:{modificado}:{escopo}:{parametros}".encode()
+                ).hexdigest()
+            )
+            response = get_conditional_response(
+                request, etag=etag, last_modified=modificado
+            )
+        if response is None:
+            de = _data_do_parametro(request, "de")
+            ate = _data_do_parametro(request, "ate")
+            # O intervalo não é um filtro do changelist, que o trataria como lookup.
+            request_do_changelist = copy(request)
+            request_do_changelist.GET = request.GET.copy()
+            request_do_changelist.GET.pop("de", None)
+            request_do_changelist.GET.pop("ate", None)
+            try:
+                cl = self.get_changelist_instance(request_do_changelist)
+            except IncorrectLookupParameters as exc:
+                raise SuspiciousOperation(str(exc)) from exc
+            period = periodo_selecionado(cl)
+            queryset = cl.get_queryset(request_do_changelist)
+            if de:
+                queryset = queryset.filter(dia__gte=de)
+            if ate:
+                queryset = queryset.filter(dia__lt=ate)
+            rows = group_date_by_periord(queryset, period)
+            dados = format_plot_data(rows, period)
+            dados["linhas"] = [
+                [
+                    row["igreja__nome"],
+                    row[period],
+                    row["pagamentos"],
+                    float(row["total_recebido"]),
+                ]
+                for row in rows
+            ]
+            response = JsonResponse(dados)
+        if etag is not None:
+            response.headers["ETag"] = etag
+            response.headers["Last-Modified"] = http_date(modificado)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
     def changelist_view(self, request, extra_context=None):
         response = super().changelist_view(
             request,
             extra_context=extra_context,
         )
-        if response.context_data is None:
+        # Redirecionamentos (filtro inválido) não têm contexto.
+        if getattr(response, "context_data", None) is None:
             return response
         try:
-            queryset = response.context_data["cl"].queryset
-        except (AttributeError, KeyError):
+            cl = response.context_data["cl"]
+        except KeyError:
             return response
-        if queryset:
-            period = self.selected_group
-            print(period)
-            date_format = self.groups_settings[period]["date_format"]
-            queryset = group_date_by_periord(queryset, period)
-            plot_data = format_plot_data(queryset, period)
-            response.context_data["plot_data"] = plot_data
-            response.context_data["xaxis"] = dict(title=period.title(), tickformat=date_format)
-            response.context_data["yaxis"] = dict(title="Total Recebido (R$)")
-            response.context_data["plot_id"] = "chart"
-            response.context_data["data"] = queryset
-            response.context_data["headers"] = [
-                "Igreja",
-                self.selected_group.title(),
-                "Pagamentos",
-                "Total (R$)",
-            ]
+        period = periodo_selecionado(cl)
+        # O gráfico e a tabela são preenchidos com a série, buscada depois de a
+        # página ser exibida: o agrupamento é calculado uma vez, em `serie_view`.
+        response.context_data["serie_url"] = "{}?{}".format(
+            reverse("admin:gestao_resumopagamentos_serie"), request.GET.urlencode()
+        )
+        response.context_data["xaxis"] = {"title": period.title()}
+        response.context_data["yaxis"] = {"title": "Total Recebido (R$)"}
+        response.context_data["plot_id"] = "chart"
+        response.context_data["headers"] = [
+            "Igreja",
+            period.title(),
+            "Pagamentos",
+            "Total (R$)",
+        ]
         return response
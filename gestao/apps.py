@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class GestaoConfig(AppConfig):
     name = "gestao"
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        from .grupos import provisionar_grupos_apos_migrar
+
+        post_migrate.connect(provisionar_grupos_apos_migrar, sender=self)
@@ -0,0 +1,108 @@
+"""Autocomplete dos campos `dizimista` e `igreja` do admin.
+
+Substitui o autocomplete genérico do admin para esses dois models: em vez da
+busca do changelist e de um `__str__()` por resultado, faz uma busca por
+prefixo em `nome_busca` (indexado, sem acentos) restrita às igrejas do usuário
+e monta os rótulos na mesma consulta. As respostas ficam alguns segundos em
+cache, com a versão dos dados na chave. Os demais campos seguem para a view
+do admin. `gestao.sites.GestaoAdminSite` serve a view na própria url
+`admin:autocomplete`.
+"""
+
+from hashlib import md5
+
+from django.contrib.admin.views.autocomplete import AutocompleteJsonView
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+
+from core.busca import com_prefixo
+
+from .admin import ids_das_igrejas_do_usuário
+from .models import Dizimista, Igreja
+from .versoes import PARTICIPACOES, PERFIS, TODAS_AS_IGREJAS, assinatura, de_igrejas
+
+AUTOCOMPLETE_TIMEOUT = 30
+POR_PAGINA = 20
+
+
+def rotulo_do_perfil(nome, username):
+    # O mesmo texto de `Perfil.__str__()`.
+    return f"{nome} ({username})" if username else nome
+
+
+def dizimistas_por_prefixo(queryset, to_field_name, termo, fatia):
+    queryset = com_prefixo(queryset, termo, "perfil__nome_busca").order_by(
+        "perfil__nome_busca", "pk"
+    )
+    linhas = queryset.values_list(
+        to_field_name, "perfil__nome", "perfil__user__username"
+    )[fatia]
+    return [
+        (valor, rotulo_do_perfil(nome or "", username))
+        for valor, nome, username in linhas
+    ]
+
+
+def igrejas_por_prefixo(queryset, to_field_name, termo, fatia):
+    queryset = com_prefixo(queryset, termo).order_by("nome_busca", "pk")
+    return list(queryset.values_list(to_field_name, "nome")[fatia])
+
+
+# Model -> (função que lista as opções, versões dos dados de que a resposta depende).
+OPCOES = {
+    Dizimista: (dizimistas_por_prefixo, lambda escopo: [PERFIS, *de_igrejas(escopo)]),
+    Igreja: (igrejas_por_prefixo, lambda escopo: [PARTICIPACOES]),
+}
+
+
+class AutocompleteView(AutocompleteJsonView):
+    def get(self, request, *args, **kwargs):
+        self.term, self.model_admin, self.source_field, to_field_name = (
+            self.process_request(request)
+        )
+        model = self.model_admin.model
+        if model not in OPCOES:
+            return super().get(request, *args, **kwargs)
+        if not self.has_perm(request):
+            raise PermissionDenied
+        try:
+            pagina = max(int(request.GET.get("page", 1)), 1)
+        except ValueError:
+            pagina = 1
+
+        user = request.user
+        escopo = (
+            [TODAS_AS_IGREJAS]
+            if user.is_superuser
+            else ids_das_igrejas_do_usuário(user)
+        )
+        listar, versoes = OPCOES[model]
+        parametros = f"{self.source_field.model._meta.label}.{self.source_field.name}:{self.term}:{pagina}"
+        chave = "autocomplete:{}:{}:{}".format(
+            assinatura(*versoes(escopo)),
+            md5(",".join(map(str, escopo)).encode()).hexdigest(),
+            md5(parametros.encode()).hexdigest(),
+        )
+        dados = cache.get(chave)
+        if dados is None:
+            queryset = self.model_admin.get_queryset(request).complex_filter(
+                self.source_field.get_limit_choices_to()
+            )
+            inicio = (pagina - 1) * POR_PAGINA
+            # Uma linha a mais diz se há outra página, sem `COUNT(*)`.
+            opcoes = listar(
+                queryset,
+                to_field_name,
+                self.term,
+                slice(inicio, inicio + POR_PAGINA + 1),
+            )
+            dados = {
+                "results": [
+                    {"id": str(valor), "text": texto}
+                    for valor, texto in opcoes[:POR_PAGINA]
+                ],
+                "pagination": {"more": len(opcoes) > POR_PAGINA},
+            }
+            cache.set(chave, dados, AUTOCOMPLETE_TIMEOUT)
+        return JsonResponse(dados)
@@ -0,0 +1,221 @@
+"""Medição de tempo e de consultas SQL das páginas do admin.
+
+Usado pelo comando `benchmark_admin`, que gera relatórios JSON comparáveis
+entre commits (ou entre configurações do banco, como com e sem o pool de
+conexões), e pelos testes de orçamento de consultas em `gestao.tests`.
+"""
+
+import re
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.core.cache import cache
+from django.db import close_old_connections, connections
+from django.test import Client, override_settings
+
+from .middleware import ConsultasSQL
+from .models import Dizimista, Igreja, Pagamento
+
+# Endpoints medidos: nome -> (método, url, dados do POST). As urls e os dados
+# são formatados com os alvos devolvidos por `alvos_do_benchmark`.
+ENDPOINTS = {
+    "index": ("get", "/", None),
+    "dizimista:changelist": ("get", "/gestao/dizimista/", None),
+    "dizimista:change": ("get", "/gestao/dizimista/{dizimista}/change/", None),
+    "dizimista:autocomplete": (
+        "get",
+        "/autocomplete/?app_label=gestao&model_name=pagamento&field_name=dizimista&term=a",
+        None,
+    ),
+    "dizimista:export": (
+        "post",
+        "/gestao/dizimista/",
+        {
+            "action": "export_as_csv",
+            "select_across": "1",
+            "index": "0",
+            "_selected_action": "{dizimista}",
+        },
+    ),
+    "pagamento:changelist": ("get", "/gestao/pagamento/", None),
+    "pagamento:change": ("get", "/gestao/pagamento/{pagamento}/change/", None),
+    "pagamento:export": (
+        "post",
+        "/gestao/pagamento/",
+        {
+            "action": "export_as_csv",
+            "select_across": "1",
+            "index": "0",
+            "_selected_action": "{pagamento}",
+        },
+    ),
+    "igreja:changelist": ("get", "/gestao/igreja/", None),
+    "igreja:change": ("get", "/gestao/igreja/{igreja}/change/", None),
+    "igreja:autocomplete": (
+        "get",
+        "/autocomplete/?app_label=gestao&model_name=dizimista&field_name=igreja&term=Igreja",
+        None,
+    ),
+    "igreja:export": (
+        "post",
+        "/gestao/igreja/",
+        {
+            "action": "export_as_csv",
+            "select_across": "1",
+            "index": "0",
+            "_selected_action": "{igreja}",
+        },
+    ),
+    "resumopagamentos:semana": (
+        "get",
+        "/gestao/resumopagamentos/?group_date_by=semana",
+        None,
+    ),
+    "resumopagamentos:mes": (
+        "get",
+        "/gestao/resumopagamentos/?group_date_by=mês",
+        None,
+    ),
+    "resumopagamentos:serie": (
+        "get",
+        "/gestao/resumopagamentos/serie/?group_date_by=semana",
+        None,
+    ),
+}
+
+# Cache próprio das medições: `medir` o esvazia antes de cada endpoint, o que
+# não pode apagar o cache compartilhado (CACHE_URL) dos workers em produção.
+CACHES_DO_BENCHMARK = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark",
+    }
+}
+
+# Máximo de consultas por requisição, conferido pelos testes em
+# `gestao.tests.OrcamentoDeConsultasTestCase` com duas igrejas de 20
+# dizimistas cada. Páginas sem consultas por linha não passam desses valores
+# com qualquer volume de dados; as demais crescem com o tamanho da página.
+ORCAMENTOS = {
+    "index": 8,
+    "dizimista:changelist": 8,
+    "dizimista:change": 12,
+    "dizimista:autocomplete": 6,
+    "dizimista:export": 8,
+    "pagamento:changelist": 9,
+    "pagamento:change": 9,
+    "pagamento:export": 9,
+    "igreja:changelist": 10,
+    "igreja:change": 11,
+    "igreja:autocomplete": 6,
+    "igreja:export": 11,
+    "resumopagamentos:semana": 10,
+    "resumopagamentos:mes": 10,
+    "resumopagamentos:serie": 8,
+}
+
+
+def varreduras_completas(queryset, model=Pagamento):
+    """Linhas do `EXPLAIN` do queryset em que a tabela de `model` é lida inteira.
+
+    Reconhece o plano do SQLite (`SCAN tabela` sem `USING ... INDEX`) e o do
+    PostgreSQL (`Seq Scan on tabela`).
+    """
+    tabela = re.escape(model._meta.db_table)
+    padrao = re.compile(rf"\bSCAN {tabela}\b(?! USING)|\bSeq Scan on {tabela}\b")
+    return [
+        linha.strip()
+        for linha in queryset.explain().splitlines()
+        if padrao.search(linha)
+    ]
+
+
+def alvos_do_benchmark(user):
+    """Objetos visíveis ao usuário usados nas páginas de edição e nas ações."""
+    igrejas = Igreja.objects.all()
+    if not user.is_superuser:
+        igrejas = igrejas.filter(agentes=user) | igrejas.filter(gestores=user)
+    igreja = igrejas.order_by("pk").first()
+    dizimista = Dizimista.objects.filter(igreja=igreja).order_by("pk").first()
+    pagamento = Pagamento.objects.filter(dizimista=dizimista).first()
+    return {"igreja": igreja.pk, "dizimista": dizimista.pk, "pagamento": pagamento.pk}
+
+
+def requisitar(client, endpoint, alvos):
+    """Faz a requisição do endpoint e consome a resposta inteira (inclusive streaming)."""
+    metodo, url, dados = ENDPOINTS[endpoint]
+    url = url.format(**alvos)
+    if dados is not None:
+        dados = {chave: valor.format(**alvos) for chave, valor in dados.items()}
+    response = getattr(client, metodo)(url, dados)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    elif hasattr(response, "render") and not response.is_rendered:
+        response.render()
+    return response
+
+
+def medir(client, endpoint, alvos, repeticoes=3):
+    """Mede um endpoint com o cache vazio e, depois, com o cache aquecido.
+
+    As medições usam um cache local (`CACHES_DO_BENCHMARK`), nunca o CACHE_URL
+    configurado.
+    """
+    with override_settings(CACHES=CACHES_DO_BENCHMARK):
+        cache.clear()
+        with ConsultasSQL() as sql:
+            inicio = perf_counter()
+            response = requisitar(client, endpoint, alvos)
+            primeira = perf_counter() - inicio
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = perf_counter()
+            requisitar(client, endpoint, alvos)
+            tempos.append(perf_counter() - inicio)
+    return {
+        "endpoint": endpoint,
+        "status": response.status_code,
+        "primeira_ms": round(primeira * 1000, 2),
+        "tempo_ms": round(statistics.median(tempos) * 1000, 2) if tempos else None,
+        "consultas": sql.consultas,
+        "tempo_sql_ms": round(sql.tempo * 1000, 2),
+        "orcamento": ORCAMENTOS[endpoint],
+    }
+
+
+def vazao(client, endpoint, alvos, threads=8, segundos=5.0):
+    """Requisições por segundo do endpoint com `threads` clientes simultâneos.
+
+    Cada thread usa a sessão de `client` e a própria conexão com o banco. O
+    cliente de testes mantém a conexão aberta entre as requisições; aqui ela é
+    devolvida ao fim de cada uma, como num worker do gunicorn (fechada, mantida
+    por `CONN_MAX_AGE` ou devolvida ao pool), que é o que mede o efeito dessas
+    configurações.
+    """
+    fim = perf_counter() + segundos
+
+    def requisitar_ate_o_fim(_):
+        cliente = Client()
+        cliente.cookies = client.cookies
+        feitas = 0
+        try:
+            while perf_counter() < fim:
+                requisitar(cliente, endpoint, alvos)
+                close_old_connections()
+                feitas += 1
+        finally:
+            connections.close_all()
+        return feitas
+
+    inicio = perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        requisicoes = sum(executor.map(requisitar_ate_o_fim, range(threads)))
+    duracao = perf_counter() - inicio
+    return {
+        "endpoint": endpoint,
+        "threads": threads,
+        "requisicoes": requisicoes,
+        "por_segundo": round(requisicoes / duracao, 1),
+    }
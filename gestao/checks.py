@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .versoes import cache_compartilhado
+
+
+@register(Tags.caches, deploy=True)
+def verificar_cache_compartilhado(app_configs, **kwargs):
+    """Avisa, no `check --deploy`, quando o cache padrão é local ao processo.
+
+    As versões em `gestao.versoes` só invalidam os caches de todos os workers
+    se eles lerem o mesmo cache; com o `locmemcache://` padrão, cada processo
+    continuaria servindo os dados antigos.
+    """
+    if cache_compartilhado():
+        return []
+    return [
+        Warning(
+            "O cache padrão é local ao processo.",
+            hint="Defina CACHE_URL com um cache compartilhado (ex.: redis://redis:6379/1).",
+            obj=settings.CACHES["default"]["BACKEND"],
+            id="gestao.W001",
+        )
+    ]
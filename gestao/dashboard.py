@@ -0,0 +1,61 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from .admin import ids_das_igrejas_do_usuário
+from .models import Dizimista, ResumoDiario
+from .versoes import TODAS_AS_IGREJAS, assinatura, de_igrejas
+
+DASHBOARD_TIMEOUT = 60
+
+
+def intervalo_do_mês(dia=None):
+    """Primeiro dia do mês de `dia` e primeiro dia do mês seguinte."""
+    dia = dia or timezone.localdate()
+    inicio = dia.replace(day=1)
+    fim = (inicio + timedelta(days=32)).replace(day=1)
+    return inicio, fim
+
+
+def _chave(escopo, inicio):
+    """Chave do painel para um conjunto de igrejas.
+
+    A chave inclui a versão de cada igreja do escopo, de modo que invalidar uma
+    igreja invalida todos os painéis que a incluem.
+    """
+    return f"dashboard:{inicio:%Y-%m}:{assinatura(*de_igrejas(escopo))}"
+
+
+def calcular_indicadores(escopo, inicio, fim):
+    resumos = ResumoDiario.objects.filter(dia__gte=inicio, dia__lt=fim)
+    dizimistas = Dizimista.objects.all()
+    if escopo != [TODAS_AS_IGREJAS]:
+        resumos = resumos.filter(igreja__in=escopo)
+        dizimistas = dizimistas.filter(igreja__in=escopo)
+    # O gráfico do painel busca a série à parte (`ResumoPagamentosAdmin.serie_view`).
+    totais = resumos.aggregate(
+        pagamentos=Sum("pagamentos"), recebido=Sum("total_recebido")
+    )
+    return {
+        "num_dizimistas": dizimistas.count(),
+        "num_pagamentos": totais["pagamentos"] or 0,
+        "recebido": totais["recebido"] or Decimal(0),
+    }
+
+
+def indicadores(user):
+    """Indicadores do painel inicial para as igrejas visíveis ao usuário."""
+    inicio, fim = intervalo_do_mês()
+    if user.is_superuser:
+        escopo = [TODAS_AS_IGREJAS]
+    else:
+        escopo = ids_das_igrejas_do_usuário(user)
+    chave = _chave(escopo, inicio)
+    dados = cache.get(chave)
+    if dados is None:
+        dados = calcular_indicadores(escopo, inicio, fim)
+        cache.set(chave, dados, DASHBOARD_TIMEOUT)
+    return dados
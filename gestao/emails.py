@@ -0,0 +1,145 @@
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Email, Pagamento
+
+logger = logging.getLogger(__name__)
+
+MAX_TENTATIVAS = 5
+ESPERA_MAXIMA = timedelta(hours=1)
+# Tempo que um worker tem para enviar os e-mails que reservou.
+RESERVA = timedelta(minutes=10)
+
+
+def enfileirar_email_de_pagamento(pagamento: Pagamento):
+    """Coloca o comprovante do pagamento na caixa de saída.
+
+    Deve ser chamado dentro da transação que salva o pagamento, para que o
+    e-mail só exista se o pagamento for gravado. Retorna `None` quando o
+    dizimista não tem e-mail cadastrado.
+    """
+    perfil = getattr(pagamento.dizimista, "perfil", None)
+    if not getattr(perfil, "email", None):
+        return None
+    return Email.objects.create(
+        assunto="Registro de pagamento",
+        mensagem_html=render_to_string("pagamento.html", {"obj": pagamento}),
+        remetente=settings.EMAIL_HOST_USER,
+        destinatarios=[perfil.email],
+    )
+
+
+def espera_para_nova_tentativa(tentativas):
+    """Espera exponencial entre tentativas: 1, 2, 4, ... minutos, até 1 hora."""
+    return min(timedelta(minutes=2 ** (tentativas - 1)), ESPERA_MAXIMA)
+
+
+def enviados_no_ultimo_minuto():
+    return Email.objects.filter(
+        enviado_em__gte=timezone.now() - timedelta(minutes=1)
+    ).count()
+
+
+def _mensagem(email: Email, connection):
+    mensagem = EmailMultiAlternatives(
+        subject=email.assunto,
+        body=email.mensagem,
+        from_email=email.remetente or None,
+        to=email.destinatarios,
+        connection=connection,
+    )
+    if email.mensagem_html:
+        mensagem.attach_alternative(email.mensagem_html, "text/html")
+    return mensagem
+
+
+def reservar_emails(lote):
+    """Reserva até `lote` e-mails para este worker e os retorna.
+
+    A reserva é uma transação curta: marca os e-mails como `ENVIANDO` até
+    `agora + RESERVA` e já conta a tentativa. Os envios acontecem fora dela;
+    se o worker morrer no meio, a reserva expira e outro worker os pega de
+    novo (sem passar de `MAX_TENTATIVAS`).
+    """
+    agora = timezone.now()
+    with transaction.atomic():
+        Email.objects.filter(
+            status=Email.ENVIANDO,
+            proxima_tentativa__lte=agora,
+            tentativas__gte=MAX_TENTATIVAS,
+        ).update(status=Email.FALHOU, erro="Reserva expirada sem confirmação de envio.")
+        ids = list(
+            Email.objects.select_for_update(skip_locked=True)
+            .filter(
+                status__in=(Email.PENDENTE, Email.ENVIANDO),
+                proxima_tentativa__lte=agora,
+            )
+            .order_by("proxima_tentativa")
+            .values_list("pk", flat=True)[:lote]
+        )
+        Email.objects.filter(pk__in=ids).update(
+            status=Email.ENVIANDO,
+            tentativas=F("tentativas") + 1,
+            proxima_tentativa=agora + RESERVA,
+        )
+    return list(Email.objects.filter(pk__in=ids).order_by("criado_em"))
+
+
+def enviar_emails_pendentes(lote=100, por_minuto=None):
+    """Envia até `lote` e-mails pendentes por uma única conexão SMTP.
+
+    Respeita o limite de `por_minuto` envios (contando os dos outros workers)
+    e reagenda as falhas com espera exponencial até `MAX_TENTATIVAS`.
+    Retorna o número de e-mails enviados.
+    """
+    if por_minuto is not None:
+        lote = min(lote, por_minuto - enviados_no_ultimo_minuto())
+    if lote <= 0:
+        return 0
+    reservados = reservar_emails(lote)
+    if not reservados:
+        return 0
+    enviados = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except (smtplib.SMTPException, OSError) as exc:
+        falha_de_conexao = exc
+    else:
+        falha_de_conexao = None
+    try:
+        for email in reservados:
+            try:
+                if falha_de_conexao is not None:
+                    raise falha_de_conexao
+                connection.send_messages([_mensagem(email, connection)])
+            except (smtplib.SMTPException, OSError) as exc:
+                logger.warning("Falha ao enviar e-mail %s: %s", email.pk, exc)
+                email.erro = str(exc)
+                if email.tentativas >= MAX_TENTATIVAS:
+                    email.status = Email.FALHOU
+                else:
+                    email.status = Email.PENDENTE
+                    email.proxima_tentativa = (
+                        timezone.now() + espera_para_nova_tentativa(email.tentativas)
+                    )
+            else:
+                email.status = Email.ENVIADO
+                email.enviado_em = timezone.now()
+                email.erro = ""
+                enviados += 1
+            # Um a um, para que um worker interrompido não reenvie os já enviados.
+            email.save(
+                update_fields=["status", "proxima_tentativa", "erro", "enviado_em"]
+            )
+    finally:
+        connection.close()
+    return enviados
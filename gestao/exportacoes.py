@@ -0,0 +1,183 @@
+import logging
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+import pdfkit
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import PermissionDenied
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpRequest, QueryDict
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Exportacao
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+# Uma exportação processando há mais tempo que isso teve o worker interrompido
+# e volta para a fila.
+TEMPO_MAXIMO = timedelta(minutes=30)
+PDF_OPTIONS = {
+    "page-size": "A4",
+    "margin-top": "2cm",
+    "margin-right": "1cm",
+    "margin-bottom": "1cm",
+    "margin-left": "2cm",
+    "encoding": "UTF-8",
+}
+
+
+def agendar_exportacao(request, queryset, titulo):
+    """Coloca na fila a exportação da seleção feita no changelist do admin.
+
+    Guarda os filtros da url e os itens marcados (nenhum quando "selecionar
+    todos" foi usado); o worker refaz o queryset com `queryset_da_exportacao`.
+    """
+    if request.POST.get("select_across") == "1":
+        selecionados = None
+    else:
+        selecionados = request.POST.getlist(helpers.ACTION_CHECKBOX_NAME)
+    return Exportacao.objects.create(
+        usuario=request.user,
+        modelo=ContentType.objects.get_for_model(
+            queryset.model, for_concrete_model=False
+        ),
+        titulo=titulo,
+        filtros=request.GET.urlencode(),
+        selecionados=selecionados,
+    )
+
+
+def queryset_da_exportacao(exportacao: Exportacao):
+    """Refaz o queryset do changelist com os filtros e o usuário da exportação."""
+    model = exportacao.modelo.model_class()
+    model_admin = admin.site.get_model_admin(model)
+    request = HttpRequest()
+    request.method = "GET"
+    request.path = reverse(
+        f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist"
+    )
+    request.GET = QueryDict(exportacao.filtros)
+    request.user = exportacao.usuario
+    if not model_admin.has_view_permission(request):
+        raise PermissionDenied("O usuário não tem mais acesso a estes dados.")
+    queryset = model_admin.get_changelist_instance(request).queryset
+    if exportacao.selecionados is not None:
+        queryset = queryset.filter(pk__in=exportacao.selecionados)
+    return queryset
+
+
+def escrever_html(exportacao: Exportacao, arquivo):
+    """Escreve a tabela da exportação em `arquivo`, lendo o banco em blocos.
+
+    Retorna o número de linhas escritas.
+    """
+    queryset = queryset_da_exportacao(exportacao)
+    fields = queryset.model._meta.fields
+    relacionados = [field.name for field in fields if field.is_relation]
+    inicio, fim = render_to_string(
+        "admin/export_as_pdf.html",
+        {
+            "title": exportacao.titulo.title(),
+            "headers": [field.verbose_name for field in fields],
+            "data": [],
+        },
+    ).split("</tbody>")
+    arquivo.write(inicio)
+    linhas = 0
+    bloco = []
+    for obj in queryset.select_related(*relacionados).iterator(chunk_size=CHUNK_SIZE):
+        bloco.append({field.name: getattr(obj, field.name) for field in fields})
+        if len(bloco) == CHUNK_SIZE:
+            arquivo.write(render_to_string("admin/table_rows.html", {"data": bloco}))
+            linhas += len(bloco)
+            bloco = []
+    if bloco:
+        arquivo.write(render_to_string("admin/table_rows.html", {"data": bloco}))
+        linhas += len(bloco)
+    arquivo.write("</tbody>" + fim)
+    return linhas
+
+
+def processar_exportacao(exportacao: Exportacao):
+    """Gera o PDF num diretório temporário e o grava no storage com nome único."""
+    nome = f"{exportacao.titulo}_{timezone.localdate():%Y_%m_%d}.pdf"
+    with tempfile.TemporaryDirectory() as diretorio:
+        html = Path(diretorio) / "exportacao.html"
+        pdf = Path(diretorio) / "exportacao.pdf"
+        with html.open("w", encoding="utf-8") as arquivo:
+            exportacao.linhas = escrever_html(exportacao, arquivo)
+        pdfkit.from_file(str(html), str(pdf), options=PDF_OPTIONS)
+        with pdf.open("rb") as arquivo:
+            exportacao.arquivo.save(
+                f"{exportacao.pk}/{nome}", File(arquivo), save=False
+            )
+    exportacao.tamanho = exportacao.arquivo.size
+    exportacao.status = Exportacao.CONCLUIDA
+    exportacao.concluida_em = timezone.now()
+    exportacao.expira_em = exportacao.concluida_em + timedelta(
+        hours=settings.EXPORTACAO_VALIDADE_HORAS
+    )
+    exportacao.save()
+
+
+def proxima_exportacao():
+    """Reserva a exportação mais antiga da fila para este worker.
+
+    Inclui as que estão processando há mais de `TEMPO_MAXIMO`, cujo worker
+    morreu sem concluí-las.
+    """
+    agora = timezone.now()
+    with transaction.atomic():
+        exportacao = (
+            Exportacao.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Exportacao.PENDENTE)
+                | Q(status=Exportacao.PROCESSANDO, iniciada_em__lt=agora - TEMPO_MAXIMO)
+            )
+            .order_by("criado_em")
+            .first()
+        )
+        if exportacao is not None:
+            exportacao.status = Exportacao.PROCESSANDO
+            exportacao.iniciada_em = agora
+            exportacao.save(update_fields=["status", "iniciada_em"])
+    return exportacao
+
+
+def processar_exportacoes_pendentes():
+    """Processa a fila até esvaziá-la. Retorna o número de exportações processadas."""
+    processadas = 0
+    while (exportacao := proxima_exportacao()) is not None:
+        try:
+            processar_exportacao(exportacao)
+        except Exception as exc:
+            logger.exception("Falha na exportação %s", exportacao.pk)
+            exportacao.status = Exportacao.FALHOU
+            exportacao.erro = str(exc)
+            exportacao.expira_em = timezone.now() + timedelta(
+                hours=settings.EXPORTACAO_VALIDADE_HORAS
+            )
+            exportacao.save(update_fields=["status", "erro", "expira_em"])
+        processadas += 1
+    return processadas
+
+
+def remover_exportacoes_expiradas():
+    """Apaga os arquivos e registros das exportações vencidas."""
+    expiradas = Exportacao.objects.filter(expira_em__lt=timezone.now())
+    removidas = 0
+    for exportacao in expiradas.iterator():
+        if exportacao.arquivo:
+            exportacao.arquivo.delete(save=False)
+        exportacao.delete()
+        removidas += 1
+    return removidas
@@ -0,0 +1,95 @@
+"""Grupos de usuários da pastoral e suas permissões.
+
+Os grupos são criados e têm as permissões sincronizadas depois de cada
+`migrate` (sinal `post_migrate`); no restante do tempo, `grupo()` só devolve
+o objeto guardado no processo.
+"""
+
+from django.contrib.auth.models import Group, User
+
+from core.models import Perfil
+from core.permissoes import limpar_registro, permissoes, sincronizar_permissoes
+
+from .models import Dizimista, Igreja, Pagamento, PerfilDizimista, ResumoPagamentos
+
+GESTORES = "Gestores da pastoral"
+AGENTES = "Agentes da pastoral"
+
+PERMISSOES_DOS_GRUPOS = {
+    GESTORES: (
+        (User, "view"),
+        (User, "change"),
+        (Perfil, "view"),
+        (Perfil, "add"),
+        (Perfil, "change"),
+        (Dizimista, "view"),
+        (Dizimista, "add"),
+        (Dizimista, "change"),
+        (Dizimista, "delete"),
+        (PerfilDizimista, "view"),
+        (PerfilDizimista, "add"),
+        (PerfilDizimista, "change"),
+        (Igreja, "view"),
+        (Igreja, "change"),
+        (Pagamento, "view"),
+        (Pagamento, "add"),
+        (Pagamento, "change"),
+        (ResumoPagamentos, "view"),
+    ),
+    AGENTES: (
+        (User, "view"),
+        (User, "change"),
+        (Perfil, "view"),
+        (Perfil, "add"),
+        (Perfil, "change"),
+        (Dizimista, "view"),
+        (Dizimista, "add"),
+        (Dizimista, "change"),
+        (PerfilDizimista, "view"),
+        (PerfilDizimista, "add"),
+        (PerfilDizimista, "change"),
+        (Igreja, "view"),
+        (Pagamento, "view"),
+        (Pagamento, "add"),
+        (ResumoPagamentos, "view"),
+    ),
+}
+
+_grupos = {}
+
+
+def provisionar_grupos():
+    """Cria os grupos que faltam e sincroniza as permissões de todos."""
+    pares = {par for pares in PERMISSOES_DOS_GRUPOS.values() for par in pares}
+    permissoes(*pares)  # resolve todas de uma vez
+    existentes = {
+        grupo.name: grupo
+        for grupo in Group.objects.filter(name__in=PERMISSOES_DOS_GRUPOS)
+    }
+    for nome, pares in PERMISSOES_DOS_GRUPOS.items():
+        grupo = existentes.get(nome) or Group.objects.create(name=nome)
+        sincronizar_permissoes(grupo.permissions, permissoes(*pares))
+        _grupos[nome] = grupo
+    return dict(_grupos)
+
+
+def grupo(nome):
+    if nome not in _grupos:
+        _grupos.update(
+            (g.name, g) for g in Group.objects.filter(name__in=PERMISSOES_DOS_GRUPOS)
+        )
+    if nome not in _grupos:
+        # Banco migrado antes de o grupo existir.
+        provisionar_grupos()
+    return _grupos[nome]
+
+
+def esquecer_grupos():
+    _grupos.clear()
+
+
+def provisionar_grupos_apos_migrar(sender, **kwargs):
+    # O banco pode ter sido recriado (`flush`, banco de testes): os ids guardados não valem mais.
+    limpar_registro()
+    esquecer_grupos()
+    provisionar_grupos()
@@ -0,0 +1,218 @@
+import json
+import math
+import platform
+import subprocess
+from io import StringIO
+from operator import itemgetter
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from gestao.benchmark import ENDPOINTS, alvos_do_benchmark, medir, vazao
+from gestao.models import Igreja
+
+MULTIPLICADORES = {"k": 1_000, "m": 1_000_000}
+MESES = 12
+
+
+def escala(valor):
+    """Converte "1k", "100k", "1M" ou "2500" em número de pagamentos."""
+    valor = valor.strip().lower()
+    if valor and valor[-1] in MULTIPLICADORES:
+        return int(float(valor[:-1]) * MULTIPLICADORES[valor[-1]])
+    return int(valor)
+
+
+def parametros_da_escala(pagamentos):
+    """Igrejas e dizimistas para gerar ~`pagamentos` pagamentos em `MESES` meses."""
+    dizimistas = math.ceil(pagamentos / (MESES * 0.9))
+    igrejas = min(300, max(3, dizimistas // 300))
+    return {"igrejas": igrejas, "dizimistas": dizimistas, "meses": MESES}
+
+
+def commit_atual():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede tempo e consultas SQL das páginas do admin em bancos de teste gerados "
+        "com `gerar_dados`, como superusuário e como agente, e grava um relatório JSON. "
+        "Com --vazao, mede também requisições por segundo com clientes simultâneos; para "
+        "comparar com e sem o pool de conexões, rode com POSTGRES_POOL=0 e depois com "
+        "POSTGRES_POOL=1 e --comparar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--escalas",
+            nargs="+",
+            default=["1k", "100k", "1M"],
+            help="Número aproximado de pagamentos de cada banco (ex.: 1k 100k 1M).",
+        )
+        parser.add_argument(
+            "--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS)
+        )
+        parser.add_argument("--repeticoes", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--processos", type=int, default=1, help="Repassado a `gerar_dados`."
+        )
+        parser.add_argument(
+            "--saida", default="benchmark.json", help="Arquivo do relatório JSON."
+        )
+        parser.add_argument(
+            "--comparar", help="Relatório anterior para comparar com este."
+        )
+        parser.add_argument(
+            "--vazao",
+            type=float,
+            default=0,
+            help="Segundos medindo requisições por segundo de cada endpoint com clientes simultâneos (0: não mede).",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=8,
+            help="Clientes simultâneos na medição de vazão.",
+        )
+
+    def medir_escala(self, pagamentos, options):
+        call_command("flush", interactive=False, verbosity=0)
+        parametros = parametros_da_escala(pagamentos)
+        call_command(
+            "gerar_dados",
+            seed=options["seed"],
+            processos=options["processos"],
+            stdout=StringIO(),
+            **parametros,
+        )
+        superusuario = User.objects.create_superuser("benchmark", password="benchmark")
+        agente = Igreja.objects.order_by("pk").first().agentes.order_by("pk").first()
+        resultados = []
+        vazoes = []
+        for user in (superusuario, agente):
+            client = Client()
+            client.force_login(user)
+            alvos = alvos_do_benchmark(user)
+            for endpoint in options["endpoints"]:
+                resultado = medir(
+                    client, endpoint, alvos, repeticoes=options["repeticoes"]
+                )
+                resultado.update(
+                    escala=pagamentos,
+                    usuario="superusuario" if user.is_superuser else "agente",
+                )
+                resultados.append(resultado)
+                self.stdout.write(
+                    f"{pagamentos:>9} {resultado['usuario']:<12} {endpoint:<26} "
+                    f"{resultado['tempo_ms']:>9} ms {resultado['consultas']:>4} consultas "
+                    f"{resultado['tempo_sql_ms']:>9} ms SQL"
+                )
+                if options["vazao"]:
+                    resultado = vazao(
+                        client,
+                        endpoint,
+                        alvos,
+                        threads=options["threads"],
+                        segundos=options["vazao"],
+                    )
+                    resultado.update(
+                        escala=pagamentos,
+                        usuario="superusuario" if user.is_superuser else "agente",
+                    )
+                    vazoes.append(resultado)
+                    self.stdout.write(
+                        f"{pagamentos:>9} {resultado['usuario']:<12} {endpoint:<26} "
+                        f"{resultado['por_segundo']:>9} req/s com {resultado['threads']} threads"
+                    )
+        return {"parametros": parametros, "resultados": resultados, "vazao": vazoes}
+
+    def comparar(self, anterior, atual):
+        chave = itemgetter("escala", "usuario", "endpoint")
+        antes = {
+            chave(r): r for escala in anterior["escalas"] for r in escala["resultados"]
+        }
+        self.stdout.write(
+            f"\nComparação com {anterior.get('commit') or 'relatório anterior'}:"
+        )
+        for escala in atual["escalas"]:
+            for r in escala["resultados"]:
+                a = antes.get(chave(r))
+                if a is None:
+                    continue
+                variacao = (
+                    (r["tempo_ms"] - a["tempo_ms"]) / a["tempo_ms"] * 100
+                    if a["tempo_ms"]
+                    else 0
+                )
+                alerta = (
+                    "  <- mais consultas" if r["consultas"] > a["consultas"] else ""
+                )
+                self.stdout.write(
+                    f"{r['escala']:>9} {r['usuario']:<12} {r['endpoint']:<26} "
+                    f"{a['tempo_ms']:>9} -> {r['tempo_ms']:>9} ms ({variacao:+.0f}%) "
+                    f"{a['consultas']:>4} -> {r['consultas']:>4} consultas{alerta}"
+                )
+        antes = {
+            chave(r): r
+            for escala in anterior["escalas"]
+            for r in escala.get("vazao", [])
+        }
+        for escala in atual["escalas"]:
+            for r in escala.get("vazao", []):
+                a = antes.get(chave(r))
+                if a is None:
+                    continue
+                variacao = (
+                    (r["por_segundo"] - a["por_segundo"]) / a["por_segundo"] * 100
+                    if a["por_segundo"]
+                    else 0
+                )
+                self.stdout.write(
+                    f"{r['escala']:>9} {r['usuario']:<12} {r['endpoint']:<26} "
+                    f"{a['por_segundo']:>9} -> {r['por_segundo']:>9} req/s ({variacao:+.0f}%)"
+                )
+
+    def handle(self, *args, **options):
+        try:
+            escalas = [escala(valor) for valor in options["escalas"]]
+        except ValueError as exc:
+            raise CommandError(f"Escala inválida: {exc}") from exc
+        setup_test_environment()
+        nome_original = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            relatorio = {
+                "commit": commit_atual(),
+                "data": timezone.now().isoformat(),
+                "banco": connection.vendor,
+                "pool": bool(connection.settings_dict["OPTIONS"].get("pool")),
+                "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+                "python": platform.python_version(),
+                "escalas": [
+                    self.medir_escala(pagamentos, options) for pagamentos in escalas
+                ],
+            }
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teardown_test_environment()
+        with open(options["saida"], "w") as arquivo:
+            json.dump(relatorio, arquivo, indent=2)
+        self.stdout.write(
+            self.style.SUCCESS(f"Relatório gravado em {options['saida']}.")
+        )
+        if options["comparar"]:
+            with open(options["comparar"]) as arquivo:
+                self.comparar(json.load(arquivo), relatorio)
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gestao.emails import enviar_emails_pendentes
+
+
+class Command(BaseCommand):
+    help = "Envia os e-mails da caixa de saída por uma única conexão SMTP."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote", type=int, default=100, help="E-mails enviados por conexão."
+        )
+        parser.add_argument(
+            "--por-minuto",
+            type=int,
+            default=settings.EMAIL_MAX_POR_MINUTO,
+            help="Limite de envios por minuto (padrão: EMAIL_MAX_POR_MINUTO).",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Continua verificando a caixa de saída em vez de sair após um lote.",
+        )
+        parser.add_argument(
+            "--intervalo", type=float, default=5, help="Segundos entre verificações."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            enviados = enviar_emails_pendentes(
+                lote=options["lote"], por_minuto=options["por_minuto"]
+            )
+            if enviados:
+                self.stdout.write(f"{enviados} e-mails enviados.")
+            if not options["loop"]:
+                break
+            time.sleep(options["intervalo"])
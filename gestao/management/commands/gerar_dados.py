@@ -0,0 +1,285 @@
+import multiprocessing
+import random
+import uuid
+from datetime import date, datetime, timedelta
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from core.busca import normalizar
+from core.models import Perfil, chave_de_aniversario
+from gestao.admin import AGENTES_GROUP, GESTORES_GROUP
+from gestao.models import Dizimista, Igreja, Pagamento, PerfilDizimista
+from gestao.resumos import reconstruir_resumos, recontar_dizimistas, recontar_pagamentos
+from gestao.versoes import PARTICIPACOES, invalidar
+
+TAXA_DE_ADIMPLENCIA = 0.9
+PAGAMENTOS_VALORES = (20, 30, 40, 50, 70, 100, 200)
+GENEROS = ("F", "M")
+
+
+def novo_faker(seed):
+    try:
+        from faker import Faker
+    except ImportError as exc:
+        raise CommandError(
+            "O pacote faker é necessário: instale as dependências de desenvolvimento."
+        ) from exc
+    faker = Faker("pt-BR")
+    faker.seed_instance(seed)
+    return faker
+
+
+def dados_de_perfil(faker, rng, ate):
+    nascimento = faker.date_between(
+        ate - timedelta(days=70 * 365), ate - timedelta(days=20 * 365)
+    )
+    nome = faker.name()[:50]
+    return {
+        "nome": nome,
+        "genero": rng.choice(GENEROS),
+        "endereco": faker.street_address(),
+        "nascimento": nascimento,
+        # `bulk_create` não chama `Perfil.save()`, que é quem calcula os campos derivados.
+        "aniversario": chave_de_aniversario(nascimento),
+        "nome_busca": normalizar(nome),
+        "telefone": faker.phone_number()[:20],
+        "email": faker.free_email(),
+    }
+
+
+def criar_perfis_dizimistas(perfis, dizimistas, batch_size):
+    """Insere `PerfilDizimista` em lote.
+
+    `bulk_create` não aceita herança multi-tabela, então as linhas de `Perfil`
+    são criadas com `bulk_create` e as da tabela filha com `executemany`.
+    """
+    Perfil.objects.bulk_create(perfis, batch_size=batch_size)
+    meta = PerfilDizimista._meta
+    colunas = [meta.get_field("perfil_ptr").column, meta.get_field("dizimista").column]
+    sql = "INSERT INTO {} ({}) VALUES (%s, %s)".format(
+        connection.ops.quote_name(meta.db_table),
+        ", ".join(connection.ops.quote_name(coluna) for coluna in colunas),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            sql,
+            [
+                (perfil.pk, dizimista.pk)
+                for perfil, dizimista in zip(perfis, dizimistas)
+            ],
+        )
+
+
+def gerar_igreja(args):
+    """Gera os dizimistas e pagamentos de uma igreja; roda em um processo próprio."""
+    igreja_id, agentes, num_dizimistas, meses, ate, seed, batch_size = args
+    rng = random.Random(seed)
+    faker = novo_faker(seed)
+    # Os pagamentos terminam no início do dia `ate`, e não agora: assim a mesma
+    # semente gera as mesmas datas em qualquer dia.
+    fim = timezone.make_aware(datetime.combine(ate, datetime.min.time()))
+    janela = timedelta(days=30).total_seconds()
+    pagamentos = 0
+    with transaction.atomic():
+        dizimistas = Dizimista.objects.bulk_create(
+            [
+                Dizimista(igreja_id=igreja_id, dizimo=rng.choice(PAGAMENTOS_VALORES))
+                for _ in range(num_dizimistas)
+            ],
+            batch_size=batch_size,
+        )
+        perfis = [Perfil(**dados_de_perfil(faker, rng, ate)) for _ in dizimistas]
+        criar_perfis_dizimistas(perfis, dizimistas, batch_size)
+        lote = []
+        for dizimista in dizimistas:
+            for m in range(meses, 0, -1):
+                if rng.random() >= TAXA_DE_ADIMPLENCIA:
+                    continue
+                lote.append(
+                    Pagamento(
+                        id=uuid.UUID(int=rng.getrandbits(128), version=4),
+                        dizimista_id=dizimista.pk,
+                        data=fim
+                        - timedelta(seconds=janela * (m - 1) + rng.random() * janela),
+                        valor=rng.choice(PAGAMENTOS_VALORES),
+                        registrado_por_id=rng.choice(agentes) if agentes else None,
+                    )
+                )
+                if len(lote) == batch_size:
+                    Pagamento.objects.bulk_create(lote)
+                    pagamentos += len(lote)
+                    lote = []
+        Pagamento.objects.bulk_create(lote)
+        pagamentos += len(lote)
+    return num_dizimistas, pagamentos
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera igrejas, agentes, gestores, dizimistas e pagamentos sintéticos em lote. "
+        "Com a mesma semente, a mesma data em --ate e o mesmo banco vazio, os dados "
+        "gerados são os mesmos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--igrejas", type=int, default=3)
+        parser.add_argument(
+            "--dizimistas", type=int, default=100, help="Total de dizimistas."
+        )
+        parser.add_argument(
+            "--meses", type=int, default=4, help="Meses de pagamentos por dizimista."
+        )
+        parser.add_argument("--agentes-por-igreja", type=int, default=2)
+        parser.add_argument("--gestores-por-igreja", type=int, default=1)
+        parser.add_argument(
+            "--ate",
+            type=date.fromisoformat,
+            default=None,
+            help="Os pagamentos vão até o início deste dia (AAAA-MM-DD; padrão: hoje).",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--processos",
+            type=int,
+            default=1,
+            help="Processos gerando igrejas em paralelo (apenas PostgreSQL).",
+        )
+        parser.add_argument(
+            "--senha",
+            default="dizimo123",
+            help="Senha de todos os usuários gerados (calculada uma única vez).",
+        )
+
+    def criar_usuarios(
+        self, prefixo, quantidade, igrejas, senha, grupo, faker, rng, ate
+    ):
+        """Cria `quantidade` usuários por igreja e devolve {igreja_id: [user_id, ...]}."""
+        usuarios = []
+        for i, igreja in enumerate(igrejas):
+            for j in range(1, quantidade + 1):
+                username = f"{prefixo}{i * quantidade + j}"
+                usuarios.append(
+                    (igreja, User(username=username, password=senha, is_staff=True))
+                )
+        User.objects.bulk_create([user for _, user in usuarios])
+        Perfil.objects.bulk_create(
+            [
+                Perfil(user_id=user.pk, **dados_de_perfil(faker, rng, ate))
+                for _, user in usuarios
+            ]
+        )
+        User.groups.through.objects.bulk_create(
+            [
+                User.groups.through(user_id=user.pk, group_id=grupo.pk)
+                for _, user in usuarios
+            ]
+        )
+        por_igreja = {}
+        for igreja, user in usuarios:
+            por_igreja.setdefault(igreja.pk, []).append(user.pk)
+        return por_igreja
+
+    def handle(self, *args, **options):
+        inicio = perf_counter()
+        seed = options["seed"]
+        batch_size = options["batch_size"]
+        rng = random.Random(seed)
+        faker = novo_faker(seed)
+        senha = make_password(options["senha"])
+        num_igrejas = options["igrejas"]
+        ate = options["ate"] or timezone.localdate()
+
+        with transaction.atomic():
+            primeira = Igreja.objects.count()
+            igrejas = Igreja.objects.bulk_create(
+                [
+                    Igreja(
+                        nome=nome,
+                        nome_busca=normalizar(nome),
+                        endereco=faker.street_address(),
+                    )
+                    for nome in (f"Igreja {primeira + i}" for i in range(num_igrejas))
+                ]
+            )
+            agentes = self.criar_usuarios(
+                f"agente{primeira}_",
+                options["agentes_por_igreja"],
+                igrejas,
+                senha,
+                AGENTES_GROUP(),
+                faker,
+                rng,
+                ate,
+            )
+            gestores = self.criar_usuarios(
+                f"gestor{primeira}_",
+                options["gestores_por_igreja"],
+                igrejas,
+                senha,
+                GESTORES_GROUP(),
+                faker,
+                rng,
+                ate,
+            )
+            Igreja.agentes.through.objects.bulk_create(
+                [
+                    Igreja.agentes.through(igreja_id=i, user_id=u)
+                    for i, users in agentes.items()
+                    for u in users
+                ]
+            )
+            Igreja.gestores.through.objects.bulk_create(
+                [
+                    Igreja.gestores.through(igreja_id=i, user_id=u)
+                    for i, users in gestores.items()
+                    for u in users
+                ]
+            )
+            # `bulk_create` não dispara `m2m_changed`.
+            transaction.on_commit(lambda: invalidar(PARTICIPACOES))
+        self.stdout.write(f"{len(igrejas)} igrejas e seus usuários criados.")
+
+        por_igreja, resto = divmod(options["dizimistas"], max(len(igrejas), 1))
+        tarefas = [
+            (
+                igreja.pk,
+                agentes.get(igreja.pk, []),
+                por_igreja + (1 if i < resto else 0),
+                options["meses"],
+                ate,
+                seed * 1_000_003 + i,
+                batch_size,
+            )
+            for i, igreja in enumerate(igrejas)
+        ]
+        processos = options["processos"]
+        if processos > 1 and connection.vendor == "sqlite":
+            self.stderr.write(
+                "SQLite não aceita escritas concorrentes: usando um único processo."
+            )
+            processos = 1
+        if processos > 1:
+            connections.close_all()
+            # Cada processo abre a própria conexão a partir da configuração herdada.
+            contexto = multiprocessing.get_context("fork")
+            with contexto.Pool(processos, initializer=connections.close_all) as pool:
+                resultados = pool.map(gerar_igreja, tarefas)
+        else:
+            resultados = [gerar_igreja(tarefa) for tarefa in tarefas]
+
+        dizimistas = sum(r[0] for r in resultados)
+        pagamentos = sum(r[1] for r in resultados)
+        self.stdout.write(f"{dizimistas} dizimistas e {pagamentos} pagamentos criados.")
+        # `bulk_create` não dispara os sinais que mantêm os resumos e contadores.
+        reconstruir_resumos(batch_size=batch_size)
+        recontar_dizimistas()
+        recontar_pagamentos()
+        self.stdout.write(
+            self.style.SUCCESS(f"Concluído em {perf_counter() - inicio:.1f}s.")
+        )
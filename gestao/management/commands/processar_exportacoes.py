@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gestao.exportacoes import (
+    processar_exportacoes_pendentes,
+    remover_exportacoes_expiradas,
+)
+
+
+class Command(BaseCommand):
+    help = "Gera os PDFs das exportações na fila e apaga as exportações expiradas."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Continua verificando a fila em vez de sair quando ela esvaziar.",
+        )
+        parser.add_argument(
+            "--intervalo", type=float, default=5, help="Segundos entre verificações."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            removidas = remover_exportacoes_expiradas()
+            if removidas:
+                self.stdout.write(f"{removidas} exportações expiradas removidas.")
+            processadas = processar_exportacoes_pendentes()
+            if processadas:
+                self.stdout.write(f"{processadas} exportações processadas.")
+            if not options["loop"]:
+                break
+            time.sleep(options["intervalo"])
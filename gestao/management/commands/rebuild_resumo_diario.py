@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from gestao.resumos import reconstruir_resumos
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói a tabela de resumos diários de pagamentos a partir dos pagamentos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = reconstruir_resumos(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{total} resumos diários reconstruídos."))
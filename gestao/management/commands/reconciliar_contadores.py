@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gestao.resumos import recontar_dizimistas, recontar_pagamentos
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula os contadores mantidos pelos sinais: dizimistas de cada igreja e "
+        "número de pagamentos e último pagamento de cada dizimista."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            igrejas = recontar_dizimistas()
+            dizimistas = recontar_pagamentos()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{igrejas} igrejas e {dizimistas} dizimistas reconciliados."
+            )
+        )
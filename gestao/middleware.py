@@ -0,0 +1,207 @@
+"""Instrumentação das consultas SQL de cada requisição.
+
+`InstrumentacaoSQLMiddleware` é ligado por `SQL_INSTRUMENTACAO=True`. Ele
+conta as consultas e o tempo gasto no banco, devolve os números no cabeçalho
+`Server-Timing`, registra uma linha JSON no logger `gestao.sql` e avisa quando
+a mesma forma de consulta se repete muitas vezes na requisição (N+1).
+
+`EstatisticasDoPoolMiddleware`, ligado por `POSTGRES_POOL=True`, registra as
+estatísticas do pool de conexões no logger `gestao.banco` de tempos em tempos.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import traceback
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+from time import monotonic, perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger("gestao.sql")
+logger_do_banco = logging.getLogger("gestao.banco")
+
+RAIZ_DO_PROJETO = str(Path(__file__).resolve().parent.parent)
+FRAMES_NA_AMOSTRA = 8
+
+_LISTA_DE_PARAMETROS = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+def forma_da_consulta(sql):
+    """SQL sem os valores, para agrupar consultas que só diferem nos parâmetros."""
+    sql = _LISTA_DE_PARAMETROS.sub("(%s, ...)", sql)
+    sql = _TEXTO.sub("%s", sql)
+    return _NUMERO.sub("%s", sql)
+
+
+def amostra_da_pilha():
+    """Quadros do projeto na pilha, mais o quadro que chamou o ORM."""
+    pilha = [
+        quadro for quadro in traceback.extract_stack() if quadro.filename != __file__
+    ]
+    chamador = next(
+        (
+            quadro
+            for quadro in reversed(pilha)
+            if f"django{os.sep}db{os.sep}" not in quadro.filename
+        ),
+        None,
+    )
+    quadros = [
+        quadro
+        for quadro in pilha
+        if quadro is chamador
+        or (
+            quadro.filename.startswith(RAIZ_DO_PROJETO)
+            and "site-packages" not in quadro.filename
+        )
+    ]
+    return [
+        f"{quadro.filename}:{quadro.lineno} in {quadro.name}"
+        for quadro in quadros[-FRAMES_NA_AMOSTRA:]
+    ]
+
+
+class ConsultasSQL:
+    """Conta as consultas e o tempo gasto no banco, em todas as conexões.
+
+    Com `limite_repeticoes`, guarda também quantas vezes cada forma de consulta
+    foi executada e uma amostra da pilha quando ela atinge o limite.
+    """
+
+    def __init__(self, limite_repeticoes=None):
+        self.consultas = 0
+        self.tempo = 0.0
+        self.limite_repeticoes = limite_repeticoes
+        self.formas = Counter()
+        self.pilhas = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo += perf_counter() - inicio
+            self.consultas += 1
+            if self.limite_repeticoes:
+                forma = forma_da_consulta(sql)
+                self.formas[forma] += 1
+                if self.formas[forma] == self.limite_repeticoes:
+                    self.pilhas[forma] = amostra_da_pilha()
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def repetidas(self):
+        """Formas executadas pelo menos `limite_repeticoes` vezes, das mais repetidas às menos."""
+        return [
+            (forma, vezes, self.pilhas[forma])
+            for forma, vezes in self.formas.most_common()
+            if forma in self.pilhas
+        ]
+
+
+class InstrumentacaoSQLMiddleware:
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTACAO:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.limite_repeticoes = settings.SQL_N_MAIS_UM_LIMITE
+
+    def __call__(self, request):
+        inicio = perf_counter()
+        with ConsultasSQL(self.limite_repeticoes) as sql:
+            response = self.get_response(request)
+        total = perf_counter() - inicio
+
+        # Respostas em streaming continuam consultando o banco depois daqui;
+        # esses números cobrem só a montagem da resposta.
+        response.headers["Server-Timing"] = ", ".join(
+            (
+                f'sql;dur={sql.tempo * 1000:.1f};desc="{sql.consultas} consultas"',
+                f"total;dur={total * 1000:.1f}",
+            )
+        )
+        match = request.resolver_match
+        view = match.view_name if match else None
+        repetidas = sql.repetidas()
+        logger.info(
+            json.dumps(
+                {
+                    "metodo": request.method,
+                    "caminho": request.path,
+                    "view": view,
+                    "status": response.status_code,
+                    "consultas": sql.consultas,
+                    "tempo_sql_ms": round(sql.tempo * 1000, 2),
+                    "tempo_ms": round(total * 1000, 2),
+                    "n_mais_um": len(repetidas),
+                },
+                ensure_ascii=False,
+            )
+        )
+        for forma, vezes, pilha in repetidas:
+            logger.warning(
+                json.dumps(
+                    {
+                        "n_mais_um": True,
+                        "view": view,
+                        "caminho": request.path,
+                        "vezes": vezes,
+                        "sql": forma,
+                        "pilha": pilha,
+                    },
+                    ensure_ascii=False,
+                )
+            )
+        return response
+
+
+def estatisticas_dos_pools():
+    """Estatísticas de cada pool de conexões (por alias do banco) desde a leitura anterior.
+
+    Os tamanhos (`pool_size`, `pool_available`, `requests_waiting`) são os do
+    momento; as contagens (`requests_num`, `requests_wait_ms`,
+    `connections_lost`...) recomeçam do zero a cada leitura.
+    """
+    estatisticas = {}
+    for connection in connections.all(initialized_only=True):
+        if connection.settings_dict.get("OPTIONS", {}).get("pool"):
+            estatisticas[connection.alias] = connection.pool.pop_stats()
+    return estatisticas
+
+
+class EstatisticasDoPoolMiddleware:
+    def __init__(self, get_response):
+        if not settings.POSTGRES_POOL:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.intervalo = settings.POSTGRES_POOL_LOG_INTERVALO
+        self.proximo_registro = monotonic() + self.intervalo
+        self.trava = threading.Lock()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # Uma thread registra; as demais não esperam por ela.
+        if monotonic() >= self.proximo_registro and self.trava.acquire(blocking=False):
+            try:
+                self.proximo_registro = monotonic() + self.intervalo
+                for alias, estatisticas in estatisticas_dos_pools().items():
+                    logger_do_banco.info(json.dumps(dict(banco=alias, **estatisticas)))
+            finally:
+                self.trava.release()
+        return response
@@ -0,0 +1,102 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def preencher_resumos(apps, schema_editor):
+    Pagamento = apps.get_model("gestao", "Pagamento")
+    ResumoDiario = apps.get_model("gestao", "ResumoDiario")
+    rows = (
+        Pagamento.objects.order_by()
+        .annotate(dia=TruncDate("data", tzinfo=timezone.get_current_timezone()))
+        .values("dizimista__igreja", "dia")
+        .annotate(pagamentos=Count("id"), total_recebido=Sum("valor"))
+    )
+    ResumoDiario.objects.bulk_create(
+        [
+            ResumoDiario(
+                igreja_id=row["dizimista__igreja"],
+                dia=row["dia"],
+                pagamentos=row["pagamentos"],
+                total_recebido=row["total_recebido"],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = (("gestao", "0024_auto_20200914_1154"),)
+
+    operations = (
+        migrations.CreateModel(
+            name="ResumoDiario",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dia", models.DateField(db_index=True, verbose_name="Dia")),
+                (
+                    "pagamentos",
+                    models.PositiveIntegerField(default=0, verbose_name="Pagamentos"),
+                ),
+                (
+                    "total_recebido",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Total recebido",
+                    ),
+                ),
+                (
+                    "igreja",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="gestao.igreja",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Resumo diário de pagamentos",
+                "verbose_name_plural": "Resumos diários de pagamentos",
+                "ordering": ("-dia",),
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("igreja", "dia"), name="resumo_diario_igreja_dia"
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(igreja__isnull=True),
+                        fields=("dia",),
+                        name="resumo_diario_sem_igreja_dia",
+                    ),
+                ],
+            },
+        ),
+        migrations.DeleteModel(
+            name="ResumoPagamentos",
+        ),
+        migrations.CreateModel(
+            name="ResumoPagamentos",
+            fields=[],
+            options={
+                "verbose_name": "Resumo de pagamentos",
+                "verbose_name_plural": "Resumos de pagamentos",
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("gestao.resumodiario",),
+        ),
+        migrations.RunPython(preencher_resumos, migrations.RunPython.noop),
+    )
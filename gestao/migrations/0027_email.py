@@ -0,0 +1,91 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = (("gestao", "0025_resumodiario"),)
+
+    operations = (
+        migrations.CreateModel(
+            name="Email",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("assunto", models.CharField(max_length=255, verbose_name="Assunto")),
+                ("mensagem", models.TextField(blank=True, verbose_name="Mensagem")),
+                (
+                    "mensagem_html",
+                    models.TextField(blank=True, verbose_name="Mensagem HTML"),
+                ),
+                (
+                    "remetente",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="Remetente"
+                    ),
+                ),
+                (
+                    "destinatarios",
+                    models.JSONField(default=list, verbose_name="Destinatários"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pendente", "Pendente"),
+                            ("enviando", "Enviando"),
+                            ("enviado", "Enviado"),
+                            ("falhou", "Falhou"),
+                        ],
+                        default="pendente",
+                        max_length=10,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "tentativas",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Tentativas"
+                    ),
+                ),
+                (
+                    "proxima_tentativa",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name="Próxima tentativa",
+                    ),
+                ),
+                ("erro", models.TextField(blank=True, verbose_name="Erro")),
+                (
+                    "criado_em",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Criado em"),
+                ),
+                (
+                    "enviado_em",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Enviado em"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "E-mail",
+                "verbose_name_plural": "Caixa de saída",
+                "ordering": ("-criado_em",),
+                "indexes": [
+                    models.Index(
+                        fields=["status", "proxima_tentativa"],
+                        name="email_status_proxima",
+                    ),
+                    models.Index(fields=["enviado_em"], name="email_enviado_em"),
+                ],
+            },
+        ),
+    )
@@ -0,0 +1,120 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:53
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = (
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("gestao", "0027_email"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    )
+
+    operations = (
+        migrations.CreateModel(
+            name="Exportacao",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("titulo", models.CharField(max_length=100, verbose_name="Título")),
+                ("filtros", models.TextField(blank=True, verbose_name="Filtros")),
+                (
+                    "selecionados",
+                    models.JSONField(
+                        blank=True, null=True, verbose_name="Selecionados"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pendente", "Na fila"),
+                            ("processando", "Processando"),
+                            ("concluida", "Concluída"),
+                            ("falhou", "Falhou"),
+                        ],
+                        default="pendente",
+                        max_length=12,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "arquivo",
+                    models.FileField(
+                        blank=True, upload_to="exportacoes/", verbose_name="Arquivo"
+                    ),
+                ),
+                (
+                    "tamanho",
+                    models.PositiveBigIntegerField(
+                        blank=True, null=True, verbose_name="Tamanho (bytes)"
+                    ),
+                ),
+                (
+                    "linhas",
+                    models.PositiveIntegerField(
+                        blank=True, null=True, verbose_name="Linhas"
+                    ),
+                ),
+                ("erro", models.TextField(blank=True, verbose_name="Erro")),
+                (
+                    "criado_em",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Criado em"),
+                ),
+                (
+                    "iniciada_em",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Iniciada em"
+                    ),
+                ),
+                (
+                    "concluida_em",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Concluída em"
+                    ),
+                ),
+                (
+                    "expira_em",
+                    models.DateTimeField(
+                        blank=True, db_index=True, null=True, verbose_name="Expira em"
+                    ),
+                ),
+                (
+                    "modelo",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="contenttypes.contenttype",
+                    ),
+                ),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Usuário",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Exportação",
+                "verbose_name_plural": "Exportações",
+                "ordering": ("-criado_em",),
+                "indexes": [
+                    models.Index(
+                        fields=["status", "criado_em"], name="exportacao_status_criado"
+                    )
+                ],
+            },
+        ),
+    )
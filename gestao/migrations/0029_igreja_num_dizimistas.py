@@ -0,0 +1,31 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def contar_dizimistas(apps, schema_editor):
+    Igreja = apps.get_model("gestao", "Igreja")
+    Dizimista = apps.get_model("gestao", "Dizimista")
+    contagem = (
+        Dizimista.objects.filter(igreja=OuterRef("pk"))
+        .order_by()
+        .values("igreja")
+        .annotate(n=Count("pk"))
+        .values("n")
+    )
+    Igreja.objects.update(num_dizimistas=Coalesce(Subquery(contagem), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = (("gestao", "0028_exportacao"),)
+
+    operations = (
+        migrations.AddField(
+            model_name="igreja",
+            name="num_dizimistas",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Número de dizimistas"
+            ),
+        ),
+        migrations.RunPython(contar_dizimistas, migrations.RunPython.noop),
+    )
@@ -0,0 +1,46 @@
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def contar_pagamentos(apps, schema_editor):
+    Dizimista = apps.get_model("gestao", "Dizimista")
+    Pagamento = apps.get_model("gestao", "Pagamento")
+    pagamentos = (
+        Pagamento.objects.filter(dizimista=OuterRef("pk"))
+        .order_by()
+        .values("dizimista")
+    )
+    Dizimista.objects.update(
+        num_pagamentos=Coalesce(
+            Subquery(pagamentos.annotate(n=Count("pk")).values("n")), 0
+        ),
+        ultimo_pagamento=Subquery(
+            pagamentos.annotate(ultimo=Max("data")).values("ultimo")
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = (("gestao", "0029_igreja_num_dizimistas"),)
+
+    operations = (
+        migrations.AddField(
+            model_name="dizimista",
+            name="num_pagamentos",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Pagamentos"
+            ),
+        ),
+        migrations.AddField(
+            model_name="dizimista",
+            name="ultimo_pagamento",
+            field=models.DateTimeField(
+                db_index=True,
+                editable=False,
+                null=True,
+                verbose_name="Último pagamento",
+            ),
+        ),
+        migrations.RunPython(contar_pagamentos, migrations.RunPython.noop),
+    )
@@ -0,0 +1,52 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = (
+        ("gestao", "0030_dizimista_ultimo_pagamento"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    )
+
+    # Os índices compostos são criados antes de remover os índices simples das
+    # chaves estrangeiras, que eles passam a cobrir.
+    operations = (
+        migrations.AddIndex(
+            model_name="pagamento",
+            index=models.Index(fields=["-data", "-id"], name="pagamento_data_id"),
+        ),
+        migrations.AddIndex(
+            model_name="pagamento",
+            index=models.Index(
+                fields=["dizimista", "-data"], name="pagamento_dizimista_data"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pagamento",
+            index=models.Index(
+                fields=["registrado_por", "-data"], name="pagamento_registrado_data"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="pagamento",
+            name="dizimista",
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="gestao.dizimista",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="pagamento",
+            name="registrado_por",
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Registrado por",
+            ),
+        ),
+    )
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+from core.busca import normalizar
+
+
+def preencher_nome_busca(apps, schema_editor):
+    Igreja = apps.get_model("gestao", "Igreja")
+    igrejas = list(Igreja.objects.only("pk", "nome"))
+    for igreja in igrejas:
+        igreja.nome_busca = normalizar(igreja.nome)[:100]
+    Igreja.objects.bulk_update(igrejas, ["nome_busca"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = (("gestao", "0031_pagamento_indices"),)
+
+    operations = (
+        migrations.AddField(
+            model_name="igreja",
+            name="nome_busca",
+            field=models.CharField(
+                blank=True,
+                default="",
+                editable=False,
+                max_length=100,
+                verbose_name="Nome para busca",
+            ),
+        ),
+        migrations.RunPython(preencher_nome_busca, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="igreja",
+            index=models.Index(
+                fields=["nome_busca"],
+                name="igreja_nome_busca_prefixo",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+    )
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = (("gestao", "0032_igreja_nome_busca"),)
+
+    # Só o estado: `ordering` passou de lista a tupla.
+    operations = (
+        migrations.AlterModelOptions(
+            name="pagamento",
+            options={
+                "ordering": ("-data",),
+                "verbose_name": "Pagamento",
+                "verbose_name_plural": "Pagamentos",
+            },
+        ),
+    )
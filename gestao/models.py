@@ -2,11 +2,13 @@ import uuid
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.html import format_html
 
+from core.busca import normalizar
 from core.models import Perfil
 
 
@@ -15,12 +17,34 @@ class Igreja(models.Model):
     endereco = models.CharField("Endereço", max_length=255, null=True)
     gestores = models.ManyToManyField(User, related_name="gestor_em")
     agentes = models.ManyToManyField(User, related_name="agente_em")
+    # Mantido pelos sinais de `Dizimista` e pelo comando `reconciliar_contadores`.
+    num_dizimistas = models.PositiveIntegerField(
+        "Número de dizimistas", default=0, editable=False
+    )
+    # `nome` sem acentos e em minúsculas, derivado em `save()` (veja `core.busca`).
+    nome_busca = models.CharField(
+        "Nome para busca", max_length=100, editable=False, blank=True, default=""
+    )
 
     dizimista_set: models.QuerySet["Dizimista"]
 
     class Meta:
         verbose_name = "Igreja"
         verbose_name_plural = "Igrejas"
+        indexes = (
+            models.Index(
+                fields=["nome_busca"],
+                name="igreja_nome_busca_prefixo",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        )
+
+    def save(self, *args, **kwargs):
+        self.nome_busca = normalizar(self.nome)[:100]
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "nome" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "nome_busca"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.nome
@@ -32,7 +56,7 @@ class Igreja(models.Model):
         )
 
     def número_de_dizimistas(self):
-        return self.dizimista_set.count()
+        return self.num_dizimistas
 
 
 class PerfilDizimista(Perfil):
@@ -48,6 +72,13 @@ class PerfilDizimista(Perfil):
 class Dizimista(models.Model):
     igreja = models.ForeignKey("gestao.Igreja", on_delete=models.SET_NULL, null=True)
     dizimo = models.DecimalField("Dízimo", max_digits=14, decimal_places=2, null=True)
+    # Mantidos pelos sinais de `Pagamento` e pelo comando `reconciliar_contadores`.
+    ultimo_pagamento = models.DateTimeField(
+        "Último pagamento", null=True, editable=False, db_index=True
+    )
+    num_pagamentos = models.PositiveIntegerField(
+        "Pagamentos", default=0, editable=False
+    )
 
     class Meta:
         verbose_name = "Dizimista"
@@ -80,7 +111,10 @@ class Dizimista(models.Model):
 
 class Pagamento(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    dizimista = models.ForeignKey(Dizimista, on_delete=models.SET_NULL, null=True)
+    # As chaves estrangeiras são cobertas pelos índices compostos abaixo.
+    dizimista = models.ForeignKey(
+        Dizimista, on_delete=models.SET_NULL, null=True, db_index=False
+    )
     data = models.DateTimeField("Data e hora", default=timezone.now)
     valor = models.DecimalField("Valor", max_digits=14, decimal_places=2)
     registrado_por = models.ForeignKey(
@@ -88,12 +122,22 @@ class Pagamento(models.Model):
         verbose_name="Registrado por",
         on_delete=models.SET_NULL,
         null=True,
+        db_index=False,
     )
 
     class Meta:
         verbose_name = "Pagamento"
         verbose_name_plural = "Pagamentos"
-        ordering = ["-data"]
+        ordering = ("-data",)
+        indexes = (
+            models.Index(fields=["-data", "-id"], name="pagamento_data_id"),
+            models.Index(
+                fields=["dizimista", "-data"], name="pagamento_dizimista_data"
+            ),
+            models.Index(
+                fields=["registrado_por", "-data"], name="pagamento_registrado_data"
+            ),
+        )
 
     def __str__(self):
         return str(self.id)
@@ -109,8 +153,133 @@ class Pagamento(models.Model):
         return self.data.strftime("%m/%Y")
 
 
-class ResumoPagamentos(Pagamento):
+class ResumoDiario(models.Model):
+    """Total de pagamentos de uma igreja em um dia (no fuso horário local).
+
+    Mantido incrementalmente pelos sinais em `gestao.signals` e reconstruído
+    pelo comando `rebuild_resumo_diario`.
+    """
+
+    igreja = models.ForeignKey(Igreja, on_delete=models.CASCADE, null=True)
+    dia = models.DateField("Dia", db_index=True)
+    pagamentos = models.PositiveIntegerField("Pagamentos", default=0)
+    total_recebido = models.DecimalField(
+        "Total recebido", max_digits=14, decimal_places=2, default=0
+    )
+
+    class Meta:
+        verbose_name = "Resumo diário de pagamentos"
+        verbose_name_plural = "Resumos diários de pagamentos"
+        ordering = ("-dia",)
+        constraints = (
+            models.UniqueConstraint(
+                fields=["igreja", "dia"], name="resumo_diario_igreja_dia"
+            ),
+            # `NULL` é distinto de `NULL` no índice acima: o resumo dos pagamentos
+            # sem igreja precisa de uma restrição própria.
+            models.UniqueConstraint(
+                fields=["dia"],
+                condition=models.Q(igreja__isnull=True),
+                name="resumo_diario_sem_igreja_dia",
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.igreja} - {self.dia}"
+
+
+class ResumoPagamentos(ResumoDiario):
     class Meta:
         proxy = True
         verbose_name = "Resumo de pagamentos"
         verbose_name_plural = "Resumos de pagamentos"
+
+
+class Email(models.Model):
+    """Mensagem na caixa de saída, enviada pelo comando `enviar_emails`."""
+
+    PENDENTE = "pendente"
+    # Reservado por um worker até `proxima_tentativa`; depois disso volta a ser pego.
+    ENVIANDO = "enviando"
+    ENVIADO = "enviado"
+    FALHOU = "falhou"
+    STATUS = (
+        (PENDENTE, "Pendente"),
+        (ENVIANDO, "Enviando"),
+        (ENVIADO, "Enviado"),
+        (FALHOU, "Falhou"),
+    )
+
+    assunto = models.CharField("Assunto", max_length=255)
+    mensagem = models.TextField("Mensagem", blank=True)
+    mensagem_html = models.TextField("Mensagem HTML", blank=True)
+    remetente = models.CharField("Remetente", max_length=255, blank=True)
+    destinatarios = models.JSONField("Destinatários", default=list)
+    status = models.CharField("Status", max_length=10, choices=STATUS, default=PENDENTE)
+    tentativas = models.PositiveSmallIntegerField("Tentativas", default=0)
+    proxima_tentativa = models.DateTimeField("Próxima tentativa", default=timezone.now)
+    erro = models.TextField("Erro", blank=True)
+    criado_em = models.DateTimeField("Criado em", auto_now_add=True)
+    enviado_em = models.DateTimeField("Enviado em", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "E-mail"
+        verbose_name_plural = "Caixa de saída"
+        ordering = ("-criado_em",)
+        indexes = (
+            models.Index(
+                fields=["status", "proxima_tentativa"], name="email_status_proxima"
+            ),
+            models.Index(fields=["enviado_em"], name="email_enviado_em"),
+        )
+
+    def __str__(self):
+        return f"{self.assunto} ({', '.join(self.destinatarios)})"
+
+
+class Exportacao(models.Model):
+    """Exportação em PDF processada em segundo plano pelo comando `processar_exportacoes`."""
+
+    PENDENTE = "pendente"
+    PROCESSANDO = "processando"
+    CONCLUIDA = "concluida"
+    FALHOU = "falhou"
+    STATUS = (
+        (PENDENTE, "Na fila"),
+        (PROCESSANDO, "Processando"),
+        (CONCLUIDA, "Concluída"),
+        (FALHOU, "Falhou"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(User, verbose_name="Usuário", on_delete=models.CASCADE)
+    modelo = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    titulo = models.CharField("Título", max_length=100)
+    # A seleção no changelist do admin, refeita pelo worker com as permissões de `usuario`.
+    filtros = models.TextField("Filtros", blank=True)
+    selecionados = models.JSONField("Selecionados", null=True, blank=True)
+    status = models.CharField("Status", max_length=12, choices=STATUS, default=PENDENTE)
+    arquivo = models.FileField("Arquivo", upload_to="exportacoes/", blank=True)
+    tamanho = models.PositiveBigIntegerField("Tamanho (bytes)", null=True, blank=True)
+    linhas = models.PositiveIntegerField("Linhas", null=True, blank=True)
+    erro = models.TextField("Erro", blank=True)
+    criado_em = models.DateTimeField("Criado em", auto_now_add=True)
+    iniciada_em = models.DateTimeField("Iniciada em", null=True, blank=True)
+    concluida_em = models.DateTimeField("Concluída em", null=True, blank=True)
+    expira_em = models.DateTimeField("Expira em", null=True, blank=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Exportação"
+        verbose_name_plural = "Exportações"
+        ordering = ("-criado_em",)
+        indexes = (
+            models.Index(
+                fields=["status", "criado_em"], name="exportacao_status_criado"
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.titulo} ({self.get_status_display()})"
+
+    def get_absolute_url(self):
+        return reverse("exportacao", args=(self.pk,))
@@ -0,0 +1,249 @@
+"""Paginação dos changelists grandes.
+
+`PaginadorEstimado` evita um `COUNT(*)` a cada página: guarda a contagem em cache por alguns segundos, com a
+versão dos dados e o SQL da consulta (filtros, busca e escopo do usuário) na
+chave. No PostgreSQL, quando o planejador estima pelo menos
+`LIMIAR_DE_ESTIMATIVA` linhas, usa a estimativa (`reltuples` da tabela sem
+filtros ou as linhas do `EXPLAIN`) em vez de contar: a diferença não aparece
+na paginação e a contagem exata custaria uma leitura de tudo.
+
+`ChangeListPorCursor` (com `?cursor=1` na URL) e `em_blocos` leem as páginas
+sem `OFFSET`, a partir da posição `(data, pk)` da última linha lida.
+"""
+
+import json
+from datetime import datetime
+from hashlib import md5
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ALL_VAR, ORDER_VAR, PAGE_VAR, ChangeList
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .versoes import assinatura
+
+LIMIAR_DE_ESTIMATIVA = 10_000
+CONTAGEM_TIMEOUT = 60
+# Parâmetro da URL que liga a paginação por cursor e os que trazem a posição
+# da página seguinte e da anterior.
+CURSOR_VAR = "cursor"
+CURSOR_APOS = "apos"
+CURSOR_ANTES = "antes"
+
+
+def estimar_contagem(queryset):
+    """Linhas estimadas pelo PostgreSQL para `queryset`, ou `None` em outros bancos."""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    if not queryset.query.where and not queryset.query.distinct:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            linha = cursor.fetchone()
+        # -1: tabela ainda não analisada.
+        if linha and linha[0] >= 0:
+            return linha[0]
+    plano = json.loads(queryset.order_by().explain(format="json"))
+    return int(plano[0]["Plan"]["Plan Rows"])
+
+
+class PaginadorEstimado(Paginator):
+    def __init__(self, *args, versoes=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.versoes = versoes
+
+    def _chave(self):
+        sql, params = self.object_list.query.sql_with_params()
+        consulta = md5(f"{sql}:{params!r}".encode()).hexdigest()
+        return f"contagem:{self.object_list.model._meta.label_lower}:{assinatura(*self.versoes)}:{consulta}"
+
+    @cached_property
+    def count(self):
+        chave = self._chave()
+        contagem = cache.get(chave)
+        if contagem is None:
+            estimativa = estimar_contagem(self.object_list)
+            if estimativa is not None and estimativa >= LIMIAR_DE_ESTIMATIVA:
+                contagem = estimativa
+            else:
+                contagem = super().count
+            cache.set(chave, contagem, CONTAGEM_TIMEOUT)
+        return contagem
+
+
+def codificar_cursor(data, pk):
+    """Cursor opaco para a URL com a posição `(data, pk)` de uma linha."""
+    return urlsafe_base64_encode(f"{data.isoformat()}|{pk}".encode())
+
+
+def decodificar_cursor(cursor, model):
+    """`(data, pk)` de um cursor; `ValueError` se ele for inválido."""
+    try:
+        data, pk = urlsafe_base64_decode(cursor).decode().split("|")
+        data = datetime.fromisoformat(data)
+        pk = model._meta.pk.to_python(pk)
+    except (TypeError, UnicodeDecodeError, ValidationError) as exc:
+        raise ValueError(f"Cursor inválido: {cursor!r}") from exc
+    return data, pk
+
+
+def depois_de(queryset, data, pk, campo="data"):
+    """Linhas depois de `(data, pk)` na ordem `(-campo, -pk)`.
+
+    O `campo__lte` isolado deixa o banco percorrer o índice `(campo, pk)` a
+    partir da posição do cursor, sem depender do `OR`.
+    """
+    return queryset.filter(
+        Q(**{f"{campo}__lt": data}) | Q(**{campo: data, "pk__lt": pk}),
+        **{f"{campo}__lte": data},
+    )
+
+
+def antes_de(queryset, data, pk, campo="data"):
+    """Linhas antes de `(data, pk)` na ordem `(-campo, -pk)`, isto é, depois dela na ordem crescente."""
+    return queryset.filter(
+        Q(**{f"{campo}__gt": data}) | Q(**{campo: data, "pk__gt": pk}),
+        **{f"{campo}__gte": data},
+    )
+
+
+def em_blocos(queryset, campos, tamanho, campo="data"):
+    """Valores de `campos` de todo o queryset, na ordem `(-campo, -pk)`, em consultas de `tamanho` linhas.
+
+    Cada bloco começa onde o anterior parou, então nenhuma consulta usa
+    `OFFSET`, não é preciso cursor no servidor nem uma transação aberta durante
+    toda a leitura, e linhas inseridas no meio da leitura não deslocam as demais.
+    """
+    queryset = queryset.order_by(f"-{campo}", "-pk").values_list(*campos, campo, "pk")
+    bloco = list(queryset[:tamanho])
+    while bloco:
+        for linha in bloco:
+            yield linha[:-2]
+        if len(bloco) < tamanho:
+            return
+        bloco = list(depois_de(queryset, *bloco[-1][-2:], campo=campo)[:tamanho])
+
+
+class PaginaPorCursor:
+    """Linhas de uma página do `ChangeListPorCursor`, lidas só quando usadas.
+
+    `consulta` busca uma linha além da página, para saber se há mais linhas
+    na direção da leitura.
+    """
+
+    def __init__(self, consulta, tamanho, direcao):
+        self.consulta = consulta
+        self.tamanho = tamanho
+        self.direcao = direcao
+
+    @cached_property
+    def linhas(self):
+        linhas = list(self.consulta)
+        mais = len(linhas) > self.tamanho
+        linhas = linhas[: self.tamanho]
+        if self.direcao == CURSOR_ANTES:
+            linhas.reverse()
+            self.ha_anteriores, self.ha_seguintes = mais, True
+        else:
+            self.ha_anteriores, self.ha_seguintes = self.direcao == CURSOR_APOS, mais
+        return linhas
+
+    def __iter__(self):
+        return iter(self.linhas)
+
+    def __len__(self):
+        return len(self.linhas)
+
+    def __getitem__(self, indice):
+        return self.linhas[indice]
+
+
+class ChangeListPorCursor(ChangeList):
+    """Changelist com paginação por cursor (keyset) opcional, na ordem `(-data, -pk)`.
+
+    Por padrão, pagina por `OFFSET` como qualquer changelist. Com `cursor=1`
+    na URL, as páginas seguinte e anterior são buscadas a partir da última e
+    da primeira linha da página atual (parâmetros `apos` e `antes`), de modo
+    que qualquer página custa o mesmo que a primeira e o conteúdo não muda
+    quando novos pagamentos são registrados. Com outra ordenação, `p=` ou
+    "mostrar tudo", volta à paginação por `OFFSET`.
+    """
+
+    campo_do_cursor = "data"
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        for parametro in (CURSOR_VAR, CURSOR_APOS, CURSOR_ANTES):
+            params.pop(parametro, None)
+        return params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Mudar filtro, busca ou ordenação volta para a primeira página.
+        remove = [
+            *(remove or []),
+            *(p for p in (CURSOR_APOS, CURSOR_ANTES) if p not in (new_params or {})),
+        ]
+        return super().get_query_string(new_params, remove)
+
+    def get_results(self, request):
+        self.por_cursor = CURSOR_VAR in request.GET and not (
+            {ORDER_VAR, PAGE_VAR, ALL_VAR} & set(request.GET)
+        )
+        if not self.por_cursor:
+            return super().get_results(request)
+        campo = self.campo_do_cursor
+        consulta = self.queryset.order_by(f"-{campo}", "-pk")
+        direcao = next(
+            (p for p in (CURSOR_ANTES, CURSOR_APOS) if p in request.GET), None
+        )
+        if direcao is not None:
+            try:
+                data, pk = decodificar_cursor(request.GET[direcao], self.model)
+            except ValueError:
+                raise IncorrectLookupParameters
+            if direcao == CURSOR_ANTES:
+                consulta = antes_de(consulta, data, pk, campo).reverse()
+            else:
+                consulta = depois_de(consulta, data, pk, campo)
+
+        paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = PaginaPorCursor(
+            consulta[: self.list_per_page + 1], self.list_per_page, direcao
+        )
+        self.can_show_all = False
+        self.multi_page = direcao is not None or self.result_count > self.list_per_page
+        self.paginator = paginator
+
+    def _url_do_cursor(self, parametro, linha):
+        cursor = codificar_cursor(getattr(linha, self.campo_do_cursor), linha.pk)
+        return self.get_query_string({parametro: cursor})
+
+    def url_por_cursor(self):
+        return self.get_query_string({CURSOR_VAR: 1}, [ORDER_VAR, PAGE_VAR, ALL_VAR])
+
+    def url_por_offset(self):
+        return self.get_query_string(remove=[CURSOR_VAR])
+
+    def url_anterior(self):
+        pagina = self.result_list
+        if pagina and pagina.ha_anteriores:
+            return self._url_do_cursor(CURSOR_ANTES, pagina[0])
+
+    def url_seguinte(self):
+        pagina = self.result_list
+        if pagina and pagina.ha_seguintes:
+            return self._url_do_cursor(CURSOR_APOS, pagina[-1])
@@ -0,0 +1,144 @@
+"""Geração de planilhas CSV e XLSX em fluxo, linha a linha.
+
+As funções recebem um iterável de tuplas e devolvem geradores de bytes para
+`StreamingHttpResponse`, de modo que a memória usada não depende do número de
+linhas exportadas.
+"""
+
+import csv
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+CSV_DELIMITER = ";"
+CARACTERES_INVALIDOS_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def formatar(valor):
+    """Texto de uma célula no padrão brasileiro (usado no CSV)."""
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        return valor.strftime("%d/%m/%Y %H:%M")
+    if isinstance(valor, date):
+        return valor.strftime("%d/%m/%Y")
+    if isinstance(valor, (Decimal, float)):
+        return str(valor).replace(".", ",")
+    return str(valor)
+
+
+class _Eco:
+    """Arquivo que apenas devolve o que é escrito (padrão da documentação do Django)."""
+
+    def write(self, value):
+        return value
+
+
+def linhas_csv(cabecalho, linhas):
+    writer = csv.writer(_Eco(), delimiter=CSV_DELIMITER)
+    # BOM para o Excel reconhecer a codificação UTF-8.
+    yield "\ufeff" + writer.writerow(cabecalho)
+    for linha in linhas:
+        yield writer.writerow([formatar(valor) for valor in linha])
+
+
+class _Saida:
+    """Destino não posicionável do zip; acumula os bytes até serem enviados."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b"".join(self.partes)
+        self.partes.clear()
+        return dados
+
+
+XLSX_ARQUIVOS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Dados" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+
+
+def _celula(valor):
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float, Decimal)):
+        return f"<c><v>{valor}</v></c>"
+    texto = CARACTERES_INVALIDOS_XML.sub("", formatar(valor))
+    return f'<c t="inlineStr"><is><t>{escape(texto)}</t></is></c>'
+
+
+def _linha_xlsx(linha):
+    return "<row>" + "".join(_celula(valor) for valor in linha) + "</row>"
+
+
+def linhas_xlsx(cabecalho, linhas, tamanho_do_bloco=1000):
+    saida = _Saida()
+    with zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for nome, conteudo in XLSX_ARQUIVOS.items():
+            arquivo_zip.writestr(nome, conteudo)
+        with arquivo_zip.open(
+            "xl/worksheets/sheet1.xml", "w", force_zip64=True
+        ) as planilha:
+            planilha.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b"<sheetData>"
+            )
+            planilha.write(_linha_xlsx(cabecalho).encode())
+            bloco = []
+            for linha in linhas:
+                bloco.append(_linha_xlsx(linha))
+                if len(bloco) == tamanho_do_bloco:
+                    planilha.write("".join(bloco).encode())
+                    bloco = []
+                    yield saida.esvaziar()
+            planilha.write("".join(bloco).encode())
+            planilha.write(b"</sheetData></worksheet>")
+    yield saida.esvaziar()
@@ -0,0 +1,166 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    Max,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Dizimista, Igreja, Pagamento, ResumoDiario
+
+
+def dia_local(data):
+    """Dia do pagamento no fuso horário configurado em `TIME_ZONE`."""
+    if timezone.is_naive(data):
+        return data.date()
+    return timezone.localdate(data)
+
+
+def registrar_no_resumo(igreja_id, dia, pagamentos, valor):
+    """Soma `pagamentos` e `valor` (que podem ser negativos) ao resumo do dia.
+
+    O resumo que fica sem pagamentos é apagado, como se não tivesse havido
+    pagamentos naquele dia.
+    """
+    if not pagamentos and not valor:
+        return
+    delta = {
+        "pagamentos": F("pagamentos") + pagamentos,
+        "total_recebido": F("total_recebido") + valor,
+    }
+    resumo = ResumoDiario.objects.filter(igreja_id=igreja_id, dia=dia)
+    if pagamentos < 0:
+        resumo.update(**delta)
+        resumo.filter(pagamentos__lte=0).delete()
+        return
+    if resumo.update(**delta):
+        return
+    try:
+        with transaction.atomic():
+            ResumoDiario.objects.create(
+                igreja_id=igreja_id,
+                dia=dia,
+                pagamentos=pagamentos,
+                total_recebido=valor,
+            )
+    except IntegrityError:
+        # Outra requisição criou a linha entre o update e o create.
+        resumo.update(**delta)
+
+
+def pagamentos_por_dia(pagamentos):
+    """Agrupa um queryset de `Pagamento` por igreja e dia local."""
+    return (
+        pagamentos.order_by()
+        .annotate(dia=TruncDate("data", tzinfo=timezone.get_current_timezone()))
+        .values("dizimista__igreja", "dia")
+        .annotate(pagamentos=Count("id"), total_recebido=Sum("valor"))
+    )
+
+
+def mover_pagamentos(pagamentos, origem_id, destino_id):
+    """Transfere o resumo de `pagamentos` da igreja `origem_id` para `destino_id`.
+
+    Usado quando um dizimista muda de igreja ou perde a igreja, casos em que os
+    pagamentos não são salvos novamente mas passam a contar para outra igreja.
+    """
+    if origem_id == destino_id:
+        return
+    for row in pagamentos_por_dia(pagamentos):
+        registrar_no_resumo(
+            origem_id, row["dia"], -row["pagamentos"], -row["total_recebido"]
+        )
+        registrar_no_resumo(
+            destino_id, row["dia"], row["pagamentos"], row["total_recebido"]
+        )
+
+
+def reconstruir_resumos(batch_size=1000):
+    """Recalcula toda a tabela `ResumoDiario` a partir dos pagamentos."""
+    resumos = [
+        ResumoDiario(
+            igreja_id=row["dizimista__igreja"],
+            dia=row["dia"],
+            pagamentos=row["pagamentos"],
+            total_recebido=row["total_recebido"] or Decimal(0),
+        )
+        for row in pagamentos_por_dia(Pagamento.objects.all())
+    ]
+    with transaction.atomic():
+        ResumoDiario.objects.all().delete()
+        ResumoDiario.objects.bulk_create(resumos, batch_size=batch_size)
+    return len(resumos)
+
+
+def contar_dizimistas(igreja_id, quantidade):
+    """Soma `quantidade` (que pode ser negativa) ao contador de dizimistas da igreja."""
+    if igreja_id is None or not quantidade:
+        return
+    Igreja.objects.filter(pk=igreja_id).update(
+        num_dizimistas=F("num_dizimistas") + quantidade
+    )
+
+
+def recontar_dizimistas():
+    """Recalcula `Igreja.num_dizimistas` de todas as igrejas numa única consulta."""
+    contagem = (
+        Dizimista.objects.filter(igreja=OuterRef("pk"))
+        .order_by()
+        .values("igreja")
+        .annotate(n=Count("pk"))
+        .values("n")
+    )
+    return Igreja.objects.update(num_dizimistas=Coalesce(Subquery(contagem), 0))
+
+
+def registrar_pagamento_do_dizimista(dizimista_id, data):
+    """Conta um novo pagamento do dizimista e avança `ultimo_pagamento` se for o mais recente."""
+    if dizimista_id is None:
+        return
+    Dizimista.objects.filter(pk=dizimista_id).update(
+        num_pagamentos=F("num_pagamentos") + 1,
+        ultimo_pagamento=Case(
+            When(
+                Q(ultimo_pagamento__isnull=True) | Q(ultimo_pagamento__lt=data),
+                then=Value(data),
+            ),
+            default=F("ultimo_pagamento"),
+        ),
+    )
+
+
+def recontar_pagamentos(dizimista_ids=None):
+    """Recalcula `num_pagamentos` e `ultimo_pagamento` a partir dos pagamentos.
+
+    Sem `dizimista_ids`, recalcula todos os dizimistas. Retorna o número de
+    dizimistas atualizados.
+    """
+    dizimistas = Dizimista.objects.all()
+    if dizimista_ids is not None:
+        dizimista_ids = {pk for pk in dizimista_ids if pk is not None}
+        if not dizimista_ids:
+            return 0
+        dizimistas = dizimistas.filter(pk__in=dizimista_ids)
+    pagamentos = (
+        Pagamento.objects.filter(dizimista=OuterRef("pk"))
+        .order_by()
+        .values("dizimista")
+    )
+    return dizimistas.update(
+        num_pagamentos=Coalesce(
+            Subquery(pagamentos.annotate(n=Count("pk")).values("n")), 0
+        ),
+        ultimo_pagamento=Subquery(
+            pagamentos.annotate(ultimo=Max("data")).values("ultimo")
+        ),
+    )
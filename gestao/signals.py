@@ -0,0 +1,160 @@
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from core.models import Perfil
+
+from .grupos import esquecer_grupos
+from .models import Dizimista, Igreja, Pagamento, PerfilDizimista, ResumoDiario
+from .resumos import (
+    contar_dizimistas,
+    dia_local,
+    mover_pagamentos,
+    recontar_pagamentos,
+    registrar_no_resumo,
+    registrar_pagamento_do_dizimista,
+)
+from .versoes import PARTICIPACOES, PERFIS, invalidar, invalidar_igrejas
+
+
+def _igreja_do_pagamento(pagamento: Pagamento):
+    if pagamento.dizimista_id is None:
+        return None
+    return (
+        Dizimista.objects.filter(pk=pagamento.dizimista_id)
+        .values_list("igreja", flat=True)
+        .first()
+    )
+
+
+@receiver(pre_save, sender=Pagamento)
+def guardar_pagamento_anterior(sender, instance: Pagamento, raw=False, **kwargs):
+    instance._resumo_anterior = None
+    instance._dizimista_anterior = None
+    if raw or instance._state.adding:
+        return
+    anterior = (
+        Pagamento.objects.filter(pk=instance.pk)
+        .values_list("dizimista", "dizimista__igreja", "data", "valor")
+        .first()
+    )
+    if anterior is not None:
+        instance._dizimista_anterior = (anterior[0], anterior[2])
+        instance._resumo_anterior = anterior[1:]
+
+
+@receiver(post_save, sender=Pagamento)
+def atualizar_resumo_do_pagamento(sender, instance: Pagamento, raw=False, **kwargs):
+    if raw:
+        return
+    igreja_id = _igreja_do_pagamento(instance)
+    igrejas = [igreja_id]
+    anterior = getattr(instance, "_resumo_anterior", None)
+    if anterior is not None:
+        igreja_anterior, data, valor = anterior
+        igrejas.append(igreja_anterior)
+        registrar_no_resumo(igreja_anterior, dia_local(data), -1, -valor)
+    registrar_no_resumo(igreja_id, dia_local(instance.data), 1, instance.valor)
+    transaction.on_commit(lambda: invalidar_igrejas(*igrejas))
+
+
+@receiver(post_delete, sender=Pagamento)
+def remover_pagamento_do_resumo(sender, instance: Pagamento, **kwargs):
+    igreja_id = _igreja_do_pagamento(instance)
+    registrar_no_resumo(igreja_id, dia_local(instance.data), -1, -instance.valor)
+    transaction.on_commit(lambda: invalidar_igrejas(igreja_id))
+
+
+@receiver(post_save, sender=Pagamento)
+def atualizar_ultimo_pagamento(
+    sender, instance: Pagamento, created=False, raw=False, **kwargs
+):
+    if raw:
+        return
+    anterior = getattr(instance, "_dizimista_anterior", None)
+    if created or anterior is None:
+        registrar_pagamento_do_dizimista(instance.dizimista_id, instance.data)
+    elif anterior != (instance.dizimista_id, instance.data):
+        recontar_pagamentos([anterior[0], instance.dizimista_id])
+
+
+@receiver(post_delete, sender=Pagamento)
+def remover_ultimo_pagamento(sender, instance: Pagamento, **kwargs):
+    recontar_pagamentos([instance.dizimista_id])
+
+
+@receiver(pre_save, sender=Dizimista)
+def guardar_igreja_anterior(sender, instance: Dizimista, raw=False, **kwargs):
+    instance._igreja_anterior = None
+    if raw or instance._state.adding:
+        return
+    instance._igreja_anterior = (
+        Dizimista.objects.filter(pk=instance.pk)
+        .values_list("igreja", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Dizimista)
+def mover_resumo_do_dizimista(
+    sender, instance: Dizimista, created=False, raw=False, **kwargs
+):
+    if raw or (not created and instance._igreja_anterior == instance.igreja_id):
+        return
+    igrejas = (instance._igreja_anterior, instance.igreja_id)
+    transaction.on_commit(lambda: invalidar_igrejas(*igrejas))
+    contar_dizimistas(instance._igreja_anterior, -1)
+    contar_dizimistas(instance.igreja_id, 1)
+    if not created:
+        pagamentos = Pagamento.objects.filter(dizimista=instance)
+        mover_pagamentos(pagamentos, *igrejas)
+
+
+@receiver(pre_delete, sender=Dizimista)
+def desvincular_resumo_do_dizimista(sender, instance: Dizimista, **kwargs):
+    # `Pagamento.dizimista` é SET_NULL: os pagamentos passam a não ter igreja.
+    mover_pagamentos(
+        Pagamento.objects.filter(dizimista=instance), instance.igreja_id, None
+    )
+    contar_dizimistas(instance.igreja_id, -1)
+    igreja_id = instance.igreja_id
+    transaction.on_commit(lambda: invalidar_igrejas(igreja_id))
+
+
+@receiver(pre_delete, sender=Igreja)
+def desvincular_resumo_da_igreja(sender, instance: Igreja, **kwargs):
+    # `Dizimista.igreja` é SET_NULL: os pagamentos passam a não ter igreja.
+    for resumo in ResumoDiario.objects.filter(igreja=instance):
+        registrar_no_resumo(None, resumo.dia, resumo.pagamentos, resumo.total_recebido)
+    igreja_id = instance.pk
+    transaction.on_commit(lambda: invalidar_igrejas(igreja_id))
+
+
+@receiver(post_save, sender=Igreja)
+@receiver(post_delete, sender=Igreja)
+@receiver(m2m_changed, sender=Igreja.gestores.through)
+@receiver(m2m_changed, sender=Igreja.agentes.through)
+def invalidar_participacoes(sender, **kwargs):
+    if kwargs.get("action", "post_").startswith("post_"):
+        transaction.on_commit(lambda: invalidar(PARTICIPACOES))
+
+
+@receiver(post_save, sender=Perfil)
+@receiver(post_delete, sender=Perfil)
+@receiver(post_save, sender=PerfilDizimista)
+@receiver(post_delete, sender=PerfilDizimista)
+def invalidar_perfis(sender, **kwargs):
+    transaction.on_commit(lambda: invalidar(PERFIS))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def esquecer_grupos_alterados(sender, **kwargs):
+    transaction.on_commit(esquecer_grupos)
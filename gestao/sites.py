@@ -0,0 +1,18 @@
+from django.contrib import admin
+from django.contrib.admin.apps import AdminConfig
+
+
+class GestaoAdminSite(admin.AdminSite):
+    """Site do admin do projeto, instalado por `GestaoAdminConfig`."""
+
+    def autocomplete_view(self, request):
+        # `gestao.autocomplete` importa `gestao.admin`, que registra os models
+        # neste site: o import fica para a primeira requisição.
+        from .autocomplete import AutocompleteView
+
+        return AutocompleteView.as_view(admin_site=self)(request)
+
+
+class GestaoAdminConfig(AdminConfig):
+    # Usado em `INSTALLED_APPS` no lugar de "django.contrib.admin".
+    default_site = "gestao.sites.GestaoAdminSite"
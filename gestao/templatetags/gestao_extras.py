@@ -1,31 +1,31 @@
+from urllib.parse import urlencode
+
 from django import template
-from django.db.models import Sum
-from django.utils.timezone import now
+from django.urls import reverse
 
-from gestao.admin import (dizimistas_do_usuário, format_plot_data,
-                          group_date_by_periord, igrejas_do_usuário)
-from gestao.models import Pagamento
+from gestao.dashboard import indicadores, intervalo_do_mês
 
 register = template.Library()
 
 
-def pagamentos(user):
-    igrejas = igrejas_do_usuário(user)
-    if user.is_superuser:
-        user_filter = {}
-    else:
-        user_filter = dict(dizimista__igreja__in=igrejas)
-    return Pagamento.objects.filter(data__month__gte=now().month, **user_filter)
+def dados_do_painel(context):
+    # Todas as tags do painel compartilham um único cálculo por renderização.
+    if "indicadores" not in context.render_context:
+        context.render_context["indicadores"] = indicadores(context["user"])
+    return context.render_context["indicadores"]
 
 
 @register.simple_tag(takes_context=True)
 def plot(context):
-    queryset = pagamentos(context["user"])
     period = "semana"
-    queryset = group_date_by_periord(queryset, period)
-    plot_data = format_plot_data(queryset, period)
-    context["plot_data"] = plot_data
-    context["xaxis"] = dict(title=period.title(), tickformat="%Y-%m-%d")
+    inicio, fim = intervalo_do_mês()
+    parametros = urlencode(
+        dict(group_date_by=period, de=inicio.isoformat(), ate=fim.isoformat())
+    )
+    context["serie_url"] = (
+        f"{reverse('admin:gestao_resumopagamentos_serie')}?{parametros}"
+    )
+    context["xaxis"] = dict(title=period.title())
     context["yaxis"] = dict(title="Total Recebido (R$)")
     context["plot_id"] = "chart"
     return ""
@@ -33,14 +33,14 @@ def plot(context):
 
 @register.simple_tag(takes_context=True)
 def num_pagamentos_este_mes(context):
-    return pagamentos(context["user"]).count()
+    return dados_do_painel(context)["num_pagamentos"]
 
 
 @register.simple_tag(takes_context=True)
 def num_dizimistas(context):
-    return dizimistas_do_usuário(user=context["user"]).count()
+    return dados_do_painel(context)["num_dizimistas"]
 
 
 @register.simple_tag(takes_context=True)
 def recebido_este_mes(context):
-    return pagamentos(context["user"]).aggregate(total=Sum("valor"))["total"]
+    return dados_do_painel(context)["recebido"]
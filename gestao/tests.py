@@ -1,6 +1,1629 @@
-from django.test import TestCase
+import io
+import json
+import re
+import shutil
+import smtplib
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import Group, Permission, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.checks.registry import registry
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import Count, Sum
+from django.templatetags.static import static
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from core.admin import get_permission
+from core.busca import buscar_por_nome, normalizar
+from core.models import Perfil
+from core.permissoes import limpar_registro, permissoes
+
+from .admin import (
+    AGENTES_GROUP,
+    GESTORES_GROUP,
+    aniversariantes,
+    dizimistas_do_usuário,
+    format_plot_data,
+    ids_das_igrejas_do_usuário,
+    opcoes_de_igrejas,
+    opcoes_de_registradores,
+)
+from .benchmark import (
+    ENDPOINTS,
+    ORCAMENTOS,
+    alvos_do_benchmark,
+    medir,
+    varreduras_completas,
+    vazao,
+)
+from .checks import verificar_cache_compartilhado
+from .dashboard import indicadores
+from .emails import enviar_emails_pendentes, reservar_emails
+from .exportacoes import processar_exportacoes_pendentes, remover_exportacoes_expiradas
+from .grupos import GESTORES, PERMISSOES_DOS_GRUPOS, esquecer_grupos, provisionar_grupos
+from .middleware import ConsultasSQL, EstatisticasDoPoolMiddleware
+from .models import (
+    Dizimista,
+    Email,
+    Exportacao,
+    Igreja,
+    Pagamento,
+    PerfilDizimista,
+    ResumoDiario,
+)
+from .paginacao import CURSOR_VAR, em_blocos
+from .resumos import registrar_no_resumo
+from .sites import GestaoAdminSite
+from .versoes import cache_compartilhado
 
 
 class SampleTestCase(TestCase):
     def test_sample(self):
         pass
+
+
+def criar_dizimista(igreja, nome="Maria", email=None):
+    dizimista = Dizimista.objects.create(igreja=igreja, dizimo=50)
+    PerfilDizimista.objects.create(nome=nome, email=email, dizimista=dizimista)
+    return dizimista
+
+
+def data_local(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+def cache_em_arquivo(test):
+    """Um cache compartilhado (em arquivos, como o Redis seria) durante o teste."""
+    pasta = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, pasta)
+    caches = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": pasta,
+        }
+    }
+    return override_settings(CACHES=caches)
+
+
+class ResumoDiarioTestCase(TestCase):
+    def setUp(self):
+        self.igreja = Igreja.objects.create(nome="Matriz")
+        self.capela = Igreja.objects.create(nome="Capela")
+        self.dizimista = criar_dizimista(self.igreja)
+
+    def resumo(self, igreja):
+        return list(
+            ResumoDiario.objects.filter(igreja=igreja).values_list(
+                "dia", "pagamentos", "total_recebido"
+            )
+        )
+
+    def test_pagamento_atualiza_resumo(self):
+        # 23h em Maceió já é o dia seguinte em UTC, mas conta para o dia local.
+        pagamento = Pagamento.objects.create(
+            dizimista=self.dizimista, data=data_local(2024, 3, 10, 23), valor=50
+        )
+        Pagamento.objects.create(
+            dizimista=self.dizimista, data=data_local(2024, 3, 10, 8), valor=30
+        )
+        dia = datetime(2024, 3, 10).date()
+        self.assertEqual(self.resumo(self.igreja), [(dia, 2, Decimal(80))])
+
+        pagamento.valor = 20
+        pagamento.data = data_local(2024, 3, 11, 9)
+        pagamento.save()
+        self.assertEqual(
+            self.resumo(self.igreja),
+            [(datetime(2024, 3, 11).date(), 1, Decimal(20)), (dia, 1, Decimal(30))],
+        )
+
+        pagamento.delete()
+        self.assertEqual(self.resumo(self.igreja), [(dia, 1, Decimal(30))])
+
+    def test_dizimista_muda_de_igreja(self):
+        Pagamento.objects.create(
+            dizimista=self.dizimista, data=data_local(2024, 3, 10, 8), valor=30
+        )
+        self.dizimista.igreja = self.capela
+        self.dizimista.save()
+        self.assertEqual(self.resumo(self.igreja), [])
+        self.assertEqual(self.resumo(self.capela)[0][1:], (1, Decimal(30)))
+
+    def test_resumo_sem_igreja_unico_por_dia(self):
+        dia = datetime(2024, 3, 10).date()
+        registrar_no_resumo(None, dia, 1, Decimal(30))
+        registrar_no_resumo(None, dia, 1, Decimal(20))
+        self.assertEqual(self.resumo(None), [(dia, 2, Decimal(50))])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ResumoDiario.objects.create(igreja=None, dia=dia)
+
+    def test_rebuild_resumo_diario(self):
+        Pagamento.objects.create(
+            dizimista=self.dizimista, data=data_local(2024, 3, 10, 8), valor=30
+        )
+        Pagamento.objects.create(
+            dizimista=self.dizimista, data=data_local(2024, 3, 10, 23), valor=20
+        )
+        ResumoDiario.objects.all().delete()
+        call_command("rebuild_resumo_diario", stdout=StringIO())
+        self.assertEqual(
+            self.resumo(self.igreja), [(datetime(2024, 3, 10).date(), 2, Decimal(50))]
+        )
+
+    def test_resumo_pagamentos_changelist(self):
+        Pagamento.objects.create(
+            dizimista=self.dizimista, data=data_local(2024, 3, 10, 8), valor=30
+        )
+        Pagamento.objects.create(
+            dizimista=self.dizimista, data=data_local(2024, 4, 2, 8), valor=20
+        )
+        admin = User.objects.create_superuser("admin", password="admin")
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(
+                "/gestao/resumopagamentos/", {"group_date_by": "mês"}
+            )
+        self.assertEqual(response.status_code, 200)
+        # O agrupamento fica para a série, buscada depois.
+        self.assertFalse([q for q in consultas.captured_queries if "SUM(" in q["sql"]])
+        self.assertEqual(
+            response.context["serie_url"],
+            "/gestao/resumopagamentos/serie/?group_date_by=m%C3%AAs",
+        )
+        serie = self.client.get(response.context["serie_url"]).json()
+        self.assertEqual(serie["x"], ["2024-03", "2024-04"])
+        self.assertEqual(serie["y"], [[30.0, 20.0]])
+        self.assertEqual(
+            [linha[1] for linha in serie["linhas"]], ["2024-04", "2024-03"]
+        )
+
+
+class ResumoPagamentosConcorrenteTestCase(TransactionTestCase):
+    def setUp(self):
+        dizimista = criar_dizimista(Igreja.objects.create(nome="Matriz"))
+        Pagamento.objects.create(
+            dizimista=dizimista, data=data_local(2024, 3, 10, 8), valor=30
+        )
+        Pagamento.objects.create(
+            dizimista=dizimista, data=data_local(2024, 4, 2, 8), valor=20
+        )
+        self.client.force_login(
+            User.objects.create_superuser("admin", password="admin")
+        )
+
+    def resumo(self, period):
+        try:
+            # Mesma sessão, um cliente por requisição.
+            client = Client()
+            client.cookies = self.client.cookies
+            response = client.get(
+                "/gestao/resumopagamentos/", {"group_date_by": period}
+            )
+            # O contexto capturado pelo cliente de testes não é isolado por thread: confere o HTML.
+            cabecalho = (
+                response.content.decode().split("<thead>")[1].split("</thead>")[0]
+            )
+            return period, re.findall(r'<a href="#">(.*?)</a>', cabecalho)
+        finally:
+            connections.close_all()
+
+    def test_agrupamento_de_cada_requisicao(self):
+        periodos = ["dia", "semana", "mês", "ano"] * 10
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            resultados = list(executor.map(self.resumo, periodos))
+        for period, cabecalho in resultados:
+            self.assertEqual(
+                cabecalho, ["Igreja", period.title(), "Pagamentos", "Total (R$)"]
+            )
+
+
+class VazaoTestCase(TransactionTestCase):
+    def test_requisicoes_simultaneas(self):
+        self.client.force_login(
+            User.objects.create_superuser("admin", password="admin")
+        )
+        resultado = vazao(
+            self.client, "resumopagamentos:mes", {}, threads=2, segundos=0.2
+        )
+        self.assertEqual(resultado["threads"], 2)
+        self.assertGreater(resultado["requisicoes"], 0)
+        self.assertGreater(resultado["por_segundo"], 0)
+
+
+class GraficoTestCase(TestCase):
+    def row(self, igreja, periodo, total, period="mês"):
+        return {
+            "igreja__nome": igreja,
+            period: periodo,
+            "pagamentos": 1,
+            "total_recebido": Decimal(total),
+        }
+
+    def test_periodos_sem_pagamentos_ficam_com_zero(self):
+        rows = [self.row("Matriz", "2024-03", 50), self.row("Matriz", "2023-12", 10)]
+        dados = format_plot_data(rows, "mês")
+        self.assertEqual(dados["x"], ["2023-12", "2024-01", "2024-02", "2024-03"])
+        self.assertEqual(dados["y"], [[10.0, 0.0, 0.0, 50.0]])
+
+    def test_series_alinhadas_com_total(self):
+        rows = [
+            self.row("Matriz", "2024-03-11", 30, "semana"),
+            self.row("Capela", "2024-03-25", 20, "semana"),
+            self.row("Matriz", "2024-03-25", 5, "semana"),
+        ]
+        dados = format_plot_data(rows, "semana")
+        self.assertEqual(dados["x"], ["2024-03-11", "2024-03-18", "2024-03-25"])
+        self.assertEqual(dados["igrejas"], ["Capela", "Matriz"])
+        self.assertEqual(dados["y"], [[0.0, 0.0, 20.0], [30.0, 0.0, 5.0]])
+        self.assertEqual(dados["total"], [30.0, 0.0, 25.0])
+        self.assertEqual(format_plot_data([], "semana")["x"], [])
+
+
+class SerieDePagamentosTestCase(TestCase):
+    url = "/gestao/resumopagamentos/serie/"
+
+    def setUp(self):
+        cache.clear()
+        self.igreja = Igreja.objects.create(nome="Matriz")
+        self.capela = Igreja.objects.create(nome="Capela")
+        self.dizimista = criar_dizimista(self.igreja)
+        Pagamento.objects.create(
+            dizimista=self.dizimista, data=data_local(2024, 3, 10, 8), valor=30
+        )
+        Pagamento.objects.create(
+            dizimista=criar_dizimista(self.capela),
+            data=data_local(2024, 5, 2, 8),
+            valor=20,
+        )
+        self.agente = User.objects.create_user(
+            "agente", password="agente", is_staff=True
+        )
+        self.agente.groups.add(AGENTES_GROUP())
+        self.igreja.agentes.add(self.agente)
+        self.client.force_login(self.agente)
+
+    def test_serie_das_igrejas_do_usuario(self):
+        response = self.client.get(
+            self.url, {"group_date_by": "mês", "de": "2024-01-01", "ate": "2025-01-01"}
+        )
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(
+            response.json(),
+            {
+                "periodo": "mês",
+                "x": ["2024-03"],
+                "igrejas": ["Matriz"],
+                "y": [[30.0]],
+                "total": [30.0],
+                "linhas": [["Matriz", "2024-03", 1, 30.0]],
+            },
+        )
+        self.assertEqual(
+            self.client.get(self.url, {"de": "2024-04-01"}).json()["x"], []
+        )
+        self.assertEqual(self.client.get(self.url, {"de": "ontem"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"igreja": "x"}).status_code, 400)
+
+    def test_nao_modificado_ate_um_novo_pagamento(self):
+        # O ETag depende de um cache compartilhado (veja `test_sem_etag_com_cache_local`).
+        with cache_em_arquivo(self):
+            response = self.client.get(self.url)
+            etag = response["ETag"]
+            self.assertIn("Last-Modified", response)
+            with CaptureQueriesContext(connection) as consultas:
+                revalidada = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(revalidada.status_code, 304)
+            # Só a sessão e o usuário: a série não é recalculada.
+            self.assertFalse(
+                [
+                    c
+                    for c in consultas.captured_queries
+                    if "gestao_resumodiario" in c["sql"]
+                ]
+            )
+            self.assertNotEqual(
+                self.client.get(self.url, {"group_date_by": "dia"})["ETag"], etag
+            )
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Pagamento.objects.create(
+                    dizimista=self.dizimista, data=data_local(2024, 3, 11, 8), valor=10
+                )
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["total"], [40.0])
+
+    def test_sem_etag_com_cache_local(self):
+        self.assertNotIn("ETag", self.client.get(self.url))
+        # Outro worker registra o pagamento: a invalidação vai para o cache dele.
+        with self.captureOnCommitCallbacks(execute=False):
+            Pagamento.objects.create(
+                dizimista=self.dizimista, data=data_local(2024, 3, 11, 8), valor=10
+            )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"qualquer"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total"], [40.0])
+
+    def test_exige_permissao(self):
+        self.client.force_login(
+            User.objects.create_user("visitante", password="visitante", is_staff=True)
+        )
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class PermissoesTestCase(TestCase):
+    def setUp(self):
+        limpar_registro()
+        esquecer_grupos()
+
+    def test_registro_resolve_em_uma_consulta(self):
+        pares = [
+            (model, acao)
+            for model in (User, Perfil, Dizimista, Pagamento)
+            for acao in ("view", "add")
+        ]
+        with self.assertNumQueries(1):
+            resolvidas = permissoes(*pares)
+        self.assertEqual(
+            [p.codename for p in resolvidas],
+            [f"{acao}_{model._meta.model_name}" for model, acao in pares],
+        )
+        self.assertEqual(
+            {p.content_type.app_label for p in resolvidas}, {"auth", "core", "gestao"}
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(get_permission(User, "view"), resolvidas[0])
+        with self.assertRaises(Permission.DoesNotExist):
+            permissoes((Pagamento, "aprovar"))
+
+    def test_grupos_provisionados_no_migrate(self):
+        gestores = Group.objects.get(name=GESTORES)
+        self.assertEqual(
+            set(
+                gestores.permissions.values_list("content_type__app_label", "codename")
+            ),
+            {
+                (p.content_type.app_label, p.codename)
+                for p in permissoes(*PERMISSOES_DOS_GRUPOS[GESTORES])
+            },
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(GESTORES_GROUP(), gestores)
+            self.assertEqual(GESTORES_GROUP(), gestores)
+            AGENTES_GROUP()
+
+    def test_sincronizacao_por_diferenca(self):
+        agentes = AGENTES_GROUP()
+        agentes.permissions.remove(get_permission(Pagamento, "add"))
+        agentes.permissions.add(get_permission(Pagamento, "delete"))
+        provisionar_grupos()
+        codenames = set(agentes.permissions.values_list("codename", flat=True))
+        self.assertIn("add_pagamento", codenames)
+        self.assertNotIn("delete_pagamento", codenames)
+        with self.assertNumQueries(3):
+            # Os dois grupos e as permissões atuais de cada um: nada a escrever.
+            provisionar_grupos()
+
+
+class ParticipacoesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.matriz = Igreja.objects.create(nome="Matriz")
+        self.capela = Igreja.objects.create(nome="Capela")
+        self.gestor = User.objects.create_user("gestor", is_staff=True)
+        self.matriz.gestores.add(self.gestor)
+        self.matriz.agentes.add(self.gestor)
+
+    def ids(self):
+        # Um objeto novo a cada chamada, como em requisições diferentes.
+        return ids_das_igrejas_do_usuário(User.objects.get(pk=self.gestor.pk))
+
+    def test_resolvido_uma_vez_por_requisicao(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(ids_das_igrejas_do_usuário(self.gestor), [self.matriz.pk])
+            ids_das_igrejas_do_usuário(self.gestor)
+        # Com o cache local, cada requisição lê o escopo do banco.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.ids(), [self.matriz.pk])
+
+    def test_em_cache_entre_requisicoes_com_cache_compartilhado(self):
+        with cache_em_arquivo(self):
+            self.ids()
+            with self.assertNumQueries(1):
+                self.assertEqual(self.ids(), [self.matriz.pk])
+
+    def test_revogacao_em_outro_processo(self):
+        # Este processo leu o escopo e tem a versão das participações no cache local.
+        self.assertEqual(self.ids(), [self.matriz.pk])
+        # Outro worker revoga o gestor: a invalidação vai para o cache dele, não
+        # para este, onde a versão antiga continua legível.
+        with self.captureOnCommitCallbacks(execute=False):
+            self.matriz.gestores.remove(self.gestor)
+            self.matriz.agentes.remove(self.gestor)
+        self.assertEqual(self.ids(), [])
+
+    def test_invalidado_por_m2m_changed(self):
+        self.ids()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gestor.agente_em.add(self.capela)
+        self.assertEqual(self.ids(), [self.matriz.pk, self.capela.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.matriz.gestores.clear()
+            self.matriz.agentes.remove(self.gestor)
+        self.assertEqual(self.ids(), [self.capela.pk])
+
+    def test_escopo_em_lista_de_ids(self):
+        sql = str(dizimistas_do_usuário(self.gestor).query)
+        self.assertIn(f'"gestao_dizimista"."igreja_id" IN ({self.matriz.pk})', sql)
+        self.assertNotIn("gestao_igreja_agentes", sql)
+
+
+class UltimoPagamentoTestCase(TestCase):
+    def setUp(self):
+        self.igreja = Igreja.objects.create(nome="Matriz")
+        self.ana = criar_dizimista(self.igreja, nome="Ana")
+        self.bia = criar_dizimista(self.igreja, nome="Bia")
+
+    def contadores(self, dizimista):
+        dizimista.refresh_from_db()
+        return dizimista.num_pagamentos, dizimista.ultimo_pagamento
+
+    def test_contadores_acompanham_pagamentos(self):
+        recente = data_local(2024, 3, 10, 8)
+        antigo = Pagamento.objects.create(
+            dizimista=self.ana, data=data_local(2024, 1, 10, 8), valor=10
+        )
+        Pagamento.objects.create(dizimista=self.ana, data=recente, valor=10)
+        self.assertEqual(self.contadores(self.ana), (2, recente))
+
+        antigo.dizimista = self.bia
+        antigo.save()
+        self.assertEqual(self.contadores(self.ana), (1, recente))
+        self.assertEqual(self.contadores(self.bia), (1, data_local(2024, 1, 10, 8)))
+
+        Pagamento.objects.filter(data=recente).get().delete()
+        self.assertEqual(self.contadores(self.ana), (0, None))
+
+        Dizimista.objects.update(num_pagamentos=0, ultimo_pagamento=None)
+        call_command("reconciliar_contadores", stdout=StringIO())
+        self.assertEqual(self.contadores(self.bia), (1, data_local(2024, 1, 10, 8)))
+
+    def test_filtro_de_ultimo_pagamento(self):
+        Pagamento.objects.create(
+            dizimista=self.ana, data=timezone.now() - timedelta(days=10), valor=10
+        )
+        Pagamento.objects.create(
+            dizimista=self.bia, data=timezone.now() - timedelta(days=40), valor=10
+        )
+        criar_dizimista(self.igreja, nome="Caio")
+        admin = User.objects.create_superuser("admin", password="admin")
+        self.client.force_login(admin)
+        response = self.client.get(
+            "/gestao/dizimista/", {"ultimopagamento": "30", "o": "4"}
+        )
+        nomes = [
+            dizimista.perfil.nome for dizimista in response.context["cl"].result_list
+        ]
+        self.assertEqual(sorted(nomes), ["Bia", "Caio"])
+
+
+class AniversarioTestCase(TestCase):
+    def setUp(self):
+        igreja = Igreja.objects.create(nome="Matriz")
+        for nome, nascimento in [
+            ("Ana", (1980, 12, 30)),
+            ("Bia", (1975, 1, 2)),
+            ("Caio", (1990, 1, 20)),
+            ("Davi", (1992, 1, 5)),
+            ("Edu", None),
+        ]:
+            dizimista = criar_dizimista(igreja, nome=nome)
+            dizimista.perfil.nascimento = (
+                datetime(*nascimento).date() if nascimento else None
+            )
+            dizimista.perfil.save()
+
+    def nomes(self, queryset):
+        return [
+            dizimista.perfil.nome for dizimista in queryset.select_related("perfil")
+        ]
+
+    def test_chave_mantida_no_save(self):
+        perfil = Perfil.objects.get(nome="Caio")
+        self.assertEqual(perfil.aniversario, 120)
+        perfil.nascimento = datetime(1990, 11, 3).date()
+        perfil.save(update_fields=["nascimento"])
+        perfil.refresh_from_db()
+        self.assertEqual(perfil.aniversario, 1103)
+
+    def test_aniversariantes_na_virada_do_ano(self):
+        inicio, fim = datetime(2024, 12, 29).date(), datetime(2025, 1, 4).date()
+        self.assertEqual(
+            self.nomes(aniversariantes(Dizimista.objects.all(), inicio, fim)),
+            ["Ana", "Bia"],
+        )
+
+    def test_filtro_do_mes_em_ordem_de_dia(self):
+        admin = User.objects.create_superuser("admin", password="admin")
+        self.client.force_login(admin)
+        response = self.client.get("/gestao/dizimista/", {"aniversario_mes": "1"})
+        self.assertEqual(
+            self.nomes(response.context["cl"].result_list), ["Bia", "Davi", "Caio"]
+        )
+        response = self.client.get("/gestao/dizimista/", {"aniversario_semana": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Edu", self.nomes(response.context["cl"].result_list))
+
+
+class IgrejaAdminTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", password="admin")
+        self.client.force_login(self.admin)
+
+    def criar_igreja(self, nome, dizimistas):
+        igreja = Igreja.objects.create(nome=nome)
+        gestor = User.objects.create_user(f"gestor_{nome}", is_staff=True)
+        Perfil.objects.create(user=gestor, nome=f"Gestor {nome}")
+        igreja.gestores.add(gestor)
+        # Agente sem perfil: aparece pelo nome de usuário.
+        igreja.agentes.add(User.objects.create_user(f"agente_{nome}", is_staff=True))
+        for i in range(dizimistas):
+            criar_dizimista(igreja, nome=f"Dizimista {i}")
+        return igreja
+
+    def test_contador_de_dizimistas(self):
+        matriz = self.criar_igreja("Matriz", 2)
+        capela = self.criar_igreja("Capela", 1)
+        dizimista = matriz.dizimista_set.first()
+        dizimista.igreja = capela
+        dizimista.save()
+        capela.dizimista_set.first().delete()
+        matriz.refresh_from_db()
+        capela.refresh_from_db()
+        self.assertEqual((matriz.num_dizimistas, capela.num_dizimistas), (1, 1))
+
+        Igreja.objects.update(num_dizimistas=0)
+        call_command("reconciliar_contadores", stdout=StringIO())
+        self.assertEqual(
+            list(
+                Igreja.objects.order_by("nome").values_list("num_dizimistas", flat=True)
+            ),
+            [1, 1],
+        )
+
+    def test_changelist_com_consultas_constantes(self):
+        self.criar_igreja("Matriz", 3)
+        self.client.get("/gestao/igreja/")
+        with CaptureQueriesContext(connection) as poucas:
+            self.client.get("/gestao/igreja/")
+        for i in range(5):
+            self.criar_igreja(f"Capela {i}", i)
+        with self.assertNumQueries(len(poucas)):
+            response = self.client.get("/gestao/igreja/", {"o": "-5"})
+        self.assertContains(response, "Gestor Capela 4")
+        self.assertContains(response, "agente_Capela 4")
+        nomes = [igreja.nome for igreja in response.context["cl"].result_list]
+        self.assertEqual(nomes[:2], ["Capela 4", "Capela 3"])
+
+
+class ChangelistsTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", password="admin")
+        self.client.force_login(self.admin)
+        self.igreja = Igreja.objects.create(nome="Matriz")
+
+    def criar_dizimistas(self, nomes):
+        for nome in nomes:
+            dizimista = criar_dizimista(self.igreja, nome=nome)
+            dizimista.perfil.nascimento = datetime(1990, len(nome), 1).date()
+            dizimista.perfil.save()
+            Pagamento.objects.create(dizimista=dizimista, valor=10)
+
+    def assertConsultasConstantes(self, url, params=None):
+        self.criar_dizimistas(["Ana"])
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as poucas:
+            self.client.get(url, params)
+        self.criar_dizimistas(["Bruno", "Carla", "Dalva", "Everaldo"])
+        with self.assertNumQueries(len(poucas)):
+            return self.client.get(url, params)
+
+    def test_dizimista_changelist(self):
+        response = self.assertConsultasConstantes("/gestao/dizimista/", {"o": "-2"})
+        nomes = [
+            dizimista.perfil.nome for dizimista in response.context["cl"].result_list
+        ]
+        # Ordenado pela data de nascimento, que aqui cresce com o tamanho do nome.
+        self.assertEqual((nomes[0], nomes[-1]), ("Everaldo", "Ana"))
+
+    def test_pagamento_changelist(self):
+        response = self.assertConsultasConstantes("/gestao/pagamento/", {"o": "3"})
+        self.assertContains(response, "Everaldo")
+        nomes = [
+            pagamento.dizimista.perfil.nome
+            for pagamento in response.context["cl"].result_list
+        ]
+        self.assertEqual(nomes, sorted(nomes))
+
+
+class BuscaPorNomeTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", password="admin")
+        self.client.force_login(self.admin)
+        self.igreja = Igreja.objects.create(nome="Matriz")
+        for nome in ("João da Silva", "Joana Araújo", "Maria Conceição"):
+            Pagamento.objects.create(
+                dizimista=criar_dizimista(self.igreja, nome=nome), valor=10
+            )
+
+    def nomes(self, termo):
+        return sorted(
+            d.perfil.nome for d in buscar_por_nome(Dizimista.objects.all(), termo)
+        )
+
+    def test_normalizar(self):
+        self.assertEqual(normalizar("  JOÃO  da Conceição "), "joao da conceicao")
+
+    def test_busca_sem_acentos(self):
+        self.assertEqual(self.nomes("joao"), ["João da Silva"])
+        self.assertEqual(self.nomes("ARAUJO"), ["Joana Araújo"])
+        self.assertEqual(self.nomes("conceição maria"), ["Maria Conceição"])
+        # Termos curtos demais para os trigramas também funcionam.
+        self.assertEqual(self.nomes("jo"), ["Joana Araújo", "João da Silva"])
+        self.assertEqual(
+            self.nomes("  "), ["Joana Araújo", "João da Silva", "Maria Conceição"]
+        )
+
+    def test_indice_acompanha_o_nome(self):
+        perfil = Perfil.objects.get(nome="Maria Conceição")
+        perfil.nome = "Mariana Gonçalves"
+        perfil.save(update_fields=["nome"])
+        self.assertEqual(self.nomes("goncalves"), ["Mariana Gonçalves"])
+        self.assertEqual(self.nomes("conceicao"), [])
+        perfil.delete()
+        self.assertEqual(self.nomes("mariana"), [])
+
+    def test_busca_nos_admins(self):
+        response = self.client.get("/gestao/dizimista/", {"q": "joao"})
+        self.assertEqual(
+            [d.perfil.nome for d in response.context["cl"].result_list],
+            ["João da Silva"],
+        )
+        response = self.client.get("/gestao/pagamento/", {"q": "araujo"})
+        self.assertEqual(
+            [p.dizimista.perfil.nome for p in response.context["cl"].result_list],
+            ["Joana Araújo"],
+        )
+
+    def test_busca_usa_o_indice(self):
+        self.assertEqual(
+            varreduras_completas(
+                buscar_por_nome(Dizimista.objects.all(), "silva"), model=Perfil
+            ),
+            [],
+        )
+
+
+class AutocompleteTestCase(TestCase):
+    url = "/autocomplete/"
+
+    def setUp(self):
+        cache.clear()
+        self.sao_jose = Igreja.objects.create(nome="São José")
+        self.santa_luzia = Igreja.objects.create(nome="Santa Luzia")
+        self.joao = criar_dizimista(self.sao_jose, nome="João da Silva")
+        criar_dizimista(self.sao_jose, nome="Maria Joana")
+        criar_dizimista(self.santa_luzia, nome="Joana Araújo")
+        self.agente = User.objects.create_user("agente", is_staff=True)
+        self.agente.groups.add(AGENTES_GROUP())
+        self.sao_jose.agentes.add(self.agente)
+        self.client.force_login(self.agente)
+
+    def dizimistas(self, termo, **params):
+        params = dict(
+            app_label="gestao",
+            model_name="pagamento",
+            field_name="dizimista",
+            term=termo,
+            **params,
+        )
+        return self.client.get(self.url, params).json()
+
+    def igrejas(self, termo):
+        params = {
+            "app_label": "gestao",
+            "model_name": "dizimista",
+            "field_name": "igreja",
+            "term": termo,
+        }
+        return [r["text"] for r in self.client.get(self.url, params).json()["results"]]
+
+    def test_uma_unica_rota(self):
+        from django.contrib.admin import site
+
+        self.assertIsInstance(site, GestaoAdminSite)
+        rota = resolve(self.url)
+        self.assertEqual((rota.namespace, rota.url_name), ("admin", "autocomplete"))
+        self.assertEqual(reverse("admin:autocomplete"), self.url)
+
+    def test_prefixo_sem_acentos_nas_igrejas_do_usuario(self):
+        resposta = self.dizimistas("JOAO")
+        self.assertEqual(
+            resposta["results"], [{"id": str(self.joao.pk), "text": "João da Silva"}]
+        )
+        self.assertFalse(resposta["pagination"]["more"])
+        # "Joana Araújo" é de outra igreja e "Maria Joana" não começa com "jo".
+        self.assertEqual(
+            [r["text"] for r in self.dizimistas("jo")["results"]], ["João da Silva"]
+        )
+        self.assertEqual(self.igrejas("sao"), ["São José"])
+        self.assertEqual(self.igrejas("santa"), [])
+
+    def test_uma_consulta_e_cache(self):
+        self.dizimistas(
+            "x"
+        )  # sessão, usuário, permissões e igrejas do usuário em cache
+        with CaptureQueriesContext(connection) as consultas:
+            self.dizimistas("joa")
+        opcoes = [
+            q["sql"]
+            for q in consultas.captured_queries
+            if "gestao_dizimista" in q["sql"]
+        ]
+        self.assertEqual(len(opcoes), 1)
+        self.assertNotIn("COUNT(", opcoes[0])
+        with CaptureQueriesContext(connection) as consultas:
+            self.dizimistas("joa")
+        self.assertFalse(
+            [q for q in consultas.captured_queries if "gestao_dizimista" in q["sql"]]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            perfil = self.joao.perfil
+            perfil.nome = "Joaquim da Silva"
+            perfil.save()
+        self.assertEqual(
+            [r["text"] for r in self.dizimistas("joa")["results"]], ["Joaquim da Silva"]
+        )
+
+    def test_paginas(self):
+        for i in range(25):
+            criar_dizimista(self.sao_jose, nome=f"Joaquim {i:02}")
+        primeira = self.dizimistas("joaquim")
+        self.assertEqual(len(primeira["results"]), 20)
+        self.assertTrue(primeira["pagination"]["more"])
+        segunda = self.dizimistas("joaquim", page=2)
+        self.assertEqual(
+            [r["text"] for r in segunda["results"]],
+            [f"Joaquim {i}" for i in range(20, 25)],
+        )
+        self.assertFalse(segunda["pagination"]["more"])
+
+    def test_outros_campos_usam_o_admin(self):
+        admin = User.objects.create_superuser("admin", password="admin")
+        self.client.force_login(admin)
+        params = {
+            "app_label": "gestao",
+            "model_name": "perfildizimista",
+            "field_name": "user",
+            "term": "agen",
+        }
+        resposta = self.client.get(self.url, params).json()
+        self.assertEqual([r["text"] for r in resposta["results"]], ["agente"])
+
+
+class ContagemTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("admin", password="admin")
+        self.client.force_login(self.admin)
+        self.igreja = Igreja.objects.create(nome="Matriz")
+        for nome in ("Ana", "Bruno", "Carla"):
+            Pagamento.objects.create(
+                dizimista=criar_dizimista(self.igreja, nome=nome), valor=10
+            )
+
+    def contagens(self, url, params=None):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, params)
+        return response.context["cl"].result_count, [
+            q for q in consultas.captured_queries if "COUNT(" in q["sql"]
+        ]
+
+    def test_contagem_em_cache_por_filtros(self):
+        self.assertEqual(
+            len(self.contagens("/gestao/pagamento/")[1]), 1
+        )  # sem a contagem total
+        self.assertEqual(self.contagens("/gestao/pagamento/"), (3, []))
+        self.assertEqual(self.contagens("/gestao/pagamento/", {"q": "ana"})[0], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Pagamento.objects.create(dizimista=Dizimista.objects.first(), valor=10)
+        self.assertEqual(self.contagens("/gestao/pagamento/")[0], 4)
+
+    def test_contagem_por_escopo(self):
+        self.assertEqual(self.contagens("/gestao/dizimista/")[0], 3)
+        agente = User.objects.create_user("agente", is_staff=True)
+        agente.groups.add(AGENTES_GROUP())
+        Igreja.objects.create(nome="Capela").agentes.add(agente)
+        self.client.force_login(agente)
+        self.assertEqual(self.contagens("/gestao/dizimista/")[0], 0)
+
+    def test_estimativa_acima_do_limiar(self):
+        with mock.patch("gestao.paginacao.estimar_contagem", return_value=2_000_000):
+            contagem, consultas = self.contagens("/gestao/pagamento/")
+        self.assertEqual((contagem, consultas), (2_000_000, []))
+        cache.clear()
+        with mock.patch("gestao.paginacao.estimar_contagem", return_value=50):
+            self.assertEqual(self.contagens("/gestao/pagamento/")[0], 3)
+
+
+class PaginacaoPorCursorTestCase(TestCase):
+    url = "/gestao/pagamento/"
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("admin", password="admin")
+        self.client.force_login(self.admin)
+        self.matriz = Igreja.objects.create(nome="Matriz")
+        self.capela = Igreja.objects.create(nome="Capela")
+        dizimistas = [criar_dizimista(self.matriz), criar_dizimista(self.capela)]
+        inicio = data_local(2024, 1, 1)
+        for i in range(45):
+            # Pares com a mesma data: o desempate é pelo id.
+            Pagamento.objects.create(
+                dizimista=dizimistas[i % 2],
+                valor=10,
+                data=inicio + timedelta(hours=i // 2),
+            )
+        self.esperados = list(
+            Pagamento.objects.order_by("-data", "-pk").values_list("pk", flat=True)
+        )
+
+    def pagina(self, query_string="", **params):
+        if not query_string:
+            params.setdefault(CURSOR_VAR, 1)
+        response = self.client.get(self.url + query_string, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context["cl"]
+
+    def ids(self, cl):
+        return [pagamento.pk for pagamento in cl.result_list]
+
+    def test_percorre_as_paginas(self):
+        primeira = self.pagina()
+        self.assertIsNone(primeira.url_anterior())
+        segunda = self.pagina(primeira.url_seguinte())
+        terceira = self.pagina(segunda.url_seguinte())
+        self.assertIsNone(terceira.url_seguinte())
+        self.assertEqual(
+            self.ids(primeira) + self.ids(segunda) + self.ids(terceira), self.esperados
+        )
+        self.assertEqual(
+            self.ids(self.pagina(terceira.url_anterior())), self.ids(segunda)
+        )
+        self.assertEqual(
+            self.ids(self.pagina(segunda.url_anterior())), self.ids(primeira)
+        )
+
+    def test_offset_por_padrao(self):
+        response = self.client.get(self.url)
+        self.assertFalse(response.context["cl"].por_cursor)
+        self.assertContains(response, 'href="?cursor=1"')
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url, {"p": 2})
+        self.assertEqual(
+            [p.pk for p in response.context["cl"].result_list], self.esperados[20:40]
+        )
+        self.assertTrue([q for q in consultas.captured_queries if "OFFSET" in q["sql"]])
+
+    def test_links_na_pagina(self):
+        response = self.client.get(self.url, {CURSOR_VAR: 1})
+        self.assertContains(response, '&amp;cursor=1"')
+        self.assertContains(response, 'href="?apos=')
+        self.assertContains(response, "Mais antigos")
+        self.assertNotContains(response, "Mais recentes")
+        self.assertContains(response, 'href="?"')
+
+    def test_paginas_profundas_sem_offset(self):
+        primeira = self.pagina()
+        with CaptureQueriesContext(connection) as consultas:
+            self.ids(self.pagina(self.pagina(primeira.url_seguinte()).url_seguinte()))
+        self.assertFalse(
+            [q for q in consultas.captured_queries if "OFFSET" in q["sql"]]
+        )
+
+    def test_novos_pagamentos_nao_deslocam_a_pagina(self):
+        primeira = self.pagina()
+        Pagamento.objects.create(dizimista=Dizimista.objects.first(), valor=10)
+        self.assertEqual(
+            self.ids(self.pagina(primeira.url_seguinte())), self.esperados[20:40]
+        )
+
+    def test_com_filtros(self):
+        matriz = [
+            pk
+            for pk in self.esperados
+            if Pagamento.objects.get(pk=pk).dizimista.igreja == self.matriz
+        ]
+        primeira = self.pagina(igreja=self.matriz.pk)
+        segunda = self.pagina(primeira.url_seguinte())
+        self.assertEqual(self.ids(primeira) + self.ids(segunda), matriz)
+        # Trocar o filtro volta para a primeira página.
+        self.assertNotIn("apos=", segunda.get_query_string({"igreja": self.capela.pk}))
+
+    def test_cursor_invalido_e_outras_ordenacoes(self):
+        response = self.client.get(self.url, {CURSOR_VAR: 1, "apos": "invalido"})
+        self.assertRedirects(response, self.url + "?e=1", fetch_redirect_response=False)
+        cl = self.pagina(o="2")
+        self.assertFalse(cl.por_cursor)
+        self.assertEqual(len(cl.result_list), 20)
+
+    def test_exportacao_em_blocos(self):
+        with self.assertNumQueries(7):
+            linhas = list(em_blocos(Pagamento.objects.all(), ["pk"], 7))
+        self.assertEqual([pk for (pk,) in linhas], self.esperados)
+
+
+class FiltrosTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.matriz = Igreja.objects.create(nome="Matriz")
+        self.capela = Igreja.objects.create(nome="Capela")
+        self.agente = User.objects.create_user("agente", is_staff=True)
+        Perfil.objects.create(user=self.agente, nome="Paula")
+        self.matriz.agentes.add(self.agente)
+        self.sem_perfil = User.objects.create_user("sem_perfil", is_staff=True)
+        Pagamento.objects.create(
+            dizimista=criar_dizimista(self.matriz), valor=10, registrado_por=self.agente
+        )
+        Pagamento.objects.create(
+            dizimista=criar_dizimista(self.capela),
+            valor=10,
+            registrado_por=self.sem_perfil,
+        )
+
+    def test_opcoes_de_igrejas(self):
+        self.assertEqual(opcoes_de_igrejas(self.agente), [(self.matriz.pk, "Matriz")])
+        with self.assertNumQueries(0):
+            opcoes_de_igrejas(self.agente)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.capela.agentes.add(self.agente)
+        # Nova requisição, novo objeto do usuário.
+        agente = User.objects.get(pk=self.agente.pk)
+        self.assertEqual(
+            opcoes_de_igrejas(agente),
+            [(self.capela.pk, "Capela"), (self.matriz.pk, "Matriz")],
+        )
+
+    def test_opcoes_de_registradores(self):
+        admin = User.objects.create_superuser("admin", password="admin")
+        self.assertEqual(
+            opcoes_de_registradores(admin),
+            [(self.sem_perfil.pk, "sem_perfil"), (self.agente.pk, "Paula (agente)")],
+        )
+        self.assertEqual(
+            opcoes_de_registradores(self.agente), [(self.agente.pk, "Paula (agente)")]
+        )
+        with self.assertNumQueries(0):
+            opcoes_de_registradores(self.agente)
+        with self.captureOnCommitCallbacks(execute=True):
+            Pagamento.objects.create(
+                dizimista=self.matriz.dizimista_set.first(),
+                valor=10,
+                registrado_por=self.sem_perfil,
+            )
+        self.assertEqual(len(opcoes_de_registradores(self.agente)), 2)
+
+    def test_changelist_de_pagamentos(self):
+        self.agente.groups.add(AGENTES_GROUP())
+        self.client.force_login(self.agente)
+        response = self.client.get(
+            "/gestao/pagamento/", {"registrado_por": self.agente.pk}
+        )
+        self.assertEqual(response.context["cl"].result_count, 1)
+
+    def test_opcao_invalida_nao_quebra_o_changelist(self):
+        self.client.force_login(
+            User.objects.create_superuser("admin", password="admin")
+        )
+        for url, parametro, valor in [
+            ("/gestao/pagamento/", "mes", "abc"),
+            ("/gestao/pagamento/", "mes", "13"),
+            ("/gestao/pagamento/", "mes", "0"),
+            ("/gestao/dizimista/", "aniversario_mes", "13"),
+            ("/gestao/dizimista/", "aniversario_semana", "7"),
+            ("/gestao/dizimista/", "ultimopagamento", "abc"),
+            ("/gestao/dizimista/", "ultimopagamento", "45"),
+            ("/gestao/resumopagamentos/", "mes", "abc"),
+            ("/gestao/pagamento/", "igreja", "x"),
+        ]:
+            with self.subTest(url=url, parametro=parametro, valor=valor):
+                response = self.client.get(url, {parametro: valor})
+                self.assertRedirects(
+                    response, f"{url}?e=1", fetch_redirect_response=False
+                )
+        response = self.client.get("/gestao/resumopagamentos/serie/", {"mes": "13"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_filtro_do_mes_limita_os_anos_ao_queryset_filtrado(self):
+        self.agente.groups.add(AGENTES_GROUP())
+        self.client.force_login(self.agente)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(
+                "/gestao/pagamento/", {"mes": timezone.localdate().month}
+            )
+        self.assertEqual(response.context["cl"].result_count, 1)
+        limites = [q["sql"] for q in consultas.captured_queries if "MIN(" in q["sql"]]
+        self.assertEqual(len(limites), 1)
+        self.assertIn("igreja_id", limites[0])
+
+
+class DashboardTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.igreja = Igreja.objects.create(nome="Matriz")
+        self.capela = Igreja.objects.create(nome="Capela")
+        self.agente = User.objects.create_user(
+            "agente", password="agente", is_staff=True
+        )
+        self.igreja.agentes.add(self.agente)
+        self.dizimista = criar_dizimista(self.igreja)
+        criar_dizimista(self.capela, nome="José")
+        hoje = timezone.localtime()
+        Pagamento.objects.create(dizimista=self.dizimista, data=hoje, valor=50)
+        # Mesmo mês do ano passado não conta como "este mês".
+        Pagamento.objects.create(
+            dizimista=self.dizimista, data=hoje.replace(year=hoje.year - 1), valor=70
+        )
+
+    def test_indicadores_do_mes_corrente(self):
+        dados = indicadores(self.agente)
+        self.assertEqual(dados["num_dizimistas"], 1)
+        self.assertEqual(dados["num_pagamentos"], 1)
+        self.assertEqual(dados["recebido"], Decimal(50))
+
+    def test_indicadores_em_cache_invalidados_por_pagamento(self):
+        indicadores(self.agente)
+        with self.assertNumQueries(0):
+            # As igrejas do usuário e os indicadores vêm do cache.
+            self.assertEqual(indicadores(self.agente)["num_pagamentos"], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Pagamento.objects.create(
+                dizimista=self.dizimista, data=timezone.now(), valor=10
+            )
+        self.assertEqual(indicadores(self.agente)["recebido"], Decimal(60))
+
+    def test_index_mostra_indicadores(self):
+        self.client.force_login(self.agente)
+        response = self.client.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "R$ 50")
+        self.assertContains(
+            response,
+            'data-serie="/gestao/resumopagamentos/serie/?group_date_by=semana&amp;de=',
+        )
+
+
+class CacheCompartilhadoTestCase(TestCase):
+    def test_cache_local_gera_aviso_no_check_de_deploy(self):
+        self.assertEqual(
+            [aviso.id for aviso in verificar_cache_compartilhado(None)], ["gestao.W001"]
+        )
+        self.assertNotIn(
+            verificar_cache_compartilhado,
+            registry.get_checks(include_deployment_checks=False),
+        )
+        self.assertIn(
+            verificar_cache_compartilhado,
+            registry.get_checks(include_deployment_checks=True),
+        )
+
+    def test_cache_compartilhado_passa_no_check(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        caches = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": pasta,
+            }
+        }
+        with override_settings(CACHES=caches):
+            self.assertTrue(cache_compartilhado())
+            self.assertEqual(verificar_cache_compartilhado(None), [])
+
+
+class FalhaDeEnvio(smtplib.SMTPException):
+    pass
+
+
+class BackendComFalha(EmailBackend):
+    def send_messages(self, messages):
+        raise FalhaDeEnvio("SMTP indisponível")
+
+
+class EmailTestCase(TestCase):
+    def setUp(self):
+        self.igreja = Igreja.objects.create(nome="Matriz")
+        self.agente = User.objects.create_superuser("agente", password="agente")
+        self.dizimista = criar_dizimista(self.igreja, email="maria@example.com")
+
+    def test_pagamento_pelo_admin_vai_para_caixa_de_saida(self):
+        self.client.force_login(self.agente)
+        response = self.client.post(
+            "/gestao/pagamento/add/",
+            {"dizimista": self.dizimista.pk, "valor": "50"},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        email = Email.objects.get()
+        self.assertEqual(email.destinatarios, ["maria@example.com"])
+        self.assertIn("Matriz", email.mensagem_html)
+
+    def test_worker_envia_por_uma_conexao(self):
+        for _ in range(3):
+            Email.objects.create(
+                assunto="Registro de pagamento", destinatarios=["maria@example.com"]
+            )
+        self.assertEqual(enviar_emails_pendentes(por_minuto=2), 2)
+        self.assertEqual(len(mail.outbox), 2)
+        # O limite por minuto já foi atingido.
+        self.assertEqual(enviar_emails_pendentes(por_minuto=2), 0)
+        self.assertEqual(Email.objects.filter(status=Email.PENDENTE).count(), 1)
+
+    @override_settings(EMAIL_BACKEND="gestao.tests.BackendComFalha")
+    def test_worker_reagenda_falhas(self):
+        email = Email.objects.create(
+            assunto="Registro de pagamento", destinatarios=["maria@example.com"]
+        )
+        self.assertEqual(enviar_emails_pendentes(), 0)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.tentativas), (Email.PENDENTE, 1))
+        self.assertGreater(
+            email.proxima_tentativa, timezone.now() + timedelta(seconds=30)
+        )
+        self.assertEqual(email.erro, "SMTP indisponível")
+        # Ainda não é hora de tentar de novo.
+        self.assertEqual(enviar_emails_pendentes(), 0)
+        self.assertEqual(Email.objects.get().tentativas, 1)
+
+    def test_envio_fora_da_transacao_da_reserva(self):
+        Email.objects.create(
+            assunto="Registro de pagamento", destinatarios=["maria@example.com"]
+        )
+        enviar = EmailBackend.send_messages
+        # As transações do próprio TestCase.
+        transacoes_do_teste = len(connection.atomic_blocks)
+
+        def conferir_reserva(backend, messages):
+            # O SMTP roda com a reserva já gravada e sem transação aberta.
+            self.assertEqual(Email.objects.get().status, Email.ENVIANDO)
+            self.assertEqual(len(connection.atomic_blocks), transacoes_do_teste)
+            return enviar(backend, messages)
+
+        with mock.patch.object(EmailBackend, "send_messages", conferir_reserva):
+            self.assertEqual(enviar_emails_pendentes(), 1)
+        self.assertEqual(Email.objects.get().status, Email.ENVIADO)
+
+    def test_reserva_expirada_volta_para_a_fila(self):
+        email = Email.objects.create(
+            assunto="Registro de pagamento", destinatarios=["maria@example.com"]
+        )
+        reservar_emails(10)
+        # Outro worker não pega a reserva em andamento.
+        self.assertEqual(reservar_emails(10), [])
+        # O worker morreu: a reserva expira e o e-mail é enviado.
+        Email.objects.filter(pk=email.pk).update(proxima_tentativa=timezone.now())
+        self.assertEqual(enviar_emails_pendentes(), 1)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.tentativas), (Email.ENVIADO, 2))
+
+
+def html_como_pdf(entrada, saida, options=None):
+    shutil.copy(entrada, saida)
+    return True
+
+
+class ExportacaoTestCase(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.igreja = Igreja.objects.create(nome="Matriz")
+        self.admin = User.objects.create_superuser("admin", password="admin")
+        dizimista = criar_dizimista(self.igreja)
+        for valor in (10, 20, 30):
+            Pagamento.objects.create(dizimista=dizimista, valor=valor)
+        self.client.force_login(self.admin)
+
+    def exportar(self, url="/gestao/pagamento/", **dados):
+        response = self.client.post(
+            url,
+            {
+                "action": "export_as_pdf",
+                "index": "0",
+                "_selected_action": [
+                    str(pk) for pk in Pagamento.objects.values_list("pk", flat=True)
+                ],
+                **dados,
+            },
+        )
+        exportacao = Exportacao.objects.get()
+        self.assertRedirects(response, f"/exportacoes/{exportacao.pk}/")
+        return exportacao
+
+    def test_exportacao_em_segundo_plano(self):
+        exportacao = self.exportar()
+        self.assertContains(
+            self.client.get(f"/exportacoes/{exportacao.pk}/"), "Na fila"
+        )
+        with mock.patch("pdfkit.from_file", html_como_pdf):
+            self.assertEqual(processar_exportacoes_pendentes(), 1)
+        exportacao.refresh_from_db()
+        self.assertEqual(
+            (exportacao.status, exportacao.linhas), (Exportacao.CONCLUIDA, 3)
+        )
+        self.assertEqual(exportacao.tamanho, exportacao.arquivo.size)
+        response = self.client.get(f"/exportacoes/{exportacao.pk}/download/")
+        conteudo = b"".join(response.streaming_content).decode()
+        self.assertIn("30,00", conteudo)
+
+    def test_worker_refaz_os_filtros_do_changelist(self):
+        Pagamento.objects.create(
+            dizimista=criar_dizimista(self.igreja, nome="José"), valor=40
+        )
+        exportacao = self.exportar("/gestao/pagamento/?q=Jos%C3%A9", select_across="1")
+        self.assertEqual(
+            (exportacao.filtros, exportacao.selecionados), ("q=Jos%C3%A9", None)
+        )
+        with mock.patch("pdfkit.from_file", html_como_pdf):
+            processar_exportacoes_pendentes()
+        exportacao.refresh_from_db()
+        self.assertEqual(
+            (exportacao.status, exportacao.linhas), (Exportacao.CONCLUIDA, 1)
+        )
+
+    def test_worker_usa_as_permissoes_do_usuario(self):
+        exportacao = self.exportar()
+        self.admin.is_superuser = False
+        self.admin.save()
+        with mock.patch("pdfkit.from_file", html_como_pdf):
+            processar_exportacoes_pendentes()
+        exportacao.refresh_from_db()
+        self.assertEqual(exportacao.status, Exportacao.FALHOU)
+
+    def test_exportacao_interrompida_volta_para_a_fila(self):
+        exportacao = self.exportar()
+        Exportacao.objects.update(
+            status=Exportacao.PROCESSANDO,
+            iniciada_em=timezone.now() - timedelta(minutes=5),
+        )
+        # Ainda pode estar sendo processada por outro worker.
+        self.assertEqual(processar_exportacoes_pendentes(), 0)
+        Exportacao.objects.update(iniciada_em=timezone.now() - timedelta(hours=1))
+        with mock.patch("pdfkit.from_file", html_como_pdf):
+            self.assertEqual(processar_exportacoes_pendentes(), 1)
+        exportacao.refresh_from_db()
+        self.assertEqual(
+            (exportacao.status, exportacao.linhas), (Exportacao.CONCLUIDA, 3)
+        )
+
+    def test_exportacao_de_outro_usuario(self):
+        exportacao = self.exportar()
+        outro = User.objects.create_user("outro", password="outro", is_staff=True)
+        self.client.force_login(outro)
+        self.assertEqual(
+            self.client.get(f"/exportacoes/{exportacao.pk}/").status_code, 404
+        )
+
+    def test_exportacoes_expiradas_sao_removidas(self):
+        exportacao = self.exportar()
+        with mock.patch("pdfkit.from_file", html_como_pdf):
+            processar_exportacoes_pendentes()
+        exportacao.refresh_from_db()
+        storage = exportacao.arquivo.storage
+        nome = exportacao.arquivo.name
+        Exportacao.objects.update(expira_em=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(remover_exportacoes_expiradas(), 1)
+        self.assertFalse(storage.exists(nome))
+        self.assertFalse(Exportacao.objects.exists())
+
+
+class ExportPlanilhaTestCase(TestCase):
+    def setUp(self):
+        self.igreja = Igreja.objects.create(nome="Matriz")
+        self.admin = User.objects.create_superuser("admin", password="admin")
+        Perfil.objects.create(user=self.admin, nome="Administrador")
+        for nome in ("Ana", "João"):
+            dizimista = criar_dizimista(self.igreja, nome=nome)
+            Pagamento.objects.create(
+                dizimista=dizimista, valor=Decimal("12.50"), registrado_por=self.admin
+            )
+        self.client.force_login(self.admin)
+
+    def exportar(self, action):
+        return self.client.post(
+            "/gestao/pagamento/",
+            {
+                "action": action,
+                "index": "0",
+                "_selected_action": [
+                    str(pk) for pk in Pagamento.objects.values_list("pk", flat=True)
+                ],
+            },
+        )
+
+    def test_linhas_em_uma_unica_consulta(self):
+        from django.contrib.admin import site
+
+        model_admin = site._registry[Pagamento]
+        with self.assertNumQueries(1):
+            linhas = list(model_admin.export_rows(Pagamento.objects.all()))
+        self.assertEqual({linha[2] for linha in linhas}, {"Ana", "João"})
+        self.assertEqual({linha[3] for linha in linhas}, {"Matriz"})
+
+    def test_linhas_do_pagamento_mais_recente_ao_mais_antigo(self):
+        from django.contrib.admin import site
+
+        model_admin = site._registry[Pagamento]
+        # A ordenação do changelist não vale para a exportação.
+        linhas = model_admin.export_rows(
+            Pagamento.objects.order_by("dizimista__perfil__nome")
+        )
+        self.assertEqual([linha[2] for linha in linhas], ["João", "Ana"])
+
+    def test_export_as_csv(self):
+        response = self.exportar("export_as_csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        conteudo = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(
+            conteudo[0],
+            "Data e hora;Valor;Dizimista;Igreja;Registrado por;Usuário;Código",
+        )
+        self.assertEqual(len(conteudo), 3)
+        self.assertIn(";12,50;", conteudo[1])
+
+    def test_export_as_xlsx(self):
+        response = self.exportar("export_as_xlsx")
+        conteudo = b"".join(response.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as planilha:
+            self.assertIsNone(planilha.testzip())
+            folha = planilha.read("xl/worksheets/sheet1.xml").decode()
+        self.assertEqual(folha.count("<row>"), 3)
+        self.assertIn("<v>12.50</v>", folha)
+        self.assertIn("João", folha)
+
+
+class GerarDadosTestCase(TestCase):
+    def test_gerar_dados(self):
+        call_command(
+            "gerar_dados", igrejas=2, dizimistas=5, meses=3, seed=7, stdout=StringIO()
+        )
+        self.assertEqual(Igreja.objects.count(), 2)
+        self.assertEqual(
+            PerfilDizimista.objects.filter(dizimista__igreja__isnull=False).count(), 5
+        )
+        self.assertEqual(User.objects.filter(agente_em__isnull=False).count(), 4)
+        pagamentos = Pagamento.objects.aggregate(n=Count("id"), total=Sum("valor"))
+        resumos = ResumoDiario.objects.aggregate(
+            n=Sum("pagamentos"), total=Sum("total_recebido")
+        )
+        self.assertEqual(pagamentos, resumos)
+        self.assertFalse(
+            Pagamento.objects.filter(registrado_por__agente_em__isnull=True).exists()
+        )
+
+    def gerar(self, **opcoes):
+        with transaction.atomic():
+            call_command(
+                "gerar_dados",
+                igrejas=1,
+                dizimistas=5,
+                meses=3,
+                seed=7,
+                stdout=StringIO(),
+                **opcoes,
+            )
+            pagamentos = list(
+                Pagamento.objects.order_by("data").values_list("data", "valor")
+            )
+            nascimentos = sorted(Perfil.objects.values_list("nascimento", flat=True))
+            transaction.set_rollback(True)
+        return pagamentos, nascimentos
+
+    def test_mesma_semente_e_data_geram_os_mesmos_dados(self):
+        ate = datetime(2024, 3, 1).date()
+        pagamentos, nascimentos = self.gerar(ate=ate)
+        self.assertEqual(self.gerar(ate=ate), (pagamentos, nascimentos))
+        self.assertLess(pagamentos[-1][0], data_local(2024, 3, 1))
+        self.assertGreaterEqual(pagamentos[0][0], data_local(2023, 12, 2))
+
+
+class OrcamentoDeConsultasTestCase(TestCase):
+    """Falha quando uma página do admin passa a fazer mais consultas que o orçamento."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "gerar_dados", igrejas=2, dizimistas=40, meses=2, seed=1, stdout=StringIO()
+        )
+        cls.admin = User.objects.create_superuser("admin", password="admin")
+        cls.agente = (
+            Igreja.objects.order_by("pk").first().agentes.order_by("pk").first()
+        )
+
+    def test_orcamentos(self):
+        for user in (self.admin, self.agente):
+            self.client.force_login(user)
+            alvos = alvos_do_benchmark(user)
+            for endpoint in ENDPOINTS:
+                with self.subTest(user=user.username, endpoint=endpoint):
+                    resultado = medir(self.client, endpoint, alvos, repeticoes=0)
+                    self.assertEqual(resultado["status"], 200)
+                    self.assertLessEqual(resultado["consultas"], ORCAMENTOS[endpoint])
+
+    def test_medir_nao_esvazia_o_cache_configurado(self):
+        cache.set("fora_do_benchmark", 1)
+        self.addCleanup(cache.delete, "fora_do_benchmark")
+        self.client.force_login(self.admin)
+        medir(self.client, "index", alvos_do_benchmark(self.admin), repeticoes=0)
+        self.assertEqual(cache.get("fora_do_benchmark"), 1)
+
+
+class PlanoDeConsultasTestCase(TestCase):
+    """Falha quando as consultas mais comuns sobre pagamentos deixam de usar índices."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "gerar_dados",
+            igrejas=3,
+            dizimistas=300,
+            meses=12,
+            seed=1,
+            stdout=StringIO(),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        cls.admin = User.objects.create_superuser("admin", password="admin")
+        cls.igreja = Igreja.objects.order_by("pk").first()
+        cls.agente = cls.igreja.agentes.order_by("pk").first()
+        cls.dizimista = cls.igreja.dizimista_set.order_by("pk").first()
+
+    def assertUsaIndices(self, queryset):
+        self.assertEqual(varreduras_completas(queryset), [], queryset.explain())
+
+    def changelist(self, user, params=None):
+        self.client.force_login(user)
+        response = self.client.get("/gestao/pagamento/", params or {})
+        self.assertEqual(response.status_code, 200)
+        result_list = response.context["cl"].result_list
+        # Na paginação por cursor, a consulta da página.
+        return getattr(result_list, "consulta", result_list)
+
+    def test_changelist_de_pagamentos(self):
+        casos = [
+            (self.admin, {}),
+            (self.agente, {}),
+            (self.agente, {"cursor": 1}),
+            (self.admin, {"mes": "3"}),
+            (self.admin, {"igreja": self.igreja.pk}),
+            (self.agente, {"registrado_por": self.agente.pk}),
+            (self.admin, {"data__gte": "2024-01-01", "data__lt": "2024-02-01"}),
+        ]
+        for user, params in casos:
+            with self.subTest(user=user.username, **params):
+                self.assertUsaIndices(self.changelist(user, params))
+
+    def test_pagamentos_do_dizimista(self):
+        self.assertUsaIndices(
+            Pagamento.objects.filter(dizimista=self.dizimista).order_by("-data")[:20]
+        )
+
+    def test_registradores(self):
+        self.assertUsaIndices(
+            Pagamento.objects.order_by().values("registrado_por").distinct()
+        )
+
+
+@override_settings(SQL_INSTRUMENTACAO=True, SQL_N_MAIS_UM_LIMITE=3)
+class InstrumentacaoSQLTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", password="admin")
+        Perfil.objects.create(user=self.admin, nome="Administrador")
+        igreja = Igreja.objects.create(nome="Matriz")
+        for nome in ("Ana", "Bia", "Caio", "Davi"):
+            criar_dizimista(igreja, nome=nome)
+        self.client.force_login(self.admin)
+
+    def test_server_timing(self):
+        with self.assertLogs("gestao.sql", level="INFO") as logs:
+            response = self.client.get("/gestao/dizimista/")
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^sql;dur=[\d.]+;desc="\d+ consultas", total;dur=[\d.]+$',
+        )
+        resumo = json.loads(logs.records[0].getMessage())
+        self.assertEqual(resumo["view"], "admin:gestao_dizimista_changelist")
+        self.assertEqual(resumo["status"], 200)
+        self.assertEqual(resumo["n_mais_um"], 0)
+
+    def test_n_mais_um(self):
+        with ConsultasSQL(limite_repeticoes=3) as sql:
+            nomes = [str(dizimista) for dizimista in Dizimista.objects.all()]
+        self.assertEqual(len(nomes), 4)
+        [(forma, vezes, pilha)] = sql.repetidas()
+        self.assertEqual(vezes, 4)
+        self.assertIn('"gestao_perfildizimista"."dizimista_id" = %s', forma)
+        self.assertTrue(any("gestao/models.py" in quadro for quadro in pilha))
+
+    @override_settings(SQL_INSTRUMENTACAO=False)
+    def test_desligado(self):
+        response = self.client.get("/gestao/dizimista/")
+        self.assertNotIn("Server-Timing", response)
+
+
+class ArquivosEstaticosTestCase(TestCase):
+    def test_nomes_com_hash_e_cache_imutavel(self):
+        with tempfile.TemporaryDirectory() as raiz, override_settings(STATIC_ROOT=raiz):
+            # Sem `collectstatic`, o nome original.
+            grafico = "gestao/vendor/chartjs/chart.umd.min.js"
+            self.assertEqual(static(grafico), f"/static/{grafico}")
+            call_command("collectstatic", "--noinput", verbosity=0)
+            url = static(grafico)
+            self.assertRegex(
+                url,
+                r"^/static/gestao/vendor/chartjs/chart\.umd\.min\.[0-9a-f]{12}\.js$",
+            )
+            response = Client().get(url, HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertIn("immutable", response["Cache-Control"])
+            response.close()
+
+
+class EstatisticasDoPoolTestCase(TestCase):
+    def conexao(self, alias, opcoes, estatisticas=None):
+        pool = mock.Mock(**{"pop_stats.return_value": estatisticas})
+        return mock.Mock(alias=alias, settings_dict={"OPTIONS": opcoes}, pool=pool)
+
+    @override_settings(POSTGRES_POOL=True, POSTGRES_POOL_LOG_INTERVALO=0)
+    def test_registra_estatisticas_dos_pools(self):
+        conexoes = [
+            self.conexao(
+                "default",
+                {"pool": {"max_size": 4}},
+                {"pool_size": 2, "requests_num": 7},
+            ),
+            self.conexao("outro", {}),
+        ]
+        middleware = EstatisticasDoPoolMiddleware(lambda request: "resposta")
+        with (
+            mock.patch("gestao.middleware.connections") as connections_,
+            self.assertLogs("gestao.banco") as logs,
+        ):
+            connections_.all.return_value = conexoes
+            self.assertEqual(middleware(None), "resposta")
+        self.assertEqual(
+            json.loads(logs.records[0].getMessage()),
+            {"banco": "default", "pool_size": 2, "requests_num": 7},
+        )
+        self.assertEqual(len(logs.records), 1)
+        conexoes[1].pool.pop_stats.assert_not_called()
+
+    @override_settings(POSTGRES_POOL=True, POSTGRES_POOL_LOG_INTERVALO=60)
+    def test_registra_a_cada_intervalo(self):
+        middleware = EstatisticasDoPoolMiddleware(lambda request: "resposta")
+        with mock.patch("gestao.middleware.estatisticas_dos_pools") as estatisticas:
+            middleware(None)
+        estatisticas.assert_not_called()
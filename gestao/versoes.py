@@ -0,0 +1,88 @@
+"""Versões dos dados guardados em cache.
+
+Os caches derivados do banco incluem na chave a versão dos dados de que
+dependem (uma igreja, as participações em igrejas, os perfis...). Invalidar é
+incrementar a versão: as chaves antigas deixam de ser lidas e expiram sozinhas,
+sem que seja preciso saber quais caches existem.
+
+Junto com a versão fica o momento da última invalidação (`modificado_em`),
+usado no `Last-Modified` das respostas que dependem dos mesmos dados.
+
+Tudo isso supõe um cache visto por todos os processos (veja
+`cache_compartilhado`): com um cache local, a invalidação feita num worker
+não chega aos outros.
+"""
+
+import time
+from hashlib import md5
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+TODAS_AS_IGREJAS = "todas"
+# Igrejas existentes, seus nomes e quem é gestor ou agente de cada uma.
+PARTICIPACOES = "participacoes"
+# Perfis dos usuários e dos dizimistas (nomes exibidos nos filtros e no autocomplete).
+PERFIS = "perfis"
+
+
+def cache_compartilhado():
+    """Se o cache padrão é o mesmo para todos os processos (Redis, memcached...)."""
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+
+def _chave(nome):
+    return f"versao:{nome}"
+
+
+def _chave_da_data(nome):
+    return f"modificado:{nome}"
+
+
+def de_igrejas(escopo):
+    """Nomes das versões das igrejas do escopo (ids ou `[TODAS_AS_IGREJAS]`)."""
+    return [f"igreja:{igreja}" for igreja in escopo]
+
+
+def assinatura(*nomes):
+    """Resumo das versões atuais de `nomes`, para compor chaves de cache."""
+    chaves = [_chave(nome) for nome in nomes]
+    versoes = cache.get_many(chaves)
+    texto = ",".join(
+        f"{nome}:{versoes.get(chave, 0)}" for nome, chave in zip(nomes, chaves)
+    )
+    return md5(texto.encode()).hexdigest()
+
+
+def invalidar(*nomes):
+    for nome in set(nomes):
+        chave = _chave(nome)
+        if not cache.add(chave, 1, timeout=None):
+            try:
+                cache.incr(chave)
+            except ValueError:
+                cache.set(chave, 1, timeout=None)
+    agora = time.time()
+    cache.set_many({_chave_da_data(nome): agora for nome in set(nomes)}, timeout=None)
+
+
+def modificado_em(*nomes):
+    """Timestamp da invalidação mais recente de `nomes`.
+
+    Um nome sem registro (nunca invalidado ou apagado do cache) conta como
+    modificado agora, pois não se sabe desde quando vale a versão atual.
+    """
+    chaves = [_chave_da_data(nome) for nome in nomes]
+    datas = cache.get_many(chaves)
+    agora = time.time()
+    for chave in chaves:
+        if chave not in datas:
+            cache.add(chave, agora, timeout=None)
+            datas[chave] = agora
+    return max(datas.values(), default=agora)
+
+
+def invalidar_igrejas(*igreja_ids):
+    """Invalida os caches que incluem alguma das igrejas (inclusive os de todas as igrejas)."""
+    invalidar(*de_igrejas({*igreja_ids, TODAS_AS_IGREJAS}))
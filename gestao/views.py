@@ -1,6 +1,42 @@
-from django.shortcuts import render
+from pathlib import PurePath
+
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404, render
+
+from .models import Exportacao
 
 
 # Create your views here.
 def home(request):
     return render(request, "home.html")
+
+
+def exportacoes_do_usuário(user):
+    qs = Exportacao.objects.all()
+    if user.is_superuser:
+        return qs
+    return qs.filter(usuario=user)
+
+
+def exportacao(request, pk):
+    exportacao = get_object_or_404(exportacoes_do_usuário(request.user), pk=pk)
+    context = dict(
+        admin.site.each_context(request),
+        title="Exportação",
+        exportacao=exportacao,
+        pronta=exportacao.status in (Exportacao.CONCLUIDA, Exportacao.FALHOU),
+    )
+    return render(request, "admin/exportacao.html", context)
+
+
+def baixar_exportacao(request, pk):
+    exportacao = get_object_or_404(
+        exportacoes_do_usuário(request.user), pk=pk, status=Exportacao.CONCLUIDA
+    )
+    if not exportacao.arquivo:
+        raise Http404
+    nome = PurePath(exportacao.arquivo.name).name
+    return FileResponse(
+        exportacao.arquivo.open("rb"), as_attachment=True, filename=nome
+    )
@@ -1,5 +1,6 @@
 from random import choice, random
 
+from django.core.management import call_command
 from django.utils import timezone
 from faker import Faker
 
@@ -116,8 +117,8 @@ def adicionar_igrejas(num_igrejas=3, gestores_por_igreja=1, agentes_por_igreja=2
 
 
 def populate_full(num_igrejas=3, num_dizimistas=100):
-    adicionar_igrejas(num_igrejas)
-    adicionar_dizimistas_e_pagamentos(num_dizimistas)
+    # Gera tudo em lote; veja `python manage.py gerar_dados --help`.
+    call_command("gerar_dados", igrejas=num_igrejas, dizimistas=num_dizimistas)
 
 
 def delete_all():
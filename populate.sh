@@ -1,2 +1,2 @@
 python -m pip install faker ipython
-python manage.py shell -c "import populate; populate.populate_full()"
\ No newline at end of file
+python manage.py gerar_dados --igrejas 3 --dizimistas 100 --meses 4
\ No newline at end of file